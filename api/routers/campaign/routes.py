@@ -5,7 +5,7 @@ from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 from fastapi.responses import JSONResponse
 from loguru import logger
 
-from api.routers.campaign.schemas import CampaignsData, Trigger, TriggerRequest, TriggersData
+from api.routers.campaign.schemas import AudiencePreview, AudiencePreviewRequest, CampaignsData, Trigger, TriggerRequest, TriggersData
 from api.routers.campaign.tools.campaign import CampaignTools
 from api.routers.dashboards.schemas import GeneralStats, GiveawaysGraphStats, GraphStats, TasksGraphStats
 from api.routers.dashboards.tools.dashboards import DashboardsTools
@@ -77,18 +77,21 @@ async def add_campaign(
     if type == 'one_time':
         if not shedulet_at:
             raise HTTPException(400, detail='Bad request: If set type is "one_time" field shedulet_at is required')
-    return await CampaignTools.add(
-        name=name,
-        text=text,
-        photo=photo if photo else None,
-        type=type,
-        title=title if title else None,
-        is_active=is_active,
-        button_text=button_text if button_text else None,
-        button_url=button_url if button_url else None,
-        triggers=triggers.model_dump()['triggers'],
-        shedulet_at=shedulet_at if shedulet_at else None
-    )
+    try:
+        return await CampaignTools.add(
+            name=name,
+            text=text,
+            photo=photo if photo else None,
+            type=type,
+            title=title if title else None,
+            is_active=is_active,
+            button_text=button_text if button_text else None,
+            button_url=button_url if button_url else None,
+            triggers=triggers.model_dump()['triggers'],
+            shedulet_at=shedulet_at if shedulet_at else None
+        )
+    except CustomDBExceptions as ex:
+        raise HTTPException(400, detail=ex.message)
     
     
 @router.patch('/{campaign_id}')
@@ -138,4 +141,17 @@ async def delete_campaign(campaign_id: int):
 
 @router.get('/triggers')
 async def get_triggers() -> list[Trigger]:
-    return await CampaignTools.get_triggers()
\ No newline at end of file
+    return await CampaignTools.get_triggers()
+
+
+@router.post('/audience_preview')
+async def preview_audience(request: AudiencePreviewRequest) -> AudiencePreview:
+    '''Размер и пример аудитории для выбранных триггеров по снимкам аудиторий'''
+    try:
+        return await CampaignTools.preview_audience(
+            type=request.type,
+            triggers=request.model_dump()['triggers'],
+            sample_size=request.sample_size
+        )
+    except CustomDBExceptions as ex:
+        raise HTTPException(400, detail=ex.message)
@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 import json
 from typing import Literal
 from loguru import logger
-from pydantic import BaseModel, ConfigDict, field_validator, model_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 from config import BASE_ADMIN_URL, FRONT_DATE_FORMAT, FRONT_TIME_FORMAT
 
@@ -37,6 +37,22 @@ class TriggersData(BaseModel):
         return values
     
     
+class AudiencePreviewRequest(BaseModel):
+    type:           Literal['one_time', 'trigger']
+    triggers:       list[TriggerRequest]
+    sample_size:    int = Field(10, ge=0, le=100)
+    
+    
+class AudiencePreview(BaseModel):
+    # None - аудитория еще считается, повторите запрос позже
+    total:          int | None
+    sample:         list[str]
+    # Время самого старого из использованных снимков
+    computed_at:    datetime | None
+    # Хотя бы один триггер не успел пересчитаться, использован старый снимок
+    is_stale:       bool
+    
+    
 class CampaignResponse(BaseModel):
     id:                 int
     name:               str
@@ -1,9 +1,16 @@
+import asyncio
+from typing import Literal
 from loguru import logger
-from api.routers.campaign.schemas import CampaignResponse, Trigger
+from api.routers.campaign.schemas import AudiencePreview, CampaignResponse, Trigger
 from database import db
+from database.db_interfaces.campaigns import AudienceSnapshotInfo
 from tools.photos import PhotoTools
 
 
+# Сколько ждать пересчета аудитории триггера, прежде чем ответить старым снимком
+AUDIENCE_PREVIEW_TIMEOUT = 0.8
+
+
 class CampaignTools:
     async def delete(campaign_id: int):
         await db.campaigns.delete(campaign_id)
@@ -71,4 +78,50 @@ class CampaignTools:
             **campaign_data
         )
         return CampaignResponse.model_validate(campaign)
-        
\ No newline at end of file
+        
+    
+    
+    async def preview_audience(
+        type: Literal['one_time', 'trigger'],
+        triggers: list[dict],
+        sample_size: int
+    ) -> AudiencePreview:
+        snapshots = await asyncio.gather(
+            *[
+                CampaignTools._get_preview_snapshot(trigger['id'], trigger.get('trigger_params'))
+                for trigger in triggers
+            ]
+        )
+        is_stale = any(is_stale for _, is_stale in snapshots)
+        if any(snapshot is None for snapshot, _ in snapshots):
+            return AudiencePreview(total=None, sample=[], computed_at=None, is_stale=is_stale)
+        keys = {snapshot.key for snapshot, _ in snapshots}
+        if len(keys) == 1:
+            # Один триггер: размер уже сохранен в снимке
+            snapshot = snapshots[0][0]
+            total, sample = snapshot.size, await db.campaigns.get_audience_sample(snapshot.key, sample_size)
+        elif keys:
+            total, sample = await db.campaigns.get_combined_audience(type, list(keys), sample_size)
+        else:
+            total, sample = 0, []
+        return AudiencePreview(
+            total=total,
+            sample=sample,
+            computed_at=min((snapshot.created_at for snapshot, _ in snapshots), default=None),
+            is_stale=is_stale
+        )
+    
+    
+    async def _get_preview_snapshot(trigger_id: int, trigger_params: dict | None) -> tuple[AudienceSnapshotInfo | None, bool]:
+        '''
+        Свежий снимок или пересчет не дольше AUDIENCE_PREVIEW_TIMEOUT.
+        Не успевший пересчет продолжается в фоне, до его окончания отдается последний снимок за день
+        '''
+        try:
+            snapshot = await asyncio.wait_for(
+                db.campaigns.get_audience_info(trigger_id, trigger_params),
+                timeout=AUDIENCE_PREVIEW_TIMEOUT
+            )
+            return snapshot, False
+        except asyncio.TimeoutError:
+            return await db.campaigns.get_audience_snapshot_info(trigger_id, trigger_params), True
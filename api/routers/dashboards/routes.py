@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import Literal
 from fastapi import APIRouter
 
-from api.routers.dashboards.schemas import GeneralStats, GiveawaysGraphStats, GraphStats, TasksGraphStats
+from api.routers.dashboards.schemas import GeneralStats, GiveawaysGraphStats, GraphStats, SQLStatementStats, TasksGraphStats
 from api.routers.dashboards.tools.dashboards import DashboardsTools
 from api.routers.tasks.schemas import TasksData
 
@@ -76,4 +76,8 @@ async def get_wheel_spins_graph(
     end: datetime    
 ) -> GraphStats:
     return GraphStats(data=await DashboardsTools.get_wheel_spins_graph(start, end))
-    
\ No newline at end of file
+
+
+@router.get("/sql_statements")
+async def get_sql_statements_stats() -> dict[str, SQLStatementStats]:
+    return DashboardsTools.get_sql_statements_stats()
@@ -54,4 +54,11 @@ class GiveawaysGraphStats(BaseModel):
     
     
 class GraphStats(BaseModel):
-    data: dict[date, StatsParam]
\ No newline at end of file
+    data: dict[date, StatsParam]
+
+
+class SQLStatementStats(BaseModel):
+    '''Выполнения именованного запроса в этом воркере и попадания в кеш prepared statements'''
+    executions:     int
+    prepared_hits:  int
+    hit_rate:       float
@@ -5,6 +5,7 @@ from loguru import logger
 from api.routers.dashboards.schemas import GeneralStats, GiveawaysGraphStats, StatsParam, TasksGraphStats, TasksStats, TicketsStats, Trend
 from api.routers.tasks.schemas import TasksData
 from database import db
+from database.statements import statements
 import json
 
 class TrendData(TypedDict):
@@ -230,4 +231,8 @@ class DashboardsTools:
                     for i in range(1, len(tickets_graph))
                 }
             )
-        return result
\ No newline at end of file
+        return result
+
+
+    def get_sql_statements_stats() -> dict[str, dict]:
+        return statements.stats()
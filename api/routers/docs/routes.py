@@ -1,9 +1,9 @@
-import math
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from sqlalchemy.exc import NoResultFound
-from api.routers.docs.schemas import DocsData, DocsRequest, DocsResponse, SwapDocsRequest
+from api.routers.docs.schemas import DocsData, DocsRequest, DocsResponse, MoveDocsRequest, ReorderDocsRequest, SwapDocsRequest
 from api.routers.docs.tools.docs import DocsTools
 from database.exceptions import CustomDBExceptions
+from tools.content_cache import DOCS_CACHE, content_cache
 
 
 router = APIRouter(
@@ -12,21 +12,19 @@ router = APIRouter(
 )
 
 
-@router.get('/')
+@router.get('/', response_model=DocsData)
 async def get_docs(
+    request: Request,
     page: int = 1,
     per_page: int = 12,
-) -> DocsData:
-    total_items = await DocsTools.get_count()
-    total_pages = math.ceil(total_items / per_page)
-    
-    return DocsData(
-        total_pages=total_pages,
-        total_items=total_items,
-        per_page=per_page,
-        current_page=page,
-        items = await DocsTools.get_all(page, per_page) if total_pages else []
+) -> Response:
+    '''Cached until documents change, supports If-None-Match'''
+    entry = await content_cache.get_or_load(
+        DOCS_CACHE,
+        (page, per_page),
+        lambda: DocsTools.get_data(page, per_page)
     )
+    return content_cache.response(entry, request.headers)
     
     
 @router.post('/')
@@ -47,6 +45,29 @@ async def swap_docs(
         raise HTTPException(400, detail=ex.message)
 
 
+@router.patch('/reorder')
+async def reorder_docs(
+    data: ReorderDocsRequest
+) -> list[DocsResponse]:
+    '''Applies the new order of documents (drag and drop) with one update'''
+    try:
+        return await DocsTools.reorder(data.doc_ids)
+    except CustomDBExceptions as ex:
+        raise HTTPException(400, detail=ex.message)
+
+
+@router.patch('/{doc_id}/move')
+async def move_doc(
+    doc_id: int,
+    data: MoveDocsRequest
+) -> DocsResponse:
+    '''Moves document right after another one'''
+    try:
+        return await DocsTools.move(doc_id, data.after_id)
+    except CustomDBExceptions as ex:
+        raise HTTPException(400, detail=ex.message)
+
+
 @router.patch('/{doc_id}')
 async def edit_doc(
     doc_id: int,
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 from custom_types import DocsStatuses
 
@@ -30,4 +30,19 @@ class DocsData(BaseModel):
     
 class SwapDocsRequest(BaseModel):    
     first_doc_id:   int
-    second_doc_id:  int
\ No newline at end of file
+    second_doc_id:  int
+
+
+class MoveDocsRequest(BaseModel):
+    after_id:   int | None = Field(None, description='Поставить сразу после этого элемента, null - в начало')
+
+
+class ReorderDocsRequest(BaseModel):
+    doc_ids:    list[int] = Field(..., min_length=1, description='id в новом порядке: весь список или одна страница')
+    
+    
+    @field_validator('doc_ids')
+    def check_unique(cls, value: list[int]):
+        if len(set(value)) != len(value):
+            raise ValueError('ids should be unique')
+        return value
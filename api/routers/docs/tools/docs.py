@@ -1,10 +1,14 @@
+import math
 from api.routers.admins.tools.admins import db
 from api.routers.docs.schemas import DocsData, DocsResponse
+from tools.content_cache import DOCS_CACHE, content_cache
 
 
 class DocsTools:
     async def delete(doc_id: int):
-        return await db.docs.delete(doc_id) 
+        result = await db.docs.delete(doc_id)
+        content_cache.invalidate(DOCS_CACHE)
+        return result
                 
     
     async def get_count():
@@ -12,11 +16,15 @@ class DocsTools:
     
     
     async def add(doc_data: DocsData) -> DocsResponse:
-        return DocsResponse.model_validate(await db.docs.add(doc_data.model_dump()))
+        doc = await db.docs.add(doc_data.model_dump())
+        content_cache.invalidate(DOCS_CACHE)
+        return DocsResponse.model_validate(doc)
     
     
     async def update(doc_id: int, doc_data: DocsData) -> DocsResponse:
-        return DocsResponse.model_validate(await db.docs.update(doc_id, doc_data.model_dump()))
+        doc = await db.docs.update(doc_id, doc_data.model_dump())
+        content_cache.invalidate(DOCS_CACHE)
+        return DocsResponse.model_validate(doc)
     
     
     async def get_all(page: int, per_page: int) -> list[DocsResponse]:
@@ -24,10 +32,40 @@ class DocsTools:
             DocsResponse.model_validate(doc)
             for doc in await db.docs.get_all(page, per_page)
         ]
+    
+    
+    async def get_data(page: int, per_page: int) -> DocsData:
+        '''Страница для GET /, кешируется в content_cache до следующего изменения'''
+        total_items = await DocsTools.get_count()
+        total_pages = math.ceil(total_items / per_page)
+        return DocsData(
+            total_pages=total_pages,
+            total_items=total_items,
+            per_page=per_page,
+            current_page=page,
+            items=await DocsTools.get_all(page, per_page) if total_pages else []
+        )
         
     
     async def swap(first_doc_id: int, second_doc_id) -> list[DocsResponse]:
+        docs = await db.docs.swap(first_doc_id, second_doc_id)
+        content_cache.invalidate(DOCS_CACHE)
+        return [
+            DocsResponse.model_validate(doc)
+            for doc in docs
+        ]
+        
+    
+    async def move(doc_id: int, after_id: int | None) -> DocsResponse:
+        doc = await db.docs.move(doc_id, after_id)
+        content_cache.invalidate(DOCS_CACHE)
+        return DocsResponse.model_validate(doc)
+    
+    
+    async def reorder(doc_ids: list[int]) -> list[DocsResponse]:
+        docs = await db.docs.reorder(doc_ids)
+        content_cache.invalidate(DOCS_CACHE)
         return [
             DocsResponse.model_validate(doc)
-            for doc in await db.docs.swap(first_doc_id, second_doc_id)
+            for doc in docs
         ]
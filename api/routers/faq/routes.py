@@ -1,12 +1,12 @@
-import math
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, Response
 from sqlalchemy.exc import NoResultFound
 
 from api.routers.auth.tools.auth import AuthTools
-from api.routers.faq.schemas import FAQData, FAQRequest, SwapFAQRequest
+from api.routers.faq.schemas import FAQData, FAQRequest, FAQResponse, MoveFAQRequest, ReorderFAQRequest, SwapFAQRequest
 from api.routers.faq.tools.faq import FAQTools
 from custom_types import PermissionsTags
 from database.exceptions import CustomDBExceptions
+from tools.content_cache import FAQ_CACHE, content_cache
 
 
 router = APIRouter(
@@ -15,27 +15,25 @@ router = APIRouter(
 )
 
 
-@router.get('/')
+@router.get('/', response_model=FAQData)
 async def get_faq(
+    request: Request,
     page: int = 1,
     per_page: int = 12,
-) -> FAQData:
-    total_faqs = await FAQTools.get_count()
-    total_pages = math.ceil(total_faqs / per_page)
-    
-    return FAQData(
-        total_pages=total_pages,
-        total_items=total_faqs,
-        per_page=per_page,
-        current_page=page,
-        items = await FAQTools.get_all(page, per_page) if total_pages else []
+) -> Response:
+    '''Cached until faqs change, supports If-None-Match'''
+    entry = await content_cache.get_or_load(
+        FAQ_CACHE,
+        (page, per_page),
+        lambda: FAQTools.get_data(page, per_page)
     )
+    return content_cache.response(entry, request.headers)
     
     
 @router.post('/')
 async def add_faq(
     faq_data: FAQRequest
-):
+) -> FAQResponse:
     return await FAQTools.add(faq_data)
 
 
@@ -50,6 +48,29 @@ async def swap_faqs(
         raise HTTPException(400, detail=ex.message)
 
 
+@router.patch('/reorder')
+async def reorder_faqs(
+    data: ReorderFAQRequest
+) -> list[FAQResponse]:
+    '''Applies the new order of faqs (drag and drop) with one update'''
+    try:
+        return await FAQTools.reorder(data.faq_ids)
+    except CustomDBExceptions as ex:
+        raise HTTPException(400, detail=ex.message)
+
+
+@router.patch('/{faq_id}/move')
+async def move_faq(
+    faq_id: int,
+    data: MoveFAQRequest
+) -> FAQResponse:
+    '''Moves faq right after another one'''
+    try:
+        return await FAQTools.move(faq_id, data.after_id)
+    except CustomDBExceptions as ex:
+        raise HTTPException(400, detail=ex.message)
+
+
 @router.patch('/{faq_id}')
 async def edit_faq(
     faq_id: int,
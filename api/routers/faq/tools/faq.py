@@ -1,22 +1,30 @@
+import math
 from api.routers.admins.tools.admins import db
 from api.routers.faq.schemas import FAQData, FAQResponse
+from tools.content_cache import FAQ_CACHE, content_cache
 
 
 class FAQTools:
     async def delete(faq_id: int):
-        return await db.faq.delete(faq_id) 
+        result = await db.faq.delete(faq_id)
+        content_cache.invalidate(FAQ_CACHE)
+        return result
                 
     
     async def get_count():
         return await db.faq.get_count()
     
     
-    async def add(faq_data: FAQData):
-        return await db.faq.add(faq_data.model_dump())
+    async def add(faq_data: FAQData) -> FAQResponse:
+        faq = await db.faq.add(faq_data.model_dump())
+        content_cache.invalidate(FAQ_CACHE)
+        return FAQResponse.model_validate(faq)
     
     
     async def update(faq_id: int, faq_data: FAQData):
-        return await db.faq.update(faq_id, faq_data.model_dump())
+        faq = await db.faq.update(faq_id, faq_data.model_dump())
+        content_cache.invalidate(FAQ_CACHE)
+        return faq
     
     
     async def get_all(page: int, per_page: int) -> list[FAQResponse]:
@@ -24,10 +32,40 @@ class FAQTools:
             FAQResponse.model_validate(faq)
             for faq in await db.faq.get_all(page, per_page)
         ]
+    
+    
+    async def get_data(page: int, per_page: int) -> FAQData:
+        '''Страница для GET /, кешируется в content_cache до следующего изменения'''
+        total_items = await FAQTools.get_count()
+        total_pages = math.ceil(total_items / per_page)
+        return FAQData(
+            total_pages=total_pages,
+            total_items=total_items,
+            per_page=per_page,
+            current_page=page,
+            items=await FAQTools.get_all(page, per_page) if total_pages else []
+        )
         
     
     async def swap(first_faq_id: int, second_faq_id) -> list[FAQResponse]:
+        faqs = await db.faq.swap(first_faq_id, second_faq_id)
+        content_cache.invalidate(FAQ_CACHE)
+        return [
+            FAQResponse.model_validate(faq)
+            for faq in faqs
+        ]
+        
+    
+    async def move(faq_id: int, after_id: int | None) -> FAQResponse:
+        faq = await db.faq.move(faq_id, after_id)
+        content_cache.invalidate(FAQ_CACHE)
+        return FAQResponse.model_validate(faq)
+    
+    
+    async def reorder(faq_ids: list[int]) -> list[FAQResponse]:
+        faqs = await db.faq.reorder(faq_ids)
+        content_cache.invalidate(FAQ_CACHE)
         return [
             FAQResponse.model_validate(faq)
-            for faq in await db.faq.swap(first_faq_id, second_faq_id)
+            for faq in faqs
         ]
@@ -10,6 +10,7 @@ from api.routers.giveaways.tools.giveaways import GiveawaysTools
 from api.routers.statistics.tools.statistics import StatisticTools
 from config import DATE_FORMAT, FRONT_DATE_FORMAT, FRONT_TIME_FORMAT
 from database.exceptions import CustomDBExceptions
+from tools.responses import PydanticResponse
 
 
 router = APIRouter(
@@ -97,28 +98,30 @@ async def edit_giveaway(
         raise HTTPException(status_code=400, detail=ex.message)
 
 
-@router.get('/history', tags=['Giveaways.History'])
+@router.get('/history', tags=['Giveaways.History'], response_model=GiveawaysHistoryData)
 async def get_giveaways_history(
     page:               int = Query(1, gt=0),
     per_page:           int = Query(10, gt=0),
     order_by:           Literal['end_date',] | None = Query(None),
     order_direction:    Literal['desc', 'asc'] | None = Query(None)
     
-) -> GiveawaysHistoryData:
+) -> PydanticResponse:
     total_admins = await GiveawaysTools.get_history_count()
     total_pages = math.ceil(total_admins / per_page)
     
-    return GiveawaysHistoryData(
-        total_pages=total_pages,
-        total_items=total_admins,
-        per_page=per_page,
-        current_page=page,
-        items = await GiveawaysTools.get_history(
-            page=page,
+    return PydanticResponse(
+        GiveawaysHistoryData(
+            total_pages=total_pages,
+            total_items=total_admins,
             per_page=per_page,
-            order_by=order_by,
-            order_direction=order_direction 
-        ) if total_pages else []
+            current_page=page,
+            items = await GiveawaysTools.get_history(
+                page=page,
+                per_page=per_page,
+                order_by=order_by,
+                order_direction=order_direction 
+            ) if total_pages else []
+        )
     )
 
 
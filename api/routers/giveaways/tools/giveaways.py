@@ -105,31 +105,27 @@ class GiveawaysTools:
         prizes_data: list[Prize],
         prizes_photos: list[UploadFile]
     ):
-        prizes_data: list[dict] = [
-            prize.model_dump(exclude=['id'])
-            for prize in prizes_data
-        ]
-        prizes=await db.giveaways.add_prizes(
+        prizes = await db.giveaways.add_prizes(
             giveaway_id=giveaway_id,
-            prizes_data=prizes_data
+            prizes_data=[
+                prize.model_dump(exclude=['id'])
+                for prize in prizes_data
+            ]
         )
-        photos_paths = await asyncio.gather(
-            *[
-                PhotoTools.save_photo(
-                    path=f'static/giveaways/{giveaway_id}', 
-                    photo=photo,
-                    filename=str(prizes[i].id)
-                )
-                for i, photo in enumerate(prizes_photos)
+        photos_paths = await PhotoTools.save_photos(
+            path=f'static/giveaways/{giveaway_id}',
+            photos=[
+                (photo, prize.id)
+                for prize, photo in zip(prizes, prizes_photos)
+            ]
+        )
+        await db.giveaways.update_prizes(
+            giveaway_id=giveaway_id,
+            prizes_data=[
+                {'id': prize.id, 'photo': photo_path}
+                for prize, photo_path in zip(prizes, photos_paths)
             ]
         )
-        for i, prize in enumerate(prizes):
-            prize.photo = photos_paths[i]
-            await db.giveaways.update_prize(
-                prize_id=prize.id,
-                giveaway_id=giveaway_id,
-                photo=photos_paths[i]
-            )
     
     
     async def add(**new_giveaway_data) -> Giveaway:
@@ -162,48 +158,45 @@ class GiveawaysTools:
             else:
                 old_prizes.append(prize)
                 old_photos.append(prizes_photos[i])
-        
-        prizes_data = old_prizes
-        prizes_photos = old_photos
                     
         curr_giveaway_prizes = {
             prize['id']: prize
-            for prize in dict(await db.giveaways.get_all(giveaway_id=giveaway_id))['prizes']
+            for prize in (await db.giveaways.get_one(giveaway_id))['prizes']
         }
-        curr_giveaway_prizes_ids = curr_giveaway_prizes.keys()
         
         # если у нас удалили какой то приз, то удаляем его из бд
-        if len(prizes_data) < len(curr_giveaway_prizes):
-            new_giveaway_prizes_ids = {
-                prize.id
-                for prize in prizes_data
-            }
-            needed_delete_ids = set(curr_giveaway_prizes_ids) - set(new_giveaway_prizes_ids)
+        needed_delete_ids = set(curr_giveaway_prizes) - {prize.id for prize in old_prizes}
+        if needed_delete_ids:
+            await db.giveaways.delete_prizes(giveaway_id, list(needed_delete_ids))
             for prize_id in needed_delete_ids:
-                await db.giveaways.delete_prize(prize_id)
                 logger.debug(curr_giveaway_prizes[prize_id]['photo'])
                 if curr_giveaway_prizes[prize_id]['photo'] is not None:
                     await PhotoTools.delete_file(
                         file_path=curr_giveaway_prizes[prize_id]['photo']
                     )
-                
-        for i, prize in enumerate(prizes_data):
-            logger.debug(f"{prize=}")
-            await db.giveaways.update_prize(
-                prize_id = prize.id,
-                giveaway_id=giveaway_id,
-                **prize.model_dump(exclude=['id'])
-            )
-            await PhotoTools.save_photo(
-                path=f'static/giveaways/{giveaway_id}',
-                photo=prizes_photos[i],
-                filename=prize.id
-            )
-                
-        await GiveawaysTools.add_prizes(
+        
+        # Новые призы вставляем одним запросом, чтобы получить id для имен файлов
+        added_prizes = await db.giveaways.add_prizes(
             giveaway_id=giveaway_id,
-            prizes_data=new_prizes,
-            prizes_photos=new_photos
+            prizes_data=[
+                prize.model_dump(exclude=['id'])
+                for prize in new_prizes
+            ]
+        )
+        prizes_ids = [prize.id for prize in old_prizes] + [prize.id for prize in added_prizes]
+        photos_paths = await PhotoTools.save_photos(
+            path=f'static/giveaways/{giveaway_id}',
+            photos=list(zip(old_photos + new_photos, prizes_ids))
+        )
+        await db.giveaways.update_prizes(
+            giveaway_id=giveaway_id,
+            prizes_data=[
+                {**prize.model_dump(exclude=['id']), 'id': prize.id, 'photo': photo_path}
+                for prize, photo_path in zip(old_prizes, photos_paths)
+            ] + [
+                {'id': prize_id, 'photo': photo_path}
+                for prize_id, photo_path in zip(prizes_ids[len(old_prizes):], photos_paths[len(old_prizes):])
+            ]
         )
             
         await db.giveaways.update(
@@ -214,9 +207,7 @@ class GiveawaysTools:
     
     
     async def get(giveaway_id: int) -> Giveaway:
-        result = dict(
-            await db.giveaways.get_all(giveaway_id=giveaway_id)
-        )
+        result = await db.giveaways.get_one(giveaway_id)
         for i, prize in enumerate(result['prizes']):
             prize['photo'] = f"{BASE_ADMIN_URL}/{prize['photo']}" if prize['photo'] else None
         return Giveaway.model_validate(
@@ -1,12 +1,14 @@
 from ast import Str
 from datetime import datetime, time
 import math
+import os
 import re
 from typing import Literal, Optional, Union
 from fastapi import APIRouter, Body, Depends, File, Form, Query, HTTPException, UploadFile
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from api.routers.dashboards.tools.dashboards import DashboardsTools
-from api.routers.tasks.schemas import SupportedGiveaway, Task, TasksData
+from api.routers.tasks.schemas import SupportedGiveaway, Task, TaskParticipantsData, TasksData, TasksImportResult, check_task_check_type, check_task_target
 from api.routers.tasks.tools.tasks import TasksTools
 from database.exceptions import CustomDBExceptions
 
@@ -45,14 +47,65 @@ async def get_tasks(
     )
     
 
+@router.get('/participants/{task_id}')
+async def get_participants(
+    task_id:    int,
+    after:      int | None = Query(None, description='next_cursor предыдущей страницы'),
+    per_page:   int = Query(50, gt=0, le=1000)
+) -> TaskParticipantsData:
+    return await TasksTools.get_participants(
+        task_id=task_id,
+        after_user_id=after,
+        per_page=per_page
+    )
+
+
 @router.get('/participants/report/{task_id}')
-async def get_participants_report(task_id: int) -> StreamingResponse:
-    participants = await TasksTools.get_participants(task_id=task_id)  
-    output = await TasksTools.get_participants_report(participants)
+async def get_participants_report(
+    task_id:    int,
+    format:     Literal['xlsx', 'csv'] = 'xlsx'
+):
     headers = {
-        'Content-Disposition': f'attachment; filename="task{task_id}.xlsx"'
+        'Content-Disposition': f'attachment; filename="task{task_id}.{format}"'
     }
-    return StreamingResponse(output, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers=headers)
+    if format == 'csv':
+        return StreamingResponse(
+            TasksTools.iter_participants_csv(task_id),
+            media_type='text/csv',
+            headers=headers
+        )
+    
+    report_path = await TasksTools.get_participants_report(task_id)
+    return FileResponse(
+        report_path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers=headers,
+        background=BackgroundTask(os.remove, report_path)
+    )
+
+
+@router.post('/import')
+async def import_tasks(
+    file:           UploadFile = File(..., description='xlsx/xls/csv/json, колонки как у экспорта'),
+    skip_invalid:   bool = Query(False, description='Добавить валидные строки, даже если в файле есть ошибки')
+) -> TasksImportResult:
+    return await TasksTools.import_tasks(file, skip_invalid=skip_invalid)
+
+
+@router.get('/export')
+async def export_tasks(
+    format:     Literal['xlsx', 'csv', 'json'] = 'xlsx'
+):
+    media_types = {
+        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'csv': 'text/csv',
+        'json': 'application/json',
+    }
+    return Response(
+        await TasksTools.export_tasks(format),
+        media_type=media_types[format],
+        headers={'Content-Disposition': f'attachment; filename="tasks.{format}"'}
+    )
 
 
 @router.post('/task')
@@ -71,32 +124,17 @@ async def add_task(
     postback_url:   Union[str, Literal['']] = Form('', description='Если выбран check_type="postback", то обязательное поле.'),
     photo:          Union[UploadFile, Literal['']] = File('')
 ) -> Task:
-    # Проверяем чек тайп при таргете
-    if 'bk_' in target:
-        if check_type not in {'timer', 'handle', 'postback'}:
-            raise HTTPException(400, detail="Bad request: if target='bk_'+bk_name check_type should been in {'timer', 'handle', 'postback'}")
-    elif target in {'vk', 'tg'}:
-        if check_type not in {'auto', 'handle', 'timer'} :
-            raise HTTPException(400, detail=f"Bad request: if target='{target}' check_type should been in {{'auto', 'handle', 'timer'}}")
-    else:
-        raise HTTPException(400, detail=f'Bad request: target sould been any in {{"vk", "tg", "bk_" + bk_name}}')
+    # Те же проверки, что у строк массового импорта (TaskImportRow)
+    try:
+        check_task_target(target, check_type)
+        check_task_check_type(check_type, timer, postback_url)
+    except ValueError as ex:
+        raise HTTPException(400, detail=f'Bad request: {ex}')
     
     if isinstance(complete_count, int):
         if complete_count < 1:
             raise HTTPException(400, detail='Bad request: complete_count should been >= 1')
         
-    if check_type == 'timer':
-        if timer == '' or timer is None:
-            raise HTTPException(400, detail='Bad request: "timer" is required if check_type="timer"')
-        pattern = r'^\d{2}:\d{2}:\d{2}$'
-        if not re.match(pattern, timer):
-            raise HTTPException(400, detail='Bad request: Timer format: HH:MM:SS')
-    
-    if check_type == 'postback':
-        if postback_url == '' or postback_url is None:
-            raise HTTPException(400, detail='Bad request: "postback_url" is required if check_type="postback"')
-
-        
     return await TasksTools.add(
         title=title,
         small_descr=subtitle if subtitle != '' else None,
@@ -133,16 +171,10 @@ async def edit_task(
         if complete_count < 1:
             raise HTTPException(400, detail='Bad request: complete_count should been >= 1')
         
-    if check_type == 'timer':
-        if timer == '' or timer is None:
-            raise HTTPException(400, detail='Bad request: "timer" is required if check_type="timer"')
-        pattern = r'^\d{2}:\d{2}:\d{2}$'
-        if not re.match(pattern, timer):
-            raise HTTPException(400, detail='Bad request: timer format: HH:MM:SS')
-    
-    if check_type == 'postback':
-        if postback_url == '' or postback_url is None:
-            raise HTTPException(400, detail='Bad request: "postback_url" is required if check_type="postback"')
+    try:
+        check_task_check_type(check_type, timer, postback_url)
+    except ValueError as ex:
+        raise HTTPException(400, detail=f'Bad request: {ex}')
         
     return await TasksTools.update(
         task_id =       task_id,
@@ -1,7 +1,11 @@
-from datetime import datetime, timedelta
-from pydantic import BaseModel, ConfigDict, field_validator
+from datetime import datetime, time, timedelta
+import math
+import re
+from typing import Literal
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 from config import BASE_ADMIN_URL, FRONT_DATE_FORMAT, FRONT_TIME_FORMAT
+from database.models import TaskTemplate
 
 
 CHECK_TYPES_MAP = {
@@ -13,6 +17,32 @@ CHECK_TYPES_MAP = {
 }   
 
 
+TIMER_PATTERN = r'^\d{2}:\d{2}:\d{2}$'
+
+
+def check_task_target(target: str, check_type: str):
+    '''Допустимые check_type для target. Общая проверка POST /tasks/task и импорта, ValueError при ошибке'''
+    if 'bk_' in target:
+        if check_type not in {'timer', 'handle', 'postback'}:
+            raise ValueError("if target='bk_'+bk_name check_type should been in {'timer', 'handle', 'postback'}")
+    elif target in {'vk', 'tg'}:
+        if check_type not in {'auto', 'handle', 'timer'}:
+            raise ValueError(f"if target='{target}' check_type should been in {{'auto', 'handle', 'timer'}}")
+    else:
+        raise ValueError('target sould been any in {"vk", "tg", "bk_" + bk_name}')
+
+
+def check_task_check_type(check_type: str | None, timer: str | None, postback_url: str | None):
+    '''Поля, обязательные для check_type. Общая проверка создания, редактирования и импорта задач'''
+    if check_type == 'timer':
+        if not timer:
+            raise ValueError('"timer" is required if check_type="timer"')
+        if not re.match(TIMER_PATTERN, timer):
+            raise ValueError('Timer format: HH:MM:SS')
+    if check_type == 'postback' and not postback_url:
+        raise ValueError('"postback_url" is required if check_type="postback"')
+
+
 class TaskParticipant(BaseModel):
     task_id:            int
     user_id:            int
@@ -26,6 +56,14 @@ class TaskParticipant(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TaskParticipantsData(BaseModel):
+    total_items:    int
+    per_page:       int
+    next_cursor:    int | None = Field(None, description='Передать в after для следующей страницы, null - страниц больше нет')
+    
+    items:          list[TaskParticipant]
+
+
 class Task(BaseModel):
     id:             int
     title:          str
@@ -80,4 +118,94 @@ class SupportedGiveaway(BaseModel):
     id: int
     name: str
     
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TaskImportRow(BaseModel):
+    '''Строка массового импорта, поля и проверки как у POST /tasks/task'''
+    title:          str
+    subtitle:       str | None = None
+    is_active:      bool
+    reward:         int | None = None
+    giveaway_id:    int | None = None
+    redirect_url:   str | None = None
+    check_type:     Literal['auto', 'handle', 'timer', 'postback']
+    target:         str
+    complete_count: int = Field(1, ge=1)
+    description:    str
+    timer:          str | None = None
+    postback_url:   str | None = None
+    
+    
+    @field_validator('*', mode='before')
+    def empty_to_none(cls, value):
+        # Пустые ячейки таблиц приходят как '' или NaN
+        if value == '' or (isinstance(value, float) and math.isnan(value)):
+            return None
+        return value
+    
+    
+    @field_validator('timer', mode='before')
+    def format_timer(cls, value):
+        # Ячейка с форматом времени в xlsx читается как time
+        if isinstance(value, time):
+            return value.strftime('%H:%M:%S')
+        return Task.format_timer(value)
+    
+    
+    @model_validator(mode='after')
+    def validate_check_type(self):
+        check_task_target(self.target, self.check_type)
+        check_task_check_type(self.check_type, self.timer, self.postback_url)
+        return self
+    
+    
+    def to_db(self) -> dict:
+        '''Поля tasks_templates'''
+        timer_value = None
+        if self.timer:
+            hours, minutes, seconds = map(int, self.timer.split(':'))
+            timer_value = timedelta(hours=hours, minutes=minutes, seconds=seconds)
+        return {
+            'title': self.title,
+            'small_descr': self.subtitle,
+            'active': self.is_active,
+            'tickets': self.reward,
+            'gift_giveaway_id': self.giveaway_id,
+            'redirect_url': self.redirect_url,
+            'check_type': self.check_type,
+            'target': self.target,
+            'complete_count': self.complete_count,
+            'big_descr': self.description,
+            'timer_value': timer_value,
+            'postback_url': self.postback_url,
+        }
+    
+    
+    @classmethod
+    def from_db(cls, task: TaskTemplate) -> 'TaskImportRow':
+        return cls.model_construct(
+            title=task.title,
+            subtitle=task.small_descr,
+            is_active=task.active,
+            reward=task.tickets,
+            giveaway_id=task.gift_giveaway_id,
+            redirect_url=task.redirect_url,
+            check_type=task.check_type,
+            target=task.target,
+            complete_count=task.complete_count or 1,
+            description=task.big_descr,
+            timer=Task.format_timer(task.timer_value),
+            postback_url=task.postback_url,
+        )
+
+
+class TaskImportError(BaseModel):
+    row:    int = Field(..., description='Номер строки в файле, начиная с 1 (без заголовка)')
+    errors: list[str]
+
+
+class TasksImportResult(BaseModel):
+    inserted:   int
+    ids:        list[int]
+    errors:     list[TaskImportError]
@@ -1,14 +1,37 @@
-from datetime import timedelta
+import asyncio
+import csv
+from datetime import datetime, timedelta
 import io
-from fastapi import HTTPException
+import json
+import os
+import tempfile
+from typing import AsyncIterator, Literal
+from fastapi import HTTPException, UploadFile
 from jedi.inference import value
+from openpyxl import Workbook
 import pandas as pd
-from api.routers.tasks.schemas import SupportedGiveaway, Task, TaskParticipant, TasksData
+from pydantic import ValidationError
+from api.routers.tasks.schemas import (
+    SupportedGiveaway,
+    Task,
+    TaskImportError,
+    TaskImportRow,
+    TaskParticipant,
+    TaskParticipantsData,
+    TasksData,
+    TasksImportResult
+)
 from database import db
 from database.exceptions import CustomDBExceptions
 from tools.photos import PhotoTools
 
 
+# Размер куска CSV отчета
+REPORT_CHUNK_SIZE = 64 * 1024
+# Форматы массового импорта/экспорта шаблонов задач
+TASKS_FILE_FORMATS = ('xlsx', 'xls', 'csv', 'json')
+
+
 class TasksTools:
     async def update(
         task_id: int,   
@@ -82,27 +105,140 @@ class TasksTools:
         return await db.tasks.get_count()
     
     
-    async def get_participants(task_id: int) -> list[TaskParticipant]:
-        return [
+    async def get_participants(
+        task_id: int,
+        after_user_id: int | None,
+        per_page: int
+    ) -> TaskParticipantsData:
+        participants = [
             TaskParticipant.model_validate(participant)
-            for participant in await db.tasks.get_participants(task_id)
+            for participant in await db.tasks.get_participants(
+                task_id,
+                after_user_id=after_user_id,
+                limit=per_page
+            )
         ]
+        return TaskParticipantsData(
+            total_items=await db.tasks.get_participants_count(task_id),
+            per_page=per_page,
+            next_cursor=participants[-1].user_id if len(participants) == per_page else None,
+            items=participants
+        )
         
     
-    async def get_participants_report(participants: list[TaskParticipant]):
-        if len(participants) > 0:    
-            df = pd.DataFrame([row.model_dump() for row in participants])
-        else:
-            # Создаем DataFrame с колонками из Pydantic-модели
-            df = pd.DataFrame(columns=TaskParticipant.model_fields.keys())
-        # Записываем в память (в буфер)
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
-        output.seek(0)  # возвращаемся в начало буфера
+    async def iter_participants_csv(task_id: int) -> AsyncIterator[bytes]:
+        '''CSV отчет по участникам, отдается кусками по мере чтения курсора'''
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(TaskParticipant.model_fields.keys())
+        async for participant in db.tasks.stream_participants(task_id):
+            writer.writerow(TaskParticipant.model_validate(participant).model_dump().values())
+            if buffer.tell() >= REPORT_CHUNK_SIZE:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+        
+    
+    async def get_participants_report(task_id: int) -> str:
+        '''
+        xlsx отчет по участникам. Строки пишутся в write-only книгу openpyxl прямо из курсора,
+        книга сохраняется во временный файл.
+        :return: путь к файлу, удалить после отправки
+        '''
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(list(TaskParticipant.model_fields.keys()))
+        async for participant in db.tasks.stream_participants(task_id):
+            sheet.append(list(TaskParticipant.model_validate(participant).model_dump().values()))
 
-        # Отправляем как файл
-        return output
+        fd, report_path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        await asyncio.to_thread(workbook.save, report_path)
+        return report_path
+    
+    
+    @staticmethod
+    def _read_tasks_file(content: bytes, file_format: str) -> list[dict]:
+        '''Строки файла импорта в виде словарей, колонки - поля TaskImportRow'''
+        match file_format:
+            case 'json':
+                rows = json.loads(content)
+                if not isinstance(rows, list):
+                    raise ValueError('JSON should be a list of tasks')
+                return rows
+            case 'csv':
+                frame = pd.read_csv(io.BytesIO(content), dtype=str, keep_default_na=False)
+            case _:
+                # calamine читает и xlsx, и старый xls
+                frame = pd.read_excel(io.BytesIO(content), engine='calamine', dtype=object)
+        frame.columns = [str(column).strip() for column in frame.columns]
+        return frame.to_dict(orient='records')
+    
+    
+    async def import_tasks(file: UploadFile, skip_invalid: bool = False) -> TasksImportResult:
+        '''
+        Массовый импорт шаблонов задач. Каждая строка проверяется как форма POST /tasks/task,
+        затем все валидные строки вставляются одним многострочным INSERT в одной транзакции.
+        Если есть ошибки и skip_invalid=False - ничего не вставляется, возвращаются ошибки.
+        '''
+        file_format = (file.filename or '').rsplit('.', 1)[-1].lower()
+        if file_format not in TASKS_FILE_FORMATS:
+            raise HTTPException(400, detail=f'Bad request: file format should been in {TASKS_FILE_FORMATS}')
+        
+        try:
+            rows = await asyncio.to_thread(TasksTools._read_tasks_file, await file.read(), file_format)
+        except Exception as ex:
+            raise HTTPException(400, detail=f'Bad request: can not read file: {ex}')
+        
+        tasks, errors = [], []
+        created_at = datetime.now()
+        for row_number, row in enumerate(rows, start=1):
+            try:
+                tasks.append({**TaskImportRow.model_validate(row).to_db(), 'created_at': created_at})
+            except ValidationError as ex:
+                errors.append(
+                    TaskImportError(
+                        row=row_number,
+                        errors=[
+                            f"{'.'.join(map(str, error['loc']))}: {error['msg']}" if error['loc'] else error['msg']
+                            for error in ex.errors()
+                        ]
+                    )
+                )
+        
+        if errors and not skip_invalid:
+            return TasksImportResult(inserted=0, ids=[], errors=errors)
+        
+        ids = await db.tasks.add_many(tasks)
+        return TasksImportResult(inserted=len(ids), ids=ids, errors=errors)
+    
+    
+    async def export_tasks(file_format: Literal['xlsx', 'csv', 'json']) -> bytes:
+        '''Все шаблоны задач в формате импорта, файл можно загрузить обратно'''
+        tasks = [
+            TaskImportRow.from_db(task).model_dump()
+            for task in await db.tasks.get_templates()
+        ]
+        columns = list(TaskImportRow.model_fields.keys())
+        match file_format:
+            case 'json':
+                return json.dumps(tasks, ensure_ascii=False).encode()
+            case 'csv':
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(tasks)
+                return buffer.getvalue().encode()
+            case _:
+                workbook = Workbook(write_only=True)
+                sheet = workbook.create_sheet()
+                sheet.append(columns)
+                for task in tasks:
+                    sheet.append([task[column] for column in columns])
+                buffer = io.BytesIO()
+                await asyncio.to_thread(workbook.save, buffer)
+                return buffer.getvalue()
     
     
     async def get_supported_giveaways() -> list[SupportedGiveaway]:
@@ -1,13 +1,14 @@
 from datetime import datetime
 import math
 from typing import Literal
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, File, Query, HTTPException, UploadFile
 
 from api.routers.auth.tools.auth import AuthTools
-from api.routers.users.schemas import EditUserRequest, UserFilters, UserResponse, UsersData
+from api.routers.users.schemas import EditUserRequest, UserFilters, UserResponse, UsersData, UsersImportResult
 from api.routers.users.tools.users import UsersTools
 from config import FRONT_DATE_FORMAT, FRONT_TIME_FORMAT
 from custom_types import PermissionsTags
+from tools.responses import PydanticResponse
 from database.exceptions import CustomDBExceptions
 from loguru import logger
 
@@ -19,14 +20,14 @@ router = APIRouter(
 )
 
 
-@router.get('/')
+@router.get('/', response_model=UsersData)
 async def get_all_users(
     page:               int = Query(default=1, gt=0),
     per_page:           int = Query(default=12, gt=0, max=20),
     filter:             UserFilters = Depends(),
     order_by:           Literal['user_id'] = "user_id",
     order_direction:    Literal['desc', 'asc'] = "asc"
-) -> UsersData:
+) -> PydanticResponse:
     for field in ("created_at_end", "created_at_start"):
         attr = getattr(filter, field)
         if isinstance(attr, str):
@@ -58,15 +59,25 @@ async def get_all_users(
         filter=filter
     )
     total_pages = math.ceil(total_items / per_page)
-    return UsersData(
-        total_pages=total_pages,
-        total_items=total_items,
-        per_page=per_page,
-        current_page=page,
-        items = users
+    return PydanticResponse(
+        UsersData(
+            total_pages=total_pages,
+            total_items=total_items,
+            per_page=per_page,
+            current_page=page,
+            items = users
+        )
     )
 
 
+@router.post('/import')
+async def import_users(
+    file: UploadFile = File(..., description='Выгрузка GameSport: csv, xlsx или jsonl')
+) -> UsersImportResult:
+    '''Для выгрузок на миллионы строк удобнее python -m tools.users_import'''
+    return await UsersTools.import_users(file)
+
+
 @router.patch('/{user_id}')
 async def edit_user(
     user_id: int,
@@ -78,4 +78,13 @@ class UserFilters(BaseModel):
     
     created_at_start:   Optional[str|datetime] = None
     created_at_end:     Optional[str|datetime] = None
-    
\ No newline at end of file
+    
+
+
+class UsersImportResult(BaseModel):
+    total:      int = Field(..., description='Строк загружено в БД')
+    inserted:   int
+    updated:    int
+    conflicted: int = Field(..., description='Ключи строки повторяются в файле или указывают на разных пользователей')
+    invalid:    int = Field(..., description='Строки, которые не удалось разобрать')
+    errors:     list[str]
@@ -1,12 +1,38 @@
+import os
+import tempfile
 from typing import Literal
+import aiofiles
+from fastapi import HTTPException, UploadFile
 from loguru import logger
 from dataclasses import field
-from api.routers.users.schemas import EditUserRequest, UserFilters, UserResponse
+from api.routers.users.schemas import EditUserRequest, UserFilters, UserResponse, UsersImportResult
 from database import db
 from database.exceptions import UserNotFound
+from tools.users_import import USERS_IMPORT_FORMATS, import_users_file
+
+
+# Размер чанка при сохранении выгрузки на диск
+IMPORT_UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
 class UsersTools:
+    async def import_users(file: UploadFile) -> UsersImportResult:
+        '''Выгрузка сохраняется во временный файл и импортируется потоково, см. tools/users_import.py'''
+        file_format = (file.filename or '').rsplit('.', 1)[-1].lower()
+        if file_format not in USERS_IMPORT_FORMATS:
+            raise HTTPException(400, detail=f'Bad request: file format should been in {USERS_IMPORT_FORMATS}')
+        
+        fd, path = tempfile.mkstemp(suffix=f'.{file_format}')
+        os.close(fd)
+        try:
+            async with aiofiles.open(path, 'wb') as f:
+                while chunk := await file.read(IMPORT_UPLOAD_CHUNK_SIZE):
+                    await f.write(chunk)
+            return UsersImportResult(**await import_users_file(path, file_format))
+        finally:
+            os.remove(path)
+    
+    
     async def update(user_id: int, user_data: EditUserRequest) -> UserResponse:
         updated_user = await db.users.update_user(
             user_id,
@@ -1,15 +1,30 @@
+from contextlib import asynccontextmanager
 import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
 from api.routers import api_router
 from loguru import logger
+from database.invalidation import invalidation_bus
+from tools.assets import assets
+from tools.responses import GZIP_MINIMUM_SIZE
 
-app = FastAPI()
-api = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # LISTEN на инвалидацию кешей, у каждого воркера свое соединение
+    await invalidation_bus.start()
+    yield
+    await invalidation_bus.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+api = FastAPI(default_response_class=ORJSONResponse)
 
 api.include_router(api_router)
+api.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 logger.debug('Teeeeeeeeeeeeeeeeeeest appp')
 os.makedirs('static', exist_ok=True)
 app.mount('/admin_panel', api, "API")
@@ -21,7 +36,7 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["Authorization"]
 )
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", assets.static_app(), name="static")
 
 if __name__ == '__main__':
     
@@ -0,0 +1,239 @@
+'''
+Пропускная способность рассылки: Campaign.run на синтетических аудиториях против benchmarks.fake_telegram.
+
+Для каждого размера аудитории: сообщений в секунду (доставленных и всех ответов API), пиковая память
+процесса (RSS, прирост от начала прогона) и пик открытых сокетов. Ответы фейкового API по кодам - из его /stats.
+Campaign.run работает с настоящей БД (DB_URL) - частотный лимит и список подавления пишутся как в проде,
+синтетические получатели удаляются из них до и после прогона.
+
+    python -m benchmarks.campaign_throughput --audiences 10000 100000 1000000
+    python -m benchmarks.campaign_throughput --rate 0 --blocked-share 0.2 --photo photos/banner.png
+
+Память и сокеты читаются из /proc, замер работает только на Linux.
+'''
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+from benchmarks import fake_telegram
+
+
+# Заведомо не существующие в Telegram id, по ним же синтетические получатели удаляются из БД
+SYNTHETIC_TG_ID_START = 9_000_000_000_000
+SAMPLE_INTERVAL = 0.05
+CRON_EXPRESSION = '0 * * * *'
+
+
+def rss_bytes() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def open_sockets() -> int:
+    sockets = 0
+    for fd in os.listdir('/proc/self/fd'):
+        try:
+            sockets += os.readlink(f'/proc/self/fd/{fd}').startswith('socket:')
+        except OSError:
+            pass
+    return sockets
+
+
+@dataclass
+class ResourceSampler:
+    '''Пики RSS и открытых сокетов, пока идет прогон'''
+    base_rss: int = field(default_factory=rss_bytes)
+    peak_rss: int = 0
+    peak_sockets: int = 0
+
+    def sample(self):
+        self.peak_rss = max(self.peak_rss, rss_bytes())
+        self.peak_sockets = max(self.peak_sockets, open_sockets())
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+
+def make_campaign(audience: list[int], photo: str | None):
+    from campaign_scheduler.campaign_sheduler import Campaign
+    from campaign_scheduler.custom_types import CampaignDTO, TriggerDTO
+    from campaign_scheduler.triggers import CampaignTrigger, TelegramUserID
+
+    @dataclass
+    class SyntheticAudienceTrigger(CampaignTrigger):
+        audience: list[TelegramUserID] = field(default_factory=list)
+
+        async def get_users_pull(self) -> set[TelegramUserID]:
+            return set(self.audience)
+
+    campaign = Campaign(
+        CampaignDTO(
+            id=0,
+            name='benchmark',
+            type='trigger',
+            title='Benchmark',
+            text='Campaign throughput benchmark',
+            button_text='Open',
+            button_url='https://example.com',
+            photo=photo,
+            photo_file_id=None,
+            timer=None,
+            is_active=True,
+            shedulet_at=None,
+            created_at=datetime.now(),
+            triggers=[TriggerDTO(id=1, name='benchmark', cron_expression=CRON_EXPRESSION, trigger_params=None)],
+        )
+    )
+    campaign.triggers = [
+        SyntheticAudienceTrigger(
+            id=0,
+            name='synthetic',
+            trigger_params=None,
+            cron_expression=CRON_EXPRESSION,
+            audience=audience
+        )
+    ]
+    return campaign
+
+
+async def cleanup(tg_ids: list[str]):
+    '''Синтетические получатели не должны остаться в частотном лимите и списке подавления'''
+    from sqlalchemy import text
+    from campaign_scheduler.db_interface import db
+
+    async with db.async_ses() as session:
+        for table in ('campaigns_suppressions', 'campaigns_delivery_counters'):
+            await session.execute(
+                text(f'DELETE FROM {table} WHERE tg_id = ANY(CAST(:tg_ids AS varchar[]))'),
+                {'tg_ids': tg_ids}
+            )
+        await session.commit()
+
+
+async def fake_stats(session: aiohttp.ClientSession, fake_url: str, reset: bool = False) -> dict:
+    async with session.get(f'{fake_url}/stats', params={'reset': '1'} if reset else None) as response:
+        return await response.json()
+
+
+async def run_audience(size: int, photo: str | None, fake_url: str, session: aiohttp.ClientSession) -> dict:
+    audience = list(range(SYNTHETIC_TG_ID_START, SYNTHETIC_TG_ID_START + size))
+    tg_ids = [str(tg_id) for tg_id in audience]
+    await cleanup(tg_ids)
+    await fake_stats(session, fake_url, reset=True)
+    campaign = make_campaign(audience, photo)
+
+    sampler = ResourceSampler()
+    sampling = asyncio.create_task(sampler.run())
+    error = None
+    started = time.perf_counter()
+    try:
+        await campaign.run()
+    except Exception as ex:
+        # Например, исчерпан лимит открытых файлов - это тоже результат замера
+        error = repr(ex)
+    elapsed = time.perf_counter() - started
+    sampling.cancel()
+    sampler.sample()
+
+    responses = (await fake_stats(session, fake_url))['responses']
+    await cleanup(tg_ids)
+    answered = sum(responses.values())
+    return {
+        'audience': size,
+        'seconds': round(elapsed, 2),
+        'delivered_per_second': round(responses.get('200', 0) / elapsed, 1) if elapsed else 0.0,
+        'responses_per_second': round(answered / elapsed, 1) if elapsed else 0.0,
+        'responses': responses,
+        'peak_rss_mb': round((sampler.peak_rss - sampler.base_rss) / 2**20, 1),
+        'peak_sockets': sampler.peak_sockets,
+        'error': error,
+    }
+
+
+async def wait_for_fake(session: aiohttp.ClientSession, fake_url: str, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await fake_stats(session, fake_url)
+            return
+        except aiohttp.ClientError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def print_report(results: list[dict]):
+    print(f'{"audience":>10}{"seconds":>10}{"msg/s":>10}{"resp/s":>10}{"RSS, MB":>10}{"sockets":>9}  responses')
+    for result in results:
+        print(
+            f'{result["audience"]:>10}{result["seconds"]:>10.1f}{result["delivered_per_second"]:>10.1f}'
+            f'{result["responses_per_second"]:>10.1f}{result["peak_rss_mb"]:>10.1f}{result["peak_sockets"]:>9}'
+            f'  {result["responses"]}{" ERROR " + result["error"] if result["error"] else ""}'
+        )
+
+
+async def main(args: argparse.Namespace) -> int:
+    # Статистика фейкового API отдельным соединением, чтобы не попадать в замер сокетов рассылки
+    async with aiohttp.ClientSession() as session:
+        await wait_for_fake(session, args.fake_url)
+        results = []
+        for size in args.audiences:
+            results.append(await run_audience(size, args.photo, args.fake_url, session))
+            print(f'{size}: {results[-1]}', file=sys.stderr)
+
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(result['error'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--audiences', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--photo', help='путь фото кампании, без него - sendMessage')
+    parser.add_argument('--port', type=int, default=8081, help='порт фейкового Telegram API')
+    parser.add_argument('--fake-url', help='уже запущенный benchmarks.fake_telegram, иначе он запускается здесь')
+    parser.add_argument('--frequency-cap', type=int, default=0, help='CAMPAIGN_FREQUENCY_CAP, 0 - без лимита')
+    parser.add_argument('--output', help='сохранить результаты в json')
+    fake_telegram.add_config_arguments(parser)
+    args = parser.parse_args()
+
+    fake_process = None
+    if not args.fake_url:
+        args.fake_url = f'http://127.0.0.1:{args.port}'
+        fake_args = [
+            f'--{name.replace("_", "-")}={value}'
+            for name, value in vars(fake_telegram.parse_config(args)).items()
+        ]
+        # Отдельный процесс: фейковый API не делит event loop и CPU с рассылкой
+        fake_process = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.fake_telegram', f'--port={args.port}', *fake_args]
+        )
+
+    # config читает окружение при импорте, поэтому модули рассылки импортируются после этого
+    os.environ['TG_API_URL'] = args.fake_url
+    os.environ.setdefault('TG_BOT_TOKEN', 'benchmark')
+    os.environ['CAMPAIGN_FREQUENCY_CAP'] = str(args.frequency_cap)
+
+    from loguru import logger
+    # Ответ на каждое недоставленное сообщение логируется в DEBUG
+    logger.remove()
+    logger.add(sys.stderr, level='INFO')
+    try:
+        exit_code = asyncio.run(main(args))
+    finally:
+        if fake_process is not None:
+            fake_process.terminate()
+            fake_process.wait()
+    sys.exit(exit_code)
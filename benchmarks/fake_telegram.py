@@ -0,0 +1,154 @@
+'''
+Локальная замена Telegram Bot API для замеров рассылок (sendMessage, sendPhoto).
+
+Имитирует:
+    - задержку ответа (--latency-ms, --jitter-ms);
+    - ограничение частоты: больше --rate сообщений в секунду - 429 с parameters.retry_after;
+    - заблокировавших бота: доля --blocked-share получателей (детерминированно по chat_id) получает 403.
+
+GET /stats - счетчики ответов по кодам и число одновременных запросов, ?reset=1 - сбросить.
+
+    python -m benchmarks.fake_telegram --port 8081
+    TG_API_URL=http://127.0.0.1:8081 python -m ...
+'''
+import argparse
+import asyncio
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+import random
+import time
+from uuid import uuid4
+import zlib
+
+from aiohttp import web
+
+
+BLOCKED_DESCRIPTION = 'Forbidden: bot was blocked by the user'
+
+
+@dataclass
+class FakeTelegramConfig:
+    latency_ms: float = 40.0
+    jitter_ms: float = 20.0
+    # Сообщений в секунду на бота, 0 - без ограничения
+    rate: float = 30.0
+    retry_after: int = 1
+    blocked_share: float = 0.05
+    seed: int = 42
+
+
+@dataclass
+class FakeTelegramStats:
+    responses: Counter = field(default_factory=Counter)
+    in_flight: int = 0
+    peak_in_flight: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            'responses': {str(status): count for status, count in sorted(self.responses.items())},
+            'peak_in_flight': self.peak_in_flight,
+        }
+
+
+class TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated_at = time.monotonic()
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class FakeTelegram:
+    def __init__(self, config: FakeTelegramConfig):
+        self.config = config
+        self.stats = FakeTelegramStats()
+        self.bucket = TokenBucket(config.rate)
+        self.rng = random.Random(config.seed)
+
+    def is_blocked(self, chat_id: str) -> bool:
+        # Один и тот же получатель блокирует бота во всех прогонах
+        return zlib.crc32(f'{self.config.seed}:{chat_id}'.encode()) % 10_000 < self.config.blocked_share * 10_000
+
+    def reply(self, status: int, payload: dict) -> web.Response:
+        self.stats.responses[status] += 1
+        return web.json_response(payload, status=status)
+
+    async def send(self, request: web.Request) -> web.Response:
+        self.stats.in_flight += 1
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, self.stats.in_flight)
+        try:
+            data = await request.post()
+            delay = max(0.0, self.config.latency_ms + self.rng.uniform(-1, 1) * self.config.jitter_ms)
+            await asyncio.sleep(delay / 1000)
+
+            chat_id = data.get('chat_id')
+            if not chat_id:
+                return self.reply(400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: chat not found'})
+            if not self.bucket.take():
+                return self.reply(429, {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.config.retry_after}',
+                    'parameters': {'retry_after': self.config.retry_after},
+                })
+            if self.is_blocked(chat_id):
+                return self.reply(403, {'ok': False, 'error_code': 403, 'description': BLOCKED_DESCRIPTION})
+
+            result = {
+                'message_id': self.stats.responses[200] + 1,
+                'chat': {'id': int(chat_id), 'type': 'private'},
+                'date': int(time.time()),
+            }
+            if request.match_info['method'] == 'sendPhoto':
+                photo = data.get('photo')
+                # Повторная отправка по file_id возвращает тот же file_id
+                file_id = photo if photo and not photo.startswith('http') else uuid4().hex
+                result['photo'] = [
+                    {'file_id': file_id, 'width': size, 'height': size}
+                    for size in (90, 320, 800)
+                ]
+            else:
+                result['text'] = data.get('text')
+            return self.reply(200, {'ok': True, 'result': result})
+        finally:
+            self.stats.in_flight -= 1
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        stats = self.stats.as_dict()
+        if request.query.get('reset'):
+            self.stats = FakeTelegramStats()
+        return web.json_response(stats)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method:sendMessage|sendPhoto}', self.send)
+        app.router.add_get('/stats', self.get_stats)
+        return app
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    for name, default in asdict(FakeTelegramConfig()).items():
+        parser.add_argument(f'--{name.replace("_", "-")}', dest=name, type=type(default), default=default)
+
+
+def parse_config(args: argparse.Namespace) -> FakeTelegramConfig:
+    return FakeTelegramConfig(**{name: getattr(args, name) for name in asdict(FakeTelegramConfig())})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(FakeTelegram(parse_config(args)).app(), host=args.host, port=args.port, access_log=None)
@@ -0,0 +1,253 @@
+'''
+Нагрузочный прогон API админки по сценариям, по одному на эндпоинт.
+
+Для каждого сценария: прогрев, затем --requests запросов в --concurrency потоков.
+Отчет: p50/p95/p99 задержки, пропускная способность (успешных запросов в секунду) и ошибки.
+Результаты сравниваются с сохраненным baseline: сценарий считается регрессией,
+если p95 вырос или пропускная способность упала больше чем на --tolerance.
+
+Порядок работы:
+    python -m benchmarks.seed --truncate                # наполнить локальную БД
+    uvicorn app:app --workers 6                         # поднять приложение
+    python -m benchmarks.load --save-baseline           # baseline до изменения
+    python -m benchmarks.load                           # после изменения, код выхода 1 при регрессии
+'''
+import argparse
+import asyncio
+from dataclasses import dataclass
+from datetime import timedelta
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable
+
+import aiohttp
+
+from benchmarks.seed import SEED_START, SeedConfig
+from config import FRONT_DATE_FORMAT, FRONT_TIME_FORMAT
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+PERIOD_END = SEED_START + timedelta(days=SeedConfig.days)
+GRAPH_PERIOD = {
+    'start': (PERIOD_END - timedelta(days=30)).isoformat(),
+    'end': PERIOD_END.isoformat(),
+}
+FILTER_PERIOD_FORMAT = f'{FRONT_DATE_FORMAT} {FRONT_TIME_FORMAT}'
+
+
+@dataclass
+class Scenario:
+    name:   str
+    path:   str
+    # Параметры запроса, rng - детерминированный генератор сценария
+    params: Callable[[random.Random], dict] = lambda rng: {}
+
+
+SCENARIOS: list[Scenario] = [
+    Scenario('users', '/users/', lambda rng: {'page': rng.randint(1, 50), 'per_page': 12}),
+    Scenario(
+        'users_filtered',
+        '/users/',
+        lambda rng: {
+            'per_page': 12,
+            'min_balance': 100,
+            'created_at_start': SEED_START.strftime(FILTER_PERIOD_FORMAT),
+            'created_at_end': PERIOD_END.strftime(FILTER_PERIOD_FORMAT),
+        }
+    ),
+    Scenario('user', '/users/{user_id}'),
+    Scenario('statistics', '/statistics/', lambda rng: {'page': 1, 'per_page': 30}),
+    Scenario(
+        'statistics_filtered',
+        '/statistics/',
+        lambda rng: {'per_page': 30, 'gs_subscription': rng.choice(['FULL', 'PRO', 'LITE', 'UNSUBSCRIBED'])}
+    ),
+    Scenario('general_stats', '/dashboards/general_stats', lambda rng: {'period': rng.choice(['today', 'yesterday'])}),
+    Scenario('graph_users', '/dashboards/graphs/users', lambda rng: {**GRAPH_PERIOD, 'preset': rng.choice(['ALL', 'NEW', 'REPEATED'])}),
+    Scenario('graph_tickets', '/dashboards/graphs/tickets', lambda rng: {**GRAPH_PERIOD, 'preset': rng.choice(['RECEIVED', 'SPENT'])}),
+    Scenario('graph_tasks', '/dashboards/graphs/tasks', lambda rng: GRAPH_PERIOD),
+    Scenario('graph_giveaways', '/dashboards/graphs/giveaways', lambda rng: GRAPH_PERIOD),
+    Scenario('graph_referals', '/dashboards/graphs/referals', lambda rng: GRAPH_PERIOD),
+    Scenario('graph_wheel_spins', '/dashboards/graphs/wheel_spins', lambda rng: GRAPH_PERIOD),
+    Scenario('giveaways', '/giveaways/', lambda rng: {'page': 1, 'per_page': 10}),
+    Scenario('giveaways_history', '/giveaways/history', lambda rng: {'page': 1, 'per_page': 10}),
+    Scenario('tasks', '/tasks/', lambda rng: {'page': 1, 'per_page': 10}),
+    Scenario('task_participants', '/tasks/participants/{task_id}', lambda rng: {'per_page': 50}),
+    Scenario('faq', '/faq/'),
+    Scenario('docs', '/docs_rules/'),
+]
+
+
+def path_params(users: int, tasks: int) -> dict[str, Callable[[random.Random], int]]:
+    '''Подстановки в путь, id в пределах объемов benchmarks.seed'''
+    return {
+        'user_id': lambda rng: rng.randint(1, users),
+        'task_id': lambda rng: rng.randint(1, tasks),
+    }
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(
+    session: aiohttp.ClientSession,
+    base_url: str,
+    scenario: Scenario,
+    path_makers: dict[str, Callable[[random.Random], int]],
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    seed: int
+) -> dict:
+    rng = random.Random(f'{seed}:{scenario.name}')
+    # Запросы готовятся заранее, чтобы генерация не попадала в замер
+    prepared = [
+        (
+            base_url + scenario.path.format(**{name: make(rng) for name, make in path_makers.items()}),
+            {key: str(value) for key, value in scenario.params(rng).items()}
+        )
+        for _ in range(warmup + requests)
+    ]
+    latencies: list[float] = []
+    errors = 0
+    queue = iter(prepared[warmup:])
+
+    async def request(url: str, params: dict) -> tuple[float, bool]:
+        started = time.perf_counter()
+        try:
+            async with session.get(url, params=params) as response:
+                await response.read()
+                ok = response.status < 400
+        except aiohttp.ClientError:
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    async def worker():
+        nonlocal errors
+        for url, params in queue:
+            latency, ok = await request(url, params)
+            if ok:
+                latencies.append(latency)
+            else:
+                errors += 1
+
+    for url, params in prepared[:warmup]:
+        await request(url, params)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50': round(percentile(latencies, 50), 2),
+        'p95': round(percentile(latencies, 95), 2),
+        'p99': round(percentile(latencies, 99), 2),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    '''Сценарии, которые стали хуже baseline больше чем на tolerance'''
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base['p95'] and result['p95'] > base['p95'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {base["p95"]} -> {result["p95"]} ms')
+        if base['rps'] and result['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f'{name}: rps {base["rps"]} -> {result["rps"]}')
+        if result['errors'] > base['errors']:
+            regressions.append(f'{name}: errors {base["errors"]} -> {result["errors"]}')
+    return regressions
+
+
+def print_report(results: dict, baseline: dict):
+    print(f'{"scenario":<22}{"p50, ms":>10}{"p95, ms":>10}{"p99, ms":>10}{"rps":>10}{"errors":>8}{"p95 vs base":>13}')
+    for name, result in results.items():
+        base = baseline.get(name)
+        delta = f'{(result["p95"] / base["p95"] - 1) * 100:+.0f}%' if base and base['p95'] else '-'
+        print(
+            f'{name:<22}{result["p50"]:>10.1f}{result["p95"]:>10.1f}{result["p99"]:>10.1f}'
+            f'{result["rps"]:>10.1f}{result["errors"]:>8}{delta:>13}'
+        )
+
+
+async def main(args: argparse.Namespace) -> int:
+    scenarios = [
+        scenario for scenario in SCENARIOS
+        if not args.only or scenario.name in args.only
+    ]
+    settings = {key: getattr(args, key) for key in ('requests', 'concurrency', 'warmup', 'seed', 'users', 'tasks')}
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        baseline = saved['scenarios']
+        if saved['settings'] != settings:
+            print(f'WARNING baseline was measured with other settings: {saved["settings"]}', file=sys.stderr)
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    path_makers = path_params(args.users, args.tasks)
+    results = {}
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        for scenario in scenarios:
+            results[scenario.name] = await run_scenario(
+                session,
+                args.base_url.rstrip('/'),
+                scenario,
+                path_makers,
+                requests=args.requests,
+                concurrency=args.concurrency,
+                warmup=args.warmup,
+                seed=args.seed
+            )
+            print(f'{scenario.name}: {results[scenario.name]}', file=sys.stderr)
+
+    print_report(results, baseline)
+    report = {
+        'settings': settings,
+        'scenarios': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'baseline saved to {args.baseline}')
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000/admin_panel')
+    parser.add_argument('--requests', type=int, default=200, help='запросов на сценарий')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=SeedConfig.seed)
+    parser.add_argument('--users', type=int, default=SeedConfig.users, help='как в benchmarks.seed')
+    parser.add_argument('--tasks', type=int, default=SeedConfig.tasks, help='как в benchmarks.seed')
+    parser.add_argument('--only', nargs='*', help='имена сценариев')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--output', help='сохранить результаты прогона в json')
+    sys.exit(asyncio.run(main(parser.parse_args())))
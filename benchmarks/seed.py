@@ -0,0 +1,436 @@
+'''
+Детерминированный генератор данных для нагрузочных тестов (benchmarks/load.py) и заливка через COPY.
+
+Форма данных близка к боевой:
+    активность пользователей с тяжелым хвостом (Парето, --activity-skew): немногие дают большую часть событий;
+    популярность задач и конкурсов по Zipf (--task-skew, --giveaway-skew);
+    реферальные деревья через users.referrer_id: пригласивший выбирается с вероятностью,
+    пропорциональной числу его рефералов (--referral-rate), поэтому появляются крупные ветки;
+    всплески участий в конкурсах в начале и в конце каждого раунда (--burst-share, --burst-hours).
+
+Одинаковые --seed и параметры дают одинаковые данные: все даты отсчитываются от SEED_START,
+id пользователей, задач и конкурсов задаются явно. Колонки и значения по умолчанию берутся из моделей.
+Триггеры производных таблиц (users_last_seen, user_tasks_progress, счетчики конкурсов) на время COPY отключаются,
+после заливки эти таблицы очищаются и заполняются BaseInterface.initial() одним проходом.
+
+Запуск: python -m benchmarks.seed --users 300000 --events-per-user 33 [--truncate]   # ~10M users_statistic
+Не запускать на боевой БД: --truncate очищает таблицы.
+'''
+import argparse
+from array import array
+import asyncio
+from bisect import bisect
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from itertools import accumulate
+import math
+import random
+import time
+from typing import Iterator, Sequence
+
+import asyncpg
+
+from config import DB_URL
+from database.db_interface import BaseInterface
+from database.invalidation import to_asyncpg_dsn
+from database.models import (
+    Base,
+    BalanceReasons,
+    Giveaway,
+    GiveawayEnded,
+    GiveawayParticipant,
+    GiveawayPrize,
+    TaskTemplate,
+    User,
+    UserBalanceHistory,
+    UsersStatistic,
+    UserSubscription,
+    UserTaskComplete,
+)
+
+
+# Начало периода данных, от него считают даты и сценарии нагрузки
+SEED_START = datetime(2025, 1, 1)
+
+SEEDED_TABLES = (
+    'users',
+    'users_subscriptions',
+    'users_balances_history',
+    'users_statistic',
+    'users_last_seen',
+    'tasks_templates',
+    'user_tasks_complete',
+    'user_tasks_progress',
+    'giveaways',
+    'giveaways_prizes',
+    'giveaways_participant',
+    'giveaways_participants_counters',
+    'giveaways_participants_users',
+    'giveaways_ended',
+)
+# Таблицы с явными id, для них после COPY выставляется sequence
+TABLES_WITH_IDS = ('users', 'tasks_templates', 'giveaways')
+# Таблицы с триггерами производных данных (database/ddl.py)
+TRIGGER_TABLES = ('users_statistic', 'tasks_templates', 'user_tasks_complete', 'giveaways_participant')
+# Производные таблицы: initial() заполняет их, только если они пусты
+DERIVED_TABLES = (
+    'users_last_seen',
+    'user_tasks_progress',
+    'giveaways_participants_counters',
+    'giveaways_participants_users',
+)
+
+IN_REASONS = [
+    BalanceReasons.everyday_reward,
+    BalanceReasons.wheel_prize,
+    BalanceReasons.task_was_completed,
+    BalanceReasons.welcome_bonus,
+]
+OUT_REASONS = [
+    BalanceReasons.take_part_giveaway,
+    BalanceReasons.wheel_spin,
+]
+# Ограничение веса самых активных пользователей относительно среднего
+MAX_ACTIVITY = 100
+
+
+@dataclass
+class SeedConfig:
+    seed:                       int = 42
+    days:                       int = 90
+    users:                      int = 10_000
+    balance_per_user:           int = 20
+    events_per_user:            int = 30
+    tasks:                      int = 50
+    completions_per_user:       int = 10
+    giveaways:                  int = 20
+    participations_per_user:    int = 5
+    # Показатели Zipf популярности задач и конкурсов, 0 - равномерно
+    task_skew:                  float = 1.1
+    giveaway_skew:              float = 0.8
+    # alpha распределения Парето для активности пользователей (> 1), 0 - все одинаково активны
+    activity_skew:              float = 1.5
+    # Доля пользователей, пришедших по реферальной ссылке
+    referral_rate:              float = 0.3
+    # Доля участий в первые/последние часы раунда конкурса
+    burst_share:                float = 0.6
+    burst_hours:                float = 6.0
+
+    def __post_init__(self):
+        if 0 < self.activity_skew <= 1:
+            raise ValueError('activity_skew must be greater than 1 or 0')
+        for name in ('referral_rate', 'burst_share'):
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f'{name} must be between 0 and 1')
+
+
+def model_columns(model: type[Base], columns: Sequence[str]) -> tuple[str, tuple[str, ...], tuple]:
+    '''
+    Таблица модели, колонки для COPY и значения остальных колонок.
+    Значения по умолчанию моделей задаются на стороне python, COPY их сам не подставит.
+    '''
+    defaults = [
+        column for column in model.__table__.columns
+        if column.name not in columns and column.default is not None and column.default.is_scalar
+    ]
+    return (
+        model.__tablename__,
+        (*columns, *(column.name for column in defaults)),
+        tuple(column.default.arg for column in defaults),
+    )
+
+
+def with_defaults(records: Iterator[tuple], defaults: tuple) -> Iterator[tuple]:
+    if not defaults:
+        return records
+    return (record + defaults for record in records)
+
+
+class ZipfChoice:
+    '''Выбор из population с весом 1 / rank ** skew, ранги перемешаны генератором rng'''
+    def __init__(self, rng: random.Random, population: Sequence[int], skew: float):
+        self.rng = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(accumulate(1 / rank ** skew for rank in range(1, len(self.population) + 1)))
+
+
+    def choose(self) -> int:
+        return self.population[bisect(self.cum_weights, self.rng.random() * self.cum_weights[-1])]
+
+
+class Seeder:
+    def __init__(self, config: SeedConfig):
+        self.config = config
+        self.end = SEED_START + timedelta(days=config.days)
+        self.span = (self.end - SEED_START).total_seconds()
+        # Заполняются в users() и giveaways(), компактно - пользователей могут быть миллионы
+        self.users_created: array = array('d')
+        self.users_activity: array = array('f')
+        self.users_referrer: array = array('i')
+        self.giveaways_rounds: list[tuple[float, float]] = []
+
+
+    def _at(self, seconds: float) -> datetime:
+        return SEED_START + timedelta(seconds=seconds)
+
+
+    def _random_at(self, rng: random.Random, start: float = 0) -> datetime:
+        return self._at(start + (self.span - start) * rng.random())
+
+
+    def _rng(self, table: str) -> random.Random:
+        # У каждой таблицы свой генератор: объем одной таблицы не меняет данные другой
+        return random.Random(f'{self.config.seed}:{table}')
+
+
+    def _count(self, rng: random.Random, user_index: int, mean: int) -> int:
+        '''Число записей пользователя: в среднем mean, с учетом его активности'''
+        return int(2 * mean * self.users_activity[user_index] * rng.random() + 0.5)
+
+
+    def _activity(self, rng: random.Random) -> float:
+        skew = self.config.activity_skew
+        if not skew:
+            return 1.0
+        # Парето со средним 1
+        return min(rng.paretovariate(skew) * (skew - 1) / skew, MAX_ACTIVITY)
+
+
+    def _users(self) -> Iterator[tuple]:
+        rng = self._rng('users')
+        users = self.config.users
+        # Каждый пользователь в пуле один раз плюс по разу за каждого приглашенного
+        referrers_pool: list[int] = []
+        for user_id in range(1, users + 1):
+            # Регистрации идут по возрастанию id: пригласивший зарегистрирован раньше
+            created = self.span * (user_id - rng.random()) / users
+            created_at = self._at(created)
+            referrer_id = None
+            if referrers_pool and rng.random() < self.config.referral_rate:
+                referrer_id = rng.choice(referrers_pool)
+                referrers_pool.append(referrer_id)
+            referrers_pool.append(user_id)
+            gs_id = user_id * 10 if rng.random() < 0.5 else None
+
+            self.users_created.append(created)
+            self.users_activity.append(self._activity(rng))
+            self.users_referrer.append(referrer_id or 0)
+            yield (
+                user_id,
+                gs_id,
+                str(100_000_000 + user_id),
+                str(500_000_000 + user_id) if rng.random() < 0.3 else None,
+                f'user_{user_id}',
+                f'Name {user_id}',
+                f'user_{user_id}@example.com' if rng.random() < 0.4 else None,
+                referrer_id,
+                created_at,
+                created_at,
+                gs_id is not None,
+            )
+
+
+    def _users_subscriptions(self) -> Iterator[tuple]:
+        rng = self._rng('users_subscriptions')
+        for user_id in range(1, self.config.users + 1):
+            if rng.random() < 0.15:
+                lite = rng.random() < 0.7
+                yield (user_id, lite, not lite or rng.random() < 0.2)
+
+
+    def _users_balances_history(self) -> Iterator[tuple]:
+        rng = self._rng('users_balances_history')
+        for index, created in enumerate(self.users_created):
+            user_id = index + 1
+            referrer_id = self.users_referrer[index]
+            if referrer_id:
+                yield (referrer_id, 'IN', BalanceReasons.referrer_bonus.value, 10, self._at(created))
+            for _ in range(self._count(rng, index, self.config.balance_per_user)):
+                if rng.random() < 0.7:
+                    yield (user_id, 'IN', rng.choice(IN_REASONS).value, rng.randint(1, 100), self._random_at(rng, created))
+                else:
+                    yield (user_id, 'OUT', rng.choice(OUT_REASONS).value, rng.randint(1, 50), self._random_at(rng, created))
+
+
+    def _users_statistic(self) -> Iterator[tuple]:
+        rng = self._rng('users_statistic')
+        for index, created in enumerate(self.users_created):
+            user_id = index + 1
+            yield (user_id, 'START_BOT', self._at(created))
+            for _ in range(self._count(rng, index, self.config.events_per_user)):
+                event = 'RUN_APP' if rng.random() < 0.85 else 'START_BOT'
+                yield (user_id, event, self._random_at(rng, created))
+
+
+    def _tasks_templates(self) -> Iterator[tuple]:
+        rng = self._rng('tasks_templates')
+        for task_id in range(1, self.config.tasks + 1):
+            yield (
+                task_id,
+                rng.choice(['tg', 'vk', 'bk_winline']),
+                rng.choice(['auto', 'handle', 'timer']),
+                f'Task {task_id}',
+                f'Description {task_id}',
+                rng.randint(1, 50),
+                rng.randint(1, 3),
+                rng.random() < 0.8,
+                self._random_at(rng),
+            )
+
+
+    def _user_tasks_complete(self) -> Iterator[tuple]:
+        rng = self._rng('user_tasks_complete')
+        tasks = ZipfChoice(rng, range(1, self.config.tasks + 1), self.config.task_skew)
+        for index, created in enumerate(self.users_created):
+            for _ in range(self._count(rng, index, self.config.completions_per_user)):
+                yield (index + 1, tasks.choose(), self._random_at(rng, created))
+
+
+    def _giveaways(self) -> Iterator[tuple]:
+        rng = self._rng('giveaways')
+        for giveaway_id in range(1, self.config.giveaways + 1):
+            period_days = rng.choice([7, 14, 30])
+            start = self.span * rng.random() / 2
+            self.giveaways_rounds.append((start, period_days * 86400))
+            yield (
+                giveaway_id,
+                f'Giveaway {giveaway_id}',
+                period_days,
+                rng.randint(1, 20),
+                self._at(start),
+                True,
+            )
+
+
+    def _giveaways_prizes(self) -> Iterator[tuple]:
+        for giveaway_id in range(1, self.config.giveaways + 1):
+            for position in range(1, 4):
+                yield (giveaway_id, f'Prize {position}', position)
+
+
+    def _participation_offset(self, rng: random.Random, period: float) -> float:
+        '''Смещение участия от начала раунда: всплеск после старта и перед концом, остальное равномерно'''
+        if rng.random() >= self.config.burst_share:
+            return period * rng.random()
+        offset = min(rng.expovariate(1 / (self.config.burst_hours * 3600)), period * 0.999)
+        return offset if rng.random() < 0.5 else period - offset
+
+
+    def _giveaways_participant(self) -> Iterator[tuple]:
+        rng = self._rng('giveaways_participant')
+        giveaways = ZipfChoice(rng, range(1, self.config.giveaways + 1), self.config.giveaway_skew)
+        for index, created in enumerate(self.users_created):
+            for _ in range(self._count(rng, index, self.config.participations_per_user)):
+                giveaway_id = giveaways.choose()
+                start, period = self.giveaways_rounds[giveaway_id - 1]
+                first_round = max(0, math.ceil((created - start) / period))
+                last_round = int((self.span - start) / period)
+                if first_round > last_round:
+                    continue
+                at = start + period * rng.randint(first_round, last_round) + self._participation_offset(rng, period)
+                if created <= at < self.span:
+                    yield (index + 1, giveaway_id, self._at(at))
+
+
+    def _giveaways_ended(self) -> Iterator[tuple]:
+        rng = self._rng('giveaways_ended')
+        for giveaway_id in range(1, self.config.giveaways + 1):
+            for position in range(1, 4):
+                # giveaways_prizes заливается в пустую таблицу, id призов идут подряд
+                prize_id = (giveaway_id - 1) * 3 + position
+                yield (giveaway_id, self._random_at(rng), rng.randint(1, self.config.users), prize_id)
+
+
+    def tables(self) -> list[tuple[str, tuple[str, ...], Iterator[tuple]]]:
+        '''(таблица, колонки, записи) в порядке загрузки'''
+        generators = [
+            (
+                User,
+                (
+                    'id', 'gs_id', 'tg_id', 'vk_id', 'username', 'first_name', 'email',
+                    'referrer_id', 'created_at', 'updated_at', 'from_gs',
+                ),
+                self._users
+            ),
+            (UserSubscription, ('user_id', 'lite', 'pro'), self._users_subscriptions),
+            (UserBalanceHistory, ('user_id', 'type', 'reason', 'amount', 'created_at'), self._users_balances_history),
+            (UsersStatistic, ('user_id', 'type', 'created_at'), self._users_statistic),
+            (
+                TaskTemplate,
+                ('id', 'target', 'check_type', 'title', 'big_descr', 'tickets', 'complete_count', 'active', 'created_at'),
+                self._tasks_templates
+            ),
+            (UserTaskComplete, ('user_id', 'task_template_id', 'created_at'), self._user_tasks_complete),
+            (Giveaway, ('id', 'name', 'period_days', 'price', 'start_date', 'active'), self._giveaways),
+            (GiveawayPrize, ('giveaway_id', 'name', 'position'), self._giveaways_prizes),
+            (GiveawayParticipant, ('user_id', 'giveaway_id', 'created_at'), self._giveaways_participant),
+            (GiveawayEnded, ('giveaway_id', 'end_date', 'winner_id', 'prize_id'), self._giveaways_ended),
+        ]
+        tables = []
+        for model, columns, generator in generators:
+            table, all_columns, defaults = model_columns(model, columns)
+            tables.append((table, all_columns, with_defaults(generator(), defaults)))
+        return tables
+
+
+async def seed(db_url: str, config: SeedConfig, truncate: bool = False):
+    # Таблицы, триггеры и индексы - как при старте приложения
+    await BaseInterface(db_url).initial()
+
+    connection = await asyncpg.connect(to_asyncpg_dsn(db_url))
+    try:
+        if truncate:
+            await connection.execute(f'TRUNCATE {", ".join(SEEDED_TABLES)} RESTART IDENTITY')
+        elif await connection.fetchval('SELECT EXISTS (SELECT 1 FROM users)'):
+            raise RuntimeError('users is not empty, run with --truncate on a benchmark database')
+
+        # Построчные триггеры на миллионах строк медленнее одной пересборки в initial()
+        for table in TRIGGER_TABLES:
+            await connection.execute(f'ALTER TABLE {table} DISABLE TRIGGER USER')
+        try:
+            seeder = Seeder(config)
+            for table, columns, records in seeder.tables():
+                started = time.perf_counter()
+                async with connection.transaction():
+                    result = await connection.copy_records_to_table(table, records=records, columns=columns)
+                print(f'{table:<28}{result.removeprefix("COPY "):>12} rows {time.perf_counter() - started:>8.1f}s')
+        finally:
+            for table in TRIGGER_TABLES:
+                await connection.execute(f'ALTER TABLE {table} ENABLE TRIGGER USER')
+        await connection.execute(f'TRUNCATE {", ".join(DERIVED_TABLES)}')
+
+        for table in TABLES_WITH_IDS:
+            await connection.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+            )
+    finally:
+        await connection.close()
+
+    started = time.perf_counter()
+    await BaseInterface(db_url).initial()
+    print(f'{"rebuild derived tables":<45}{time.perf_counter() - started:>8.1f}s')
+
+    connection = await asyncpg.connect(to_asyncpg_dsn(db_url))
+    try:
+        await connection.execute('ANALYZE')
+    finally:
+        await connection.close()
+
+
+def parse_config(args: argparse.Namespace) -> SeedConfig:
+    return SeedConfig(**{name: getattr(args, name) for name in asdict(SeedConfig())})
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    for name, default in asdict(SeedConfig()).items():
+        parser.add_argument(f'--{name.replace("_", "-")}', dest=name, type=type(default), default=default)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-url', default=DB_URL)
+    parser.add_argument('--truncate', action='store_true', help='очистить таблицы перед наполнением')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    asyncio.run(seed(args.db_url, parse_config(args), truncate=args.truncate))
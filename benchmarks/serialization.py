@@ -0,0 +1,152 @@
+'''
+Замер сериализации ответов: стандартный путь FastAPI
+(валидация по response_model -> jsonable_encoder -> json.dumps)
+против PydanticResponse (model_dump_json) и ORJSONResponse.
+
+Запуск: python -m benchmarks.serialization [--items 100] [--repeat 200]
+'''
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+import random
+import time
+from typing import Callable
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import BaseModel
+
+from api.routers.giveaways.schemas import GiveawaysHistoryData
+from api.routers.statistics.schemas import StatisticData
+from api.routers.users.schemas import UsersData
+from tools.responses import PydanticResponse
+
+
+def make_statistic_data(items: int) -> StatisticData:
+    day = datetime(2025, 1, 1)
+    return StatisticData(
+        total_items=items,
+        total_pages=1,
+        per_page=items,
+        current_page=1,
+        data={
+            (day + timedelta(days=i)).strftime('%Y-%m-%d'): {
+                'registrations': {'origin_users': random.randint(0, 500), 'referal_users': random.randint(0, 500)},
+                'users': {'starts': random.randint(0, 5000), 'runs': random.randint(0, 5000), 'registrations': 10, 'activations': 5},
+                'tasks': {'started': random.randint(0, 5000), 'completed': random.randint(0, 5000)},
+                'tickets': {'received': random.randint(0, 5000), 'spent': random.randint(0, 5000), 'purshased': 0},
+                'giveaways': {'primary': random.randint(0, 500), 'repeated': random.randint(0, 500)},
+            }
+            for i in range(items)
+        }
+    )
+
+
+def make_users_data(items: int) -> UsersData:
+    return UsersData(
+        total_items=items,
+        total_pages=1,
+        per_page=items,
+        current_page=1,
+        items=[
+            {
+                'id': i,
+                'gs_id': i * 10,
+                'created_at': datetime(2025, 1, 1) + timedelta(minutes=i),
+                'tg_id': str(100000000 + i),
+                'username': f'user_{i}',
+                'vk_id': None,
+                'email': f'user_{i}@example.com',
+                'balance': random.random() * 1000,
+                'giveaways_count': random.randint(0, 50),
+                'gs_subscription': random.choice(['FULL', 'PRO', 'LITE', 'UNSUBSCRIBED']),
+                'completed_tasks': random.randint(0, 100),
+                'referals_count': random.randint(0, 20),
+                'deleted': False,
+            }
+            for i in range(items)
+        ]
+    )
+
+
+def make_giveaways_history_data(items: int) -> GiveawaysHistoryData:
+    return GiveawaysHistoryData(
+        total_items=items,
+        total_pages=1,
+        per_page=items,
+        current_page=1,
+        items=[
+            {
+                'id': i,
+                'start_date': datetime(2025, 1, 1) + timedelta(days=i),
+                'end_date': datetime(2025, 1, 8) + timedelta(days=i),
+                'number': i,
+                'participants_count': random.randint(0, 10000),
+                'price': 10,
+                'spent_tickets': random.randint(0, 100000),
+                'winners': [
+                    {
+                        'id': i * 10 + position,
+                        'email': f'winner_{position}@example.com',
+                        'phone': None,
+                        'tg_id': str(200000000 + position),
+                        'vk_id': None,
+                        'prize_id': position,
+                        'prize_name': f'Приз {position}',
+                    }
+                    for position in range(5)
+                ],
+            }
+            for i in range(items)
+        ]
+    )
+
+
+ENDPOINTS: dict[str, Callable[[int], BaseModel]] = {
+    'GET /statistics/': make_statistic_data,
+    'GET /users/': make_users_data,
+    'GET /giveaways/history': make_giveaways_history_data,
+}
+
+
+async def fastapi_default(model: BaseModel, response_class: type[JSONResponse]) -> bytes:
+    # То же, что делает FastAPI для роута с response_model
+    field = create_model_field(name='Response', type_=type(model), mode='serialization')
+    content = await serialize_response(field=field, response_content=model)
+    return response_class(content).body
+
+
+async def measure(func: Callable, repeat: int) -> float:
+    '''Среднее время одного вызова, мс'''
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+        if asyncio.iscoroutine(result):
+            await result
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def main(items: int, repeat: int):
+    random.seed(0)
+    print(f'items={items} repeat={repeat}')
+    print(f'{"endpoint":<26}{"size, KB":>10}{"json":>10}{"orjson":>10}{"pydantic":>10}{"saved":>10}')
+    for endpoint, factory in ENDPOINTS.items():
+        model = factory(items)
+        body = PydanticResponse(model).body
+        default_ms = await measure(lambda: fastapi_default(model, JSONResponse), repeat)
+        orjson_ms = await measure(lambda: fastapi_default(model, ORJSONResponse), repeat)
+        pydantic_ms = await measure(lambda: PydanticResponse(model).body, repeat)
+        print(
+            f'{endpoint:<26}{len(body) / 1024:>10.1f}'
+            f'{default_ms:>9.3f}ms{orjson_ms:>8.3f}ms{pydantic_ms:>8.3f}ms'
+            f'{(1 - pydantic_ms / default_ms) * 100:>9.0f}%'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.items, args.repeat))
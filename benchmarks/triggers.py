@@ -0,0 +1,126 @@
+'''
+Время расчета аудиторий триггеров кампаний (CampaignsDBInterface) на данных benchmarks.seed.
+
+Для каждого триггера: медиана и максимум по --repeat прогонам, размер аудитории и время на одного
+пользователя. Снимки аудиторий не используются - каждый прогон считает аудиторию заново.
+Даты берутся внутри периода seed, параметры - худший случай для данных генератора:
+самая популярная задача и конкурс, окно "конкурс скоро закончится" покрывает все конкурсы.
+
+С --scales база перед замером заново наполняется для каждого числа пользователей (--truncate!):
+для триггеров, линейных по пользователям, время на пользователя не должно расти с объемом,
+для оконных (первое событие, неактивность) - не должно расти само время.
+
+    python -m benchmarks.triggers                                  # на текущих данных
+    python -m benchmarks.triggers --scales 100000 1000000 3000000  # перезаливка и сравнение
+'''
+import argparse
+import asyncio
+from dataclasses import replace
+from datetime import datetime, timedelta
+import json
+import statistics
+import sys
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+
+from benchmarks.seed import SEED_START, SeedConfig, add_config_arguments, parse_config, seed
+from config import DB_URL
+from database.db_interfaces.campaigns import CampaignsDBInterface
+
+
+# Самые популярные задача и конкурс (Zipf в benchmarks.seed) - самые большие выборки
+HEAVIEST_ID = 1
+# event_type - обязательный параметр триггера, в данных генератора есть только RUN_APP и START_BOT.
+# Запрос и план одинаковы для любого типа, START_BOT - реже встречающийся, как прогнозы
+FIRST_EVENT_TYPE = 'START_BOT'
+# Конкурс в seed длится до 30 дней
+MAX_GIVEAWAY_DAYS = 30
+
+
+def scenarios(config: SeedConfig) -> dict[str, Callable[[CampaignsDBInterface], Awaitable[list[str]]]]:
+    period_end = SEED_START + timedelta(days=config.days)
+    # Последний полный день данных
+    last_day = period_end - timedelta(hours=12)
+    return {
+        'everyday_reward': lambda db: db.get_evryday_reward_users_pool(now=last_day),
+        'first_predict': lambda db: db.get_first_event_users_pool(event_type=FIRST_EVENT_TYPE, hours=24, now=period_end),
+        'user_inactivity': lambda db: db.get_users_inactive(inactive_days=7, now=period_end),
+        'uncomplete_task': lambda db: db.get_uncomplete_task_users_pool(task_id=HEAVIEST_ID),
+        'giveaway_ending_soon': lambda db: db.get_giveaway_ending_soon_users_pool(
+            hours=(config.days + MAX_GIVEAWAY_DAYS) * 24,
+            now=SEED_START
+        ),
+        'not_participation': lambda db: db.get_not_participated_users_pool(giveaway_id=HEAVIEST_ID),
+        'never_participated': lambda db: db.get_not_participated_users_pool(),
+    }
+
+
+async def users_count(db: CampaignsDBInterface) -> int:
+    async with db.async_ses() as session:
+        return (await session.execute(text('SELECT count(*) FROM users'))).scalar_one()
+
+
+async def measure(db: CampaignsDBInterface, config: SeedConfig, repeat: int, only: list[str] | None) -> dict:
+    users = await users_count(db)
+    results = {}
+    for name, resolve in scenarios(config).items():
+        if only and name not in only:
+            continue
+        # Прогрев: кеш страниц и prepared statement
+        audience = await resolve(db)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await resolve(db)
+            timings.append((time.perf_counter() - started) * 1000)
+        median = statistics.median(timings)
+        results[name] = {
+            'users': users,
+            'audience': len(audience),
+            'median_ms': round(median, 1),
+            'max_ms': round(max(timings), 1),
+            'us_per_user': round(median * 1000 / users, 3) if users else 0.0,
+        }
+        print(f'{users} users, {name}: {results[name]}', file=sys.stderr)
+    return results
+
+
+def print_report(runs: list[dict]):
+    print(f'{"trigger":<22}{"users":>10}{"audience":>10}{"median, ms":>12}{"max, ms":>10}{"us/user":>10}')
+    for results in runs:
+        for name, result in results.items():
+            print(
+                f'{name:<22}{result["users"]:>10}{result["audience"]:>10}'
+                f'{result["median_ms"]:>12.1f}{result["max_ms"]:>10.1f}{result["us_per_user"]:>10.3f}'
+            )
+
+
+async def main(args: argparse.Namespace):
+    config = parse_config(args)
+    db = CampaignsDBInterface(db_url=args.db_url)
+    runs = []
+    for scale in args.scales or [None]:
+        scale_config = config if scale is None else replace(config, users=scale)
+        if scale is not None:
+            await seed(args.db_url, scale_config, truncate=True)
+        runs.append(await measure(db, scale_config, args.repeat, args.only))
+    await db.engine.dispose()
+
+    print_report(runs)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(runs, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-url', default=DB_URL)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scales', type=int, nargs='*', help='числа пользователей, база перезаливается для каждого')
+    parser.add_argument('--only', nargs='*', help='имена триггеров')
+    parser.add_argument('--output', help='сохранить результаты в json')
+    # Параметры данных: по ним выбираются даты замера, с --scales - и параметры заливки
+    add_config_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
@@ -1,11 +1,13 @@
 import asyncio
-from datetime import datetime
+from datetime import date, datetime
 from typing import Literal, NamedTuple
 from campaign_scheduler.campaign_sheduler import CronTrigger
 from campaign_scheduler.custom_types import CampaignDTO, TriggerDTO
 from campaign_scheduler.triggers import CampaignTrigger, TelegramUserID, TriggersMap
 from loguru import logger
-from tools.telegram import TelegramTools, TelegramButton
+from config import BASE_ADMIN_URL
+from database.db_interfaces.campaigns import audience_window, combine_audiences
+from tools.telegram import TelegramButton, TelegramSendResult, TelegramTools
 from .db_interface import db
 
 
@@ -23,6 +25,10 @@ class Campaign:
         self.id:                int = campaign.id
         self.type:              Literal['one_time', 'trigger'] = campaign.type
         self.shedulet_at:       datetime = campaign.shedulet_at
+        self.photo:             str | None = campaign.photo
+        self.photo_file_id:     str | None = campaign.photo_file_id
+        # False - фото не удалось отправить не по вине получателя, рассылка идет текстом
+        self.with_photo:        bool = bool(campaign.photo)
         self.triggers:          list[TriggerDTO] = self.get_triggers(campaign.triggers)
         self.message:           CampaignMessage = self.prepare_message(campaign)
         self.cron_expression:   str = self.get_min_trigger_cron_expression()
@@ -45,29 +51,115 @@ class Campaign:
         
     async def run(self) -> None:
         logger.info(f'[CAMPAIGN:{self.id}] Получаем пул юзеров для отправки рассылки')
-        users_pool: set[TelegramUserID] = set()
-        users_pool: set[TelegramUserID] = await self.triggers[0].get_users_pull()
-        for trigger in self.triggers[1:]:
-            if self.type == 'trigger':
-                users_pool.update(await trigger.get_users_pull())
-            elif self.type == 'one_time':
-                users_pool = users_pool.intersection(await trigger.get_users_pull())    
+        users_pool: set[TelegramUserID] = combine_audiences(
+            self.type,
+            [await self.get_trigger_audience(trigger) for trigger in self.triggers]
+        )
         logger.info(f'[CAMPAIGN:{self.id}] Получили пул юзеров {len(users_pool)=}')
         
         logger.info(f'[CAMPAIGN:{self.id}] Запускаем отправку сообщений')
-        campaign_results = await asyncio.gather(
-            *[
-                self.send_message(
-                    chat_id=int(user_id),
-                    
+        # Частотный лимит: пользователь мог уже получить сообщения других кампаний
+        delivery_day = date.today()
+        recipients = await db.reserve_deliveries([str(user_id) for user_id in users_pool], day=delivery_day)
+        if len(recipients) < len(users_pool):
+            logger.info(f'[CAMPAIGN:{self.id}] Пропущено по частотному лимиту: {len(users_pool) - len(recipients)}')
+        reserved = list(recipients)
+        results: dict[TelegramUserID, TelegramSendResult] = {}
+        try:
+            await self.confirm_photo(recipients, results)
+            campaign_results = await asyncio.gather(
+                *[
+                    self.send_message(
+                        chat_id=int(user_id),
+                        
+                    )
+                    for user_id in recipients
+                ],
+                # Упавшая отправка не должна прерывать остальные: они продолжат идти уже без учета результата
+                return_exceptions=True
+            )
+            for user_id, result in zip(recipients, campaign_results):
+                if isinstance(result, BaseException):
+                    logger.error(f'[CAMPAIGN:{self.id}] Ошибка отправки {user_id}: {result!r}')
+                    result = TelegramSendResult(ok=False, description=repr(result))
+                results[user_id] = result
+        finally:
+            # Даже если рассылка прервалась, зарезервированные без доставки получатели возвращаются в лимит
+            sent = sum(result.ok for result in results.values())
+            logger.info(f'[CAMPAIGN:{self.id}] Отправлено сообщений: {sent} из {len(users_pool)}')
+            try:
+                await self.record_deliveries(results)
+                await self.update_suppressions(results)
+            finally:
+                await db.release_deliveries(
+                    [str(user_id) for user_id in reserved if user_id not in results or not results[user_id].ok],
+                    day=delivery_day
                 )
-                for user_id in users_pool
-            ]
-        )
-        logger.info(f'[CAMPAIGN:{self.id}] Отправлено сообщений: {sum(campaign_results)} из {len(users_pool)}')
         if self.type == 'one_time':
             await db.update(campaign_id=self.id, is_active=False)
     
+    async def get_trigger_audience(self, trigger: CampaignTrigger) -> list[TelegramUserID]:
+        '''Аудитория триггера без получателей, которым кампания уже отправлена за окно триггера'''
+        users_pool = await trigger.get_users_pull()
+        window = audience_window(trigger.id, trigger.trigger_params) if self.type == 'trigger' else None
+        if window is None:
+            return users_pool
+        not_delivered = await db.exclude_delivered(self.id, [str(user_id) for user_id in users_pool], window)
+        if len(not_delivered) < len(users_pool):
+            logger.info(f'[CAMPAIGN:{self.id}] Уже получили за окно триггера {trigger.id}: {len(users_pool) - len(not_delivered)}')
+        return list(map(int, not_delivered))
+    
+    
+    async def record_deliveries(self, results: dict[TelegramUserID, TelegramSendResult]):
+        '''Журнал доставок нужен только триггерам с окном, остальные кампании его не пишут'''
+        windows = [
+            window
+            for trigger in self.triggers
+            if (window := audience_window(trigger.id, trigger.trigger_params)) is not None
+        ]
+        if self.type != 'trigger' or not windows:
+            return
+        await db.record_deliveries(
+            self.id,
+            [str(user_id) for user_id, result in results.items() if result.ok],
+            window=max(windows)
+        )
+    
+    
+    async def confirm_photo(
+        self,
+        recipients: list[TelegramUserID],
+        results: dict[TelegramUserID, TelegramSendResult]
+    ):
+        '''
+        Пока Telegram не вернул file_id, отправки идут по одной: фото загружается по URL
+        или проверяется сохраненный file_id. Дальше всем отправляется по file_id.
+        Получатели, которым отправлено здесь, переносятся из recipients в results
+        '''
+        while self.with_photo and recipients:
+            user_id = recipients.pop()
+            result = await self.send_message(chat_id=int(user_id))
+            if result.ok:
+                results[user_id] = result
+                if result.photo_file_id and result.photo_file_id != self.photo_file_id:
+                    await self.save_photo_file_id(result.photo_file_id)
+                break
+            if result.recipient_unreachable:
+                # Получатель заблокировал бота - пробуем со следующим
+                results[user_id] = result
+                continue
+            recipients.append(user_id)
+            if result.retry_after is not None:
+                await asyncio.sleep(result.retry_after)
+            elif result.file_id_rejected and self.photo_file_id:
+                logger.warning(f'[CAMPAIGN:{self.id}] Telegram не принял сохраненный file_id, загружаем фото заново')
+                await self.save_photo_file_id(None)
+            else:
+                # Фото недоступно или файл битый - каждая следующая попытка закончится так же
+                logger.error(f'[CAMPAIGN:{self.id}] Фото не отправляется ({result.description}), рассылка без фото')
+                self.with_photo = False
+    
+    
     def prepare_message(self, campaign: CampaignDTO) -> CampaignMessage:
         return CampaignMessage(
             text=f"{f'<b>{campaign.title}</b>\n' if campaign.title else ''}{campaign.text}",
@@ -75,19 +167,37 @@ class Campaign:
                 text=campaign.button_text,
                 url=campaign.button_url
             ) if campaign.button_text and campaign.button_url else None,
-            # photo=campaign.photo
-            photo="https://app.gamesport.com/api/static/giveaways/44/56.webp"
+            photo=f'{BASE_ADMIN_URL}/{campaign.photo}' if campaign.photo else None
         )
         
 
-    async def send_message(self, chat_id: int):
+    async def send_message(self, chat_id: int) -> TelegramSendResult:
         return await TelegramTools.send_message(
             chat_id=chat_id,
             text=self.message.text,
-            photo_url=self.message.photo,
+            photo=(self.photo_file_id or self.message.photo) if self.with_photo else None,
             button=self.message.button
         )
         
+        
+    async def update_suppressions(self, results: dict[TelegramUserID, TelegramSendResult]):
+        '''Недоступные получатели исключаются из следующих рассылок, доставленные - возвращаются'''
+        unreachable = {
+            str(user_id): result.description
+            for user_id, result in results.items()
+            if result.recipient_unreachable
+        }
+        if unreachable:
+            logger.info(f'[CAMPAIGN:{self.id}] Недоступных получателей: {len(unreachable)}')
+        await db.suppress_recipients(unreachable)
+        await db.unsuppress_recipients([str(user_id) for user_id, result in results.items() if result.ok])
+        
+        
+    async def save_photo_file_id(self, photo_file_id: str | None):
+        self.photo_file_id = photo_file_id
+        if not await db.set_photo_file_id(self.id, photo=self.photo, photo_file_id=photo_file_id):
+            logger.info(f'[CAMPAIGN:{self.id}] Фото кампании изменилось, file_id не сохранен')
+        
     
     def get_min_trigger_cron_expression(self):
         """
@@ -8,6 +8,16 @@ from campaign_scheduler.campaign import Campaign
 from campaign_scheduler.custom_types import CampaignDTO, TriggerDTO
 from .db_interface import db
 
+# Служебные задачи планировщика, не кампании
+SERVICE_JOBS = (
+    'sync_database',
+    'revalidate_suppressions',
+    'prune_delivery_counters',
+    'prune_deliveries',
+    'prune_audience_snapshots',
+)
+
+
 class CampaignScheduler:
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
@@ -18,6 +28,30 @@ class CampaignScheduler:
             id="sync_database",
             replace_existing=True
         )
+        self.scheduler.add_job(
+            self.revalidate_suppressions,
+            IntervalTrigger(hours=1),
+            id="revalidate_suppressions",
+            replace_existing=True
+        )
+        self.scheduler.add_job(
+            db.prune_delivery_counters,
+            CronTrigger(hour=0, minute=5),
+            id="prune_delivery_counters",
+            replace_existing=True
+        )
+        self.scheduler.add_job(
+            db.prune_deliveries,
+            CronTrigger(hour=0, minute=5),
+            id="prune_deliveries",
+            replace_existing=True
+        )
+        self.scheduler.add_job(
+            db.prune_audience_snapshots,
+            CronTrigger(hour=0, minute=5),
+            id="prune_audience_snapshots",
+            replace_existing=True
+        )
 
 
     async def schedule_campaign(self, campaign: Campaign):
@@ -32,13 +66,18 @@ class CampaignScheduler:
         )
         
     
+    async def revalidate_suppressions(self):
+        revalidated = await db.revalidate_suppressions()
+        logger.debug(f'Вернули в рассылки получателей, запускавших бота после подавления: {revalidated}')
+        
+    
     async def sync_db(self):
         logger.debug('Запустили синхронизацию')
         campaigns = await db.get_all(is_active=True)
         current_jobs = self.scheduler.get_jobs()
         current_campaigns_ids = [str(dict(campaign)["id"]) for campaign in campaigns]
         for job in current_jobs:
-            if job.id != 'sync_database':
+            if job.id not in SERVICE_JOBS:
                 if job.id not in current_campaigns_ids:
                     self.scheduler.remove_job(str(job.id))
             
@@ -21,6 +21,8 @@ class CampaignDTO:
     button_text:        str | None
     button_url:         str | None
     photo:              str | None
+    # file_id фото, уже загруженного в Telegram
+    photo_file_id:      str | None
     timer:              timedelta | None
     is_active:          bool
     shedulet_at:        datetime | None
@@ -1,4 +1,3 @@
-from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import Any
 from .db_interface import db
@@ -9,68 +8,52 @@ TelegramUserID = int
 
 
 @dataclass
-class CampaignTrigger(ABC):
+class CampaignTrigger:
+    '''
+    Аудитория триггера считается в CampaignsDBInterface.resolve_audience по id триггера,
+    запросы и их стоимость описаны в database/db_interfaces/campaigns.py
+    '''
     id:                 int
     name:               str
     trigger_params:     dict[str, Any] | None
     cron_expression:    str
-    
-    @abstractmethod
-    async def get_users_pull() -> list[TelegramUserID]:
-        ...
-        
+
+    async def get_users_pull(self) -> list[TelegramUserID]:
+        users_pool = await self.get_audience()
+        logger.debug(f'{type(self).__name__}: {len(users_pool)=}')
+        return list(map(int, users_pool))
+
+
+    async def get_audience(self) -> list[str]:
+        '''tg_id аудитории: свежий снимок (например, после предпросмотра в админке) или новый расчет'''
+        snapshot = await db.get_audience(self.id, self.trigger_params)
+        return snapshot.tg_ids
+
 
 class EverydayRewardTrigger(CampaignTrigger):
     '''Не забрал ежедневную награду'''
-    async def get_users_pull(self) -> list[TelegramUserID]:
-        users_pool = await db.get_evryday_reward_users_pool()
-        logger.debug(f'EverydayRewardTrigger: {users_pool=}')
-        
-        # FIXME моковые данные
-        users_pool = ['350352378']       
-        users_pool = list(map(int, users_pool))
-        return users_pool
-    
-    
+
+
 class FirstPredictTrigger(CampaignTrigger):
-    '''Получил первый прогноз'''
-    ...
-    
-    
+    '''Получил первый прогноз. trigger_params: event_type (обязательно, тип события users_statistic), hours - окно'''
+
+
 class UserInactivityTrigger(CampaignTrigger):
-    '''Не заходил N дней'''
-    async def get_users_pull(self) -> list[TelegramUserID]:
-        users_pool = await db.get_users_inactive(inactive_days=self.trigger_params['inactive_days'])
-        logger.debug(f'UserInactivityTrigger: {users_pool=}')
-        
-        # FIXME моковые данные
-        users_pool = ['350352378']       
-        users_pool = list(map(int, users_pool))
-        return users_pool
-    
-    
+    '''Не заходил N дней. trigger_params: inactive_days'''
+
+
 class UserUncompleteTaskTrigger(CampaignTrigger):
-    '''Не выполнил задачу'''
-    async def get_users_pull(self):
-        users_pool = await db.get_uncomplete_task_users_pool(task_id=self.trigger_params['task_id'])
-        logger.debug(f'UserUncompleteTaskTrigger: {users_pool=}')
-        
-        # FIXME моковые данные
-        users_pool = ['350352378']       
-        users_pool = list(map(int, users_pool))
-        return users_pool
-    
-    
+    '''Не выполнил задачу. trigger_params: task_id'''
+
+
 class GiveawayEndingSoonTrigger(CampaignTrigger):
-    '''Конкурс закночится через ...'''
-    ...
-    
-    
+    '''Конкурс закончится через hours часов, а пользователь в нем не участвует. trigger_params: hours'''
+
+
 class NotParticipationInGiveawayTrigger(CampaignTrigger):
-    '''Не учавствовал в конкурсе'''
-    ...
-    
-    
+    '''Не учавствовал в конкурсе. trigger_params: giveaway_id, без него - ни в одном конкурсе'''
+
+
 TriggersMap = {
     1: EverydayRewardTrigger,
     2: FirstPredictTrigger,
@@ -79,5 +62,3 @@ TriggersMap = {
     5: GiveawayEndingSoonTrigger,
     6: NotParticipationInGiveawayTrigger
 }
-    
-    
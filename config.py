@@ -8,4 +8,27 @@ GS_DATE_FORMAT: str = "%Y-%m-%d"
 FRONT_DATE_FORMAT: str = "%Y-%m-%d"
 FRONT_TIME_FORMAT: str = "%H:%M"
 BASE_ADMIN_URL: str = os.getenv("BASE_ADMIN_URL", "127.0.0.1:8000")
-TG_BOT_TOKEN: str = os.getenv("TG_BOT_TOKEN")
\ No newline at end of file
+TG_BOT_TOKEN: str = os.getenv("TG_BOT_TOKEN")
+# Адрес Bot API, для замеров - локальная замена (benchmarks/fake_telegram.py)
+TG_API_URL: str = os.getenv("TG_API_URL", "https://api.telegram.org")
+# Через сколько дней заблокировавший бота получатель снова попадает в рассылку, интервал удваивается до максимума
+SUPPRESSION_REVALIDATE_DAYS: int = int(os.getenv("SUPPRESSION_REVALIDATE_DAYS", 7))
+SUPPRESSION_REVALIDATE_MAX_DAYS: int = int(os.getenv("SUPPRESSION_REVALIDATE_MAX_DAYS", 90))
+# Частотный лимит: не больше CAMPAIGN_FREQUENCY_CAP сообщений кампаний одному пользователю
+# за CAMPAIGN_FREQUENCY_WINDOW_DAYS дней. По умолчанию 0 - лимита нет, доставляются все сообщения.
+# Включение, например CAMPAIGN_FREQUENCY_CAP=1: тогда и разовые рассылки пропускают тех,
+# кто уже получил сообщение любой кампании за окно
+CAMPAIGN_FREQUENCY_CAP: int = int(os.getenv("CAMPAIGN_FREQUENCY_CAP", 0))
+CAMPAIGN_FREQUENCY_WINDOW_DAYS: int = int(os.getenv("CAMPAIGN_FREQUENCY_WINDOW_DAYS", 1))
+# Сколько секунд снимок аудитории триггера считается свежим для предпросмотра и отправки
+CAMPAIGN_AUDIENCE_SNAPSHOT_TTL: int = int(os.getenv("CAMPAIGN_AUDIENCE_SNAPSHOT_TTL", 600))
+PHOTO_PROCESS_WORKERS: int = int(os.getenv("PHOTO_PROCESS_WORKERS", 2))
+PHOTO_UPLOAD_CONCURRENCY: int = int(os.getenv("PHOTO_UPLOAD_CONCURRENCY", 4))
+
+# Хранилище статики: local - директория static, s3 - S3-совместимое хранилище
+ASSETS_BACKEND: str = os.getenv("ASSETS_BACKEND", "local")
+ASSETS_S3_ENDPOINT_URL: str = os.getenv("ASSETS_S3_ENDPOINT_URL")
+ASSETS_S3_BUCKET: str = os.getenv("ASSETS_S3_BUCKET")
+ASSETS_S3_ACCESS_KEY: str = os.getenv("ASSETS_S3_ACCESS_KEY")
+ASSETS_S3_SECRET_KEY: str = os.getenv("ASSETS_S3_SECRET_KEY")
+ASSETS_S3_REGION: str = os.getenv("ASSETS_S3_REGION", "us-east-1")
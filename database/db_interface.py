@@ -4,8 +4,11 @@ from sqlalchemy import ColumnExpressionArgument, text, update, func, desc, asc,
     select
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import InstrumentedAttribute, Query, joinedload, selectinload
+from database.ddl import DDL_STATEMENTS
 from database.exceptions import CustomDBExceptions
+from database.invalidation import invalidation_bus
 from database.models import *
+from database.statements import statements
 from loguru import logger
 
 
@@ -21,6 +24,7 @@ class BaseInterface:
             if not db_url:
                 raise ValueError('db_url is required for Class DBInterface if session_ is None')
             self.engine = create_async_engine(db_url, pool_timeout=60, pool_size=900, max_overflow=100)
+            statements.instrument(self.engine)
             self.async_ses = async_sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)
         else:
             self.async_ses = session_  
@@ -31,10 +35,13 @@ class BaseInterface:
     async def initial(self):
         """
         Метод иницилизирует соеденение с БД.
+        Создает таблицы и применяет DDL из database/ddl.py (триггеры, функции, первичное заполнение счетчиков).
         :return:
         """
         async with self.engine.begin() as conn:
             await conn.run_sync(self.base.metadata.create_all)
+            for statement in DDL_STATEMENTS:
+                await conn.execute(text(statement))
 
     async def _drop_all(self):
         """
@@ -44,6 +51,24 @@ class BaseInterface:
         async with self.engine.begin() as conn:
             await conn.run_sync(self.base.metadata.drop_all)
 
+    async def publish_invalidation(
+        self,
+        topic: str,
+        key: str | int | None = None,
+        session: AsyncSession | None = None
+    ):
+        '''
+        Сообщает остальным воркерам, что данные topic изменились (database/invalidation.py).
+        С session уведомление уходит при ее commit, без - сразу отдельной транзакцией.
+        '''
+        if session is not None:
+            await invalidation_bus.publish(session, topic, key)
+            return
+        async with self.async_ses() as session:
+            await invalidation_bus.publish(session, topic, key)
+            await session.commit()
+
+
     async def del_has_rows(self, rows_object):
         async with self.async_ses() as session:
             for rec in rows_object:
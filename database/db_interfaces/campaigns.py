@@ -1,13 +1,571 @@
-from datetime import datetime, timedelta
+import asyncio
+from datetime import date, datetime, time, timedelta
+import json
 from loguru import logger
 import sqlalchemy
-from sqlalchemy.dialects.postgresql import asyncpg
+from sqlalchemy.dialects.postgresql import asyncpg, insert as pg_insert
 from sqlalchemy.exc import IntegrityError, NoResultFound, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Select, String, TextualSelect, exists, func, literal, literal_column, select, update
+from database import task_stats
 from database.db_interface import BaseInterface, text
-from database.exceptions import CampaignNotFoundException, CustomDBExceptions
-from database.models import Campaign, CampaignTrigger, CampaignTriggerLink
-from typing import Literal
+from database.exceptions import CampaignNotFoundException, CampaignTriggerParamsError, CustomDBExceptions
+from config import (
+    CAMPAIGN_AUDIENCE_SNAPSHOT_TTL,
+    CAMPAIGN_FREQUENCY_CAP,
+    CAMPAIGN_FREQUENCY_WINDOW_DAYS,
+    SUPPRESSION_REVALIDATE_DAYS,
+    SUPPRESSION_REVALIDATE_MAX_DAYS
+)
+from database.models import BalanceReasons, Campaign, CampaignAudienceSnapshot, CampaignSuppression, CampaignTrigger, CampaignTriggerLink, User
+from database.statements import naive, statements
+from typing import Hashable, Iterable, Literal, NamedTuple
+
+
+# Необязательные фильтры списка кампаний: NULL в параметре - фильтр не применяется
+CAMPAIGNS_FILTERS = '''
+            WHERE (CAST(:campaign_id AS integer) IS NULL OR c.id = :campaign_id)
+            AND (CAST(:is_active AS boolean) IS NULL OR c.is_active = :is_active)
+            AND (CAST(:start_date AS timestamp) IS NULL OR c.shedulet_at >= :start_date)
+            AND (CAST(:end_date AS timestamp) IS NULL OR c.shedulet_at <= :end_date)
+            AND (CAST(:name AS varchar) IS NULL OR c.name ILIKE :name)'''
+
+CAMPAIGNS_COUNT = statements.register(
+    'campaigns.count',
+    '''
+            SELECT COUNT(DISTINCT c.id) as total
+            FROM campaigns c''' + CAMPAIGNS_FILTERS
+)
+
+CAMPAIGNS_PAGE_TEMPLATE = '''
+            SELECT 
+                c.*,
+                COALESCE(
+                    json_agg(
+                        json_build_object(
+                            'id', t.id,
+                            'name', t.name,
+                            'cron_expression', t.cron_expression,
+                            'trigger_params', ctl.trigger_params
+                        )
+                    ) FILTER (
+                        WHERE t.id IS NOT NULL 
+                        OR t.name IS NOT NULL 
+                        OR t.cron_expression IS NOT NULL 
+                        OR ctl.trigger_params IS NOT NULL
+                    ),
+                    '[]'::json
+                ) AS triggers
+            FROM campaigns c
+            LEFT JOIN campaigns_triggers_link ctl ON ctl.campaign_id = c.id
+            LEFT JOIN campaigns_triggers t ON ctl.trigger_id = t.id''' + CAMPAIGNS_FILTERS + '''
+            GROUP BY c.id, c.name
+            order by c.id {direction}
+            offset :offset
+            limit :limit
+'''
+# desc -> запрос
+CAMPAIGNS_PAGES = {
+    False: statements.register('campaigns.list', CAMPAIGNS_PAGE_TEMPLATE.format(direction='')),
+    True: statements.register('campaigns.list_desc', CAMPAIGNS_PAGE_TEMPLATE.format(direction='desc')),
+}
+
+# Получатель в списке подавления, и срок перепроверки еще не наступил. Поиск по первичному ключу tg_id
+NOT_SUPPRESSED = '''
+                        and not exists (
+                            select 1
+                            from campaigns_suppressions cs
+                            where cs.tg_id = u.tg_id
+                            and cs.revalidate_at > TIMEZONE('UTC', CURRENT_TIMESTAMP)
+                        )'''
+
+# Не забрали ежедневную награду сегодня: анти-join к сегодняшним начислениям.
+# Начисления за день читаются по индексу (reason, created_at, user_id) без обращения к таблице,
+# пользователи - одним проходом, стоимость линейна по числу пользователей
+EVERYDAY_REWARD_USERS = statements.register(
+    'campaigns.everyday_reward_users',
+    '''
+                    select u.tg_id
+                    from users u
+                    where 
+                        u.tg_id is not null
+                        and not exists (
+                            select 1
+                            from users_balances_history ubh
+                            where ubh.reason = ANY(CAST(:reasons AS varchar[]))
+                            and ubh.created_at >= :today
+                            and ubh.created_at < :tomorrow
+                            and ubh.user_id = u.id
+                        )''' + NOT_SUPPRESSED
+)
+EVERYDAY_REWARD_REASONS = [
+    BalanceReasons.everyday_reward.value,
+    BalanceReasons.everyday_reward_lite.value,
+    BalanceReasons.everyday_reward_pro.value,
+]
+
+# Последняя активность попала в день перед порогом: [date_limit - 1 день, date_limit).
+# Пользователь остается в аудитории весь день, когда его неактивность достигла N дней,
+# повторные запуски кампании в этот день его пропускают (audience_window).
+# Стоимость: диапазон индекса users_last_seen.last_seen_at и проба users по ключу на каждого,
+# O(A * log U), A - пользователи, чья последняя активность пришлась на этот день
+INACTIVE_USERS = statements.register(
+    'campaigns.inactive_users',
+    '''
+                    SELECT u.tg_id
+                    FROM users_last_seen ls
+                    JOIN users u ON u.id = ls.user_id
+                    WHERE 
+                        ls.last_seen_at >= CAST(:date_limit AS timestamp) - INTERVAL '1 day'
+                        AND ls.last_seen_at < :date_limit
+                        AND u.tg_id IS NOT NULL''' + NOT_SUPPRESSED + '''
+    '''
+)
+
+# Первое событие event_type попало в окно [since, until), повторные запуски кампании
+# в течение окна отсекаются по журналу доставок (audience_window).
+# Прогнозы пишет в users_statistic основное приложение, этот репозиторий таких событий не создает,
+# поэтому тип события - обязательный параметр триггера, без значения по умолчанию.
+# Стоимость: события окна по BRIN users_statistic.created_at, на каждое - проба индекса
+# (user_id, type, created_at) на более раннее такое же событие. O(E * log N), E - события окна,
+# от общего числа пользователей и событий не зависит
+FIRST_EVENT_USERS = statements.register(
+    'campaigns.first_event_users',
+    '''
+                    SELECT DISTINCT u.tg_id
+                    FROM users_statistic us
+                    JOIN users u ON u.id = us.user_id
+                    WHERE
+                        us.type = :event_type
+                        AND us.created_at >= :since
+                        AND us.created_at < :until
+                        AND u.tg_id IS NOT NULL
+                        AND NOT EXISTS (
+                            SELECT 1
+                            FROM users_statistic prev
+                            WHERE prev.user_id = us.user_id
+                            AND prev.type = :event_type
+                            AND prev.created_at < :since
+                        )''' + NOT_SUPPRESSED
+)
+
+# Не участвуют в конкурсе, раунд которого закончится в [now, now + hours): конец - start_date + period_days.
+# Повторные запуски кампании в течение hours отсекаются по журналу доставок (audience_window).
+# Анти-join к giveaways_participants_users - проекции giveaways_participant без повторов с ключом (giveaway_id, user_id).
+# Стоимость: giveaways (десятки строк) читается целиком, users - одним проходом,
+# на пользователя - проба ключа по каждому заканчивающемуся конкурсу. O(U * G * log P), G - такие конкурсы
+ENDING_SOON_GIVEAWAYS_USERS = statements.register(
+    'campaigns.ending_soon_giveaways_users',
+    '''
+                    WITH ending AS (
+                        SELECT g.id
+                        FROM giveaways g
+                        WHERE
+                            g.active
+                            AND g.start_date + make_interval(days => g.period_days) >= :now
+                            AND g.start_date + make_interval(days => g.period_days)
+                                < CAST(:now AS timestamp) + make_interval(hours => CAST(:hours AS integer))
+                    )
+                    SELECT u.tg_id
+                    FROM users u
+                    WHERE
+                        u.tg_id IS NOT NULL
+                        AND EXISTS (
+                            SELECT 1
+                            FROM ending e
+                            WHERE NOT EXISTS (
+                                SELECT 1
+                                FROM giveaways_participants_users gpu
+                                WHERE gpu.giveaway_id = e.id
+                                AND gpu.user_id = u.id
+                            )
+                        )''' + NOT_SUPPRESSED
+)
+
+# Не участвовал в конкурсе: анти-join по ключу (giveaway_id, user_id) giveaways_participants_users.
+# Стоимость: один проход по users и hash anti-join с участниками конкурса, O(U + P_конкурса)
+NOT_PARTICIPATED_USERS = statements.register(
+    'campaigns.not_participated_users',
+    '''
+                    SELECT u.tg_id
+                    FROM users u
+                    WHERE
+                        u.tg_id IS NOT NULL
+                        AND NOT EXISTS (
+                            SELECT 1
+                            FROM giveaways_participants_users gpu
+                            WHERE gpu.giveaway_id = :giveaway_id
+                            AND gpu.user_id = u.id
+                        )''' + NOT_SUPPRESSED
+)
+# Ни разу не участвовал ни в одном конкурсе: анти-join по индексу giveaways_participants_users (user_id).
+# Стоимость: O(U + P), P - уникальные пары участник-конкурс
+NEVER_PARTICIPATED_USERS = statements.register(
+    'campaigns.never_participated_users',
+    '''
+                    SELECT u.tg_id
+                    FROM users u
+                    WHERE
+                        u.tg_id IS NOT NULL
+                        AND NOT EXISTS (
+                            SELECT 1
+                            FROM giveaways_participants_users gpu
+                            WHERE gpu.user_id = u.id
+                        )''' + NOT_SUPPRESSED
+)
+
+# Повторная неудача удваивает интервал перепроверки (не больше max_days).
+# Время подавления - UTC, как created_at событий users_statistic, с которыми его сравнивает REVALIDATE_SUPPRESSIONS
+SUPPRESS_RECIPIENTS = statements.register(
+    'campaigns.suppress_recipients',
+    '''
+                    INSERT INTO campaigns_suppressions AS cs (tg_id, reason, attempts, suppressed_at, revalidate_at)
+                    SELECT
+                        r.tg_id,
+                        r.reason,
+                        1,
+                        TIMEZONE('UTC', CURRENT_TIMESTAMP),
+                        TIMEZONE('UTC', CURRENT_TIMESTAMP) + make_interval(days => :days)
+                    FROM unnest(CAST(:tg_ids AS varchar[]), CAST(:reasons AS varchar[])) AS r(tg_id, reason)
+                    ON CONFLICT (tg_id) DO UPDATE SET
+                        reason = EXCLUDED.reason,
+                        attempts = cs.attempts + 1,
+                        suppressed_at = EXCLUDED.suppressed_at,
+                        revalidate_at = EXCLUDED.suppressed_at + make_interval(
+                            days => LEAST(:days * power(2, LEAST(cs.attempts, 30))::bigint, :max_days)::integer
+                        )
+    '''
+)
+# Доставка после перепроверки прошла - получатель снова доступен
+UNSUPPRESS_RECIPIENTS = statements.register(
+    'campaigns.unsuppress_recipients',
+    '''
+                    DELETE FROM campaigns_suppressions
+                    WHERE tg_id = ANY(CAST(:tg_ids AS varchar[]))
+                    AND revalidate_at <= TIMEZONE('UTC', CURRENT_TIMESTAMP)
+    '''
+)
+# Пользователь запустил бота после подавления - значит, разблокировал его.
+# Считается только START_BOT: открыть веб-приложение (RUN_APP) можно и с заблокированным ботом.
+# Стоимость: на каждое подавление - проба индекса users_statistic (user_id, type, created_at)
+REVALIDATE_SUPPRESSIONS = statements.register(
+    'campaigns.revalidate_suppressions',
+    '''
+                    DELETE FROM campaigns_suppressions cs
+                    USING users u
+                    WHERE u.tg_id = cs.tg_id
+                    AND EXISTS (
+                        SELECT 1
+                        FROM users_statistic us
+                        WHERE us.user_id = u.id
+                        AND us.type = :event_type
+                        AND us.created_at > cs.suppressed_at
+                    )
+    '''
+)
+BOT_STARTED_EVENT = 'START_BOT'
+
+# Резерв доставок под частотный лимит: одним запросом по всей аудитории.
+# Счетчики за окно [day - window_days + 1, day] суммируются hash join'ом с массивом получателей,
+# прошедшим лимит увеличивается счетчик за day. Возвращаются получатели, которым можно отправить
+RESERVE_DELIVERIES = statements.register(
+    'campaigns.reserve_deliveries',
+    '''
+                    WITH recipients AS (
+                        SELECT DISTINCT unnest(CAST(:tg_ids AS varchar[])) AS tg_id
+                    ),
+                    allowed AS (
+                        SELECT r.tg_id
+                        FROM recipients r
+                        LEFT JOIN campaigns_delivery_counters dc
+                            ON dc.tg_id = r.tg_id
+                            AND dc.day > CAST(:day AS date) - CAST(:window_days AS integer)
+                            AND dc.day <= CAST(:day AS date)
+                        GROUP BY r.tg_id
+                        HAVING COALESCE(SUM(dc.sent), 0) < CAST(:cap AS integer)
+                    )
+                    INSERT INTO campaigns_delivery_counters AS dc (tg_id, day, sent)
+                    SELECT tg_id, CAST(:day AS date), 1 FROM allowed
+                    ON CONFLICT (tg_id, day) DO UPDATE SET sent = dc.sent + 1
+                    RETURNING dc.tg_id
+    '''
+)
+# Резервы кампаний сериализуются: иначе две кампании прочитают одни и те же счетчики и обе уложатся в лимит
+FREQUENCY_CAP_LOCK = statements.register(
+    'campaigns.frequency_cap_lock',
+    'SELECT pg_advisory_xact_lock(:key)'
+)
+FREQUENCY_CAP_LOCK_KEY = 47_000_001
+# Не доставленное сообщение не расходует лимит
+RELEASE_DELIVERIES = statements.register(
+    'campaigns.release_deliveries',
+    '''
+                    UPDATE campaigns_delivery_counters
+                    SET sent = sent - 1
+                    WHERE tg_id = ANY(CAST(:tg_ids AS varchar[]))
+                    AND day = CAST(:day AS date)
+                    AND sent > 0
+    '''
+)
+PRUNE_DELIVERY_COUNTERS = statements.register(
+    'campaigns.prune_delivery_counters',
+    '''
+                    DELETE FROM campaigns_delivery_counters
+                    WHERE day <= CAST(:day AS date) - CAST(:window_days AS integer)
+    '''
+)
+
+# Журнал доставок триггерных кампаний: получатели, которым кампания уже отправлена за окно триггера.
+# Время - UTC, как created_at событий
+EXCLUDE_DELIVERED = statements.register(
+    'campaigns.exclude_delivered',
+    '''
+                    SELECT r.tg_id
+                    FROM unnest(CAST(:tg_ids AS varchar[])) AS r(tg_id)
+                    WHERE NOT EXISTS (
+                        SELECT 1
+                        FROM campaigns_deliveries d
+                        WHERE d.campaign_id = :campaign_id
+                        AND d.tg_id = r.tg_id
+                        AND d.sent_at > TIMEZONE('UTC', CURRENT_TIMESTAMP)
+                            - make_interval(secs => CAST(:window_seconds AS double precision))
+                    )
+    '''
+)
+RECORD_DELIVERIES = statements.register(
+    'campaigns.record_deliveries',
+    '''
+                    INSERT INTO campaigns_deliveries AS d (campaign_id, tg_id, sent_at, expires_at)
+                    SELECT
+                        :campaign_id,
+                        r.tg_id,
+                        TIMEZONE('UTC', CURRENT_TIMESTAMP),
+                        TIMEZONE('UTC', CURRENT_TIMESTAMP) + make_interval(secs => CAST(:window_seconds AS double precision))
+                    FROM (SELECT DISTINCT unnest(CAST(:tg_ids AS varchar[])) AS tg_id) r
+                    ON CONFLICT (campaign_id, tg_id) DO UPDATE SET
+                        sent_at = EXCLUDED.sent_at,
+                        expires_at = EXCLUDED.expires_at
+    '''
+)
+PRUNE_DELIVERIES = statements.register(
+    'campaigns.prune_deliveries',
+    '''
+                    DELETE FROM campaigns_deliveries
+                    WHERE expires_at <= TIMEZONE('UTC', CURRENT_TIMESTAMP)
+    '''
+)
+
+# Сборка одного снимка в разных процессах (воркеры API, планировщик) идет по очереди
+AUDIENCE_SNAPSHOT_LOCK = statements.register(
+    'campaigns.audience_snapshot_lock',
+    'SELECT pg_advisory_xact_lock(:lock_class, hashtext(:key))'
+)
+AUDIENCE_SNAPSHOT_LOCK_CLASS = 47_000_002
+# Пример аудитории одного снимка: срез массива в БД, в воркер уходят только sample_size tg_id
+AUDIENCE_SAMPLE = statements.register(
+    'campaigns.audience_sample',
+    '''
+                    SELECT s.tg_ids[1:CAST(:sample_size AS integer)]
+                    FROM campaigns_audience_snapshots s
+                    WHERE s.key = :key
+    '''
+)
+# Размер и пример объединения или пересечения нескольких снимков, массивы разворачиваются в БД
+COMBINED_AUDIENCE_TEMPLATE = '''
+                    WITH audience AS (
+                        SELECT a.tg_id
+                        FROM campaigns_audience_snapshots s
+                        CROSS JOIN LATERAL unnest(s.tg_ids) AS a(tg_id)
+                        WHERE s.key = ANY(CAST(:keys AS varchar[]))
+                        GROUP BY a.tg_id{having}
+                    )
+                    SELECT
+                        (SELECT count(*) FROM audience) AS total,
+                        ARRAY(SELECT tg_id FROM audience LIMIT :sample_size) AS sample
+'''
+# Тип кампании -> запрос: триггерная - объединение, разовая - пересечение (как combine_audiences)
+COMBINED_AUDIENCES = {
+    'trigger': statements.register('campaigns.audience_union', COMBINED_AUDIENCE_TEMPLATE.format(having='')),
+    'one_time': statements.register(
+        'campaigns.audience_intersection',
+        COMBINED_AUDIENCE_TEMPLATE.format(having='''
+                        HAVING count(DISTINCT s.key) = :keys_count''')
+    ),
+}
+
+# id триггеров в campaigns_triggers (campaign_scheduler.triggers.TriggersMap)
+EVERYDAY_REWARD_TRIGGER = 1
+FIRST_PREDICT_TRIGGER = 2
+USER_INACTIVITY_TRIGGER = 3
+UNCOMPLETE_TASK_TRIGGER = 4
+GIVEAWAY_ENDING_SOON_TRIGGER = 5
+NOT_PARTICIPATION_TRIGGER = 6
+
+# Параметры, без которых аудиторию триггера не посчитать
+REQUIRED_TRIGGER_PARAMS: dict[int, tuple[str, ...]] = {
+    FIRST_PREDICT_TRIGGER: ('event_type',),
+    USER_INACTIVITY_TRIGGER: ('inactive_days',),
+    UNCOMPLETE_TASK_TRIGGER: ('task_id',),
+    GIVEAWAY_ENDING_SOON_TRIGGER: ('hours',),
+}
+
+
+def check_trigger_params(trigger_id: int, trigger_params: dict | None):
+    missing = [
+        name for name in REQUIRED_TRIGGER_PARAMS.get(trigger_id, ())
+        if (trigger_params or {}).get(name) in (None, '')
+    ]
+    if missing:
+        raise CampaignTriggerParamsError(
+            message=f'Trigger (id={trigger_id}) requires trigger_params: {", ".join(missing)}'
+        )
+
+
+def audience_window(trigger_id: int, trigger_params: dict | None) -> timedelta | None:
+    '''
+    Сколько пользователь остается в аудитории триггера с окном. Cron кампании может срабатывать чаще,
+    поэтому получатели, которым кампания отправлена за это время, исключаются (CampaignsDBInterface.exclude_delivered).
+    None - аудитория описывает текущее состояние (не забрал награду, не выполнил задачу) и напоминание повторяется
+    '''
+    params = trigger_params or {}
+    if trigger_id == FIRST_PREDICT_TRIGGER:
+        return timedelta(hours=int(params.get('hours') or 24))
+    if trigger_id == GIVEAWAY_ENDING_SOON_TRIGGER:
+        return timedelta(hours=int(params['hours']))
+    if trigger_id == USER_INACTIVITY_TRIGGER:
+        return timedelta(days=1)
+    return None
+
+
+# Запрос аудитории с колонкой tg_id и подставленными параметрами: выполняется сам по себе
+# или подзапросом при сборке снимка в БД
+AudienceQuery = Select | TextualSelect
+
+
+def everyday_reward_audience(now: datetime | None = None) -> AudienceQuery:
+    today = datetime.combine((now or datetime.now()).date(), time.min)
+    return EVERYDAY_REWARD_USERS.bindparams(
+        reasons=EVERYDAY_REWARD_REASONS,
+        today=today,
+        tomorrow=today + timedelta(days=1)
+    ).columns(tg_id=String)
+
+
+def inactive_audience(inactive_days: int, now: datetime | None = None) -> AudienceQuery:
+    date_limit = datetime.combine((now or datetime.now()).date() - timedelta(days=inactive_days), time.min)
+    return INACTIVE_USERS.bindparams(date_limit=date_limit).columns(tg_id=String)
+
+
+def uncomplete_task_audience(task_id: int) -> AudienceQuery:
+    '''
+    Начали задачу и не выполнили (user_tasks_progress).
+    Стоимость: индекс user_tasks_progress (task_template_id) и проба users по ключу, O(P * log U), P - начавшие задачу
+    '''
+    uncompleted_users = task_stats.uncompleted_task_users(task_id).subquery('uncompleted_users')
+    return (
+        select(User.tg_id)
+        .join(uncompleted_users, uncompleted_users.c.user_id == User.id)
+        .where(User.tg_id.is_not(None), not_suppressed(User.tg_id))
+    )
+
+
+def first_event_audience(event_type: str, hours: int = 24, now: datetime | None = None) -> AudienceQuery:
+    until = now or datetime.now()
+    return FIRST_EVENT_USERS.bindparams(
+        event_type=event_type,
+        since=until - timedelta(hours=hours),
+        until=until
+    ).columns(tg_id=String)
+
+
+def giveaway_ending_soon_audience(hours: int, now: datetime | None = None) -> AudienceQuery:
+    return ENDING_SOON_GIVEAWAYS_USERS.bindparams(now=now or datetime.now(), hours=hours).columns(tg_id=String)
+
+
+def not_participated_audience(giveaway_id: int | None = None) -> AudienceQuery:
+    if giveaway_id is None:
+        return NEVER_PARTICIPATED_USERS.columns(tg_id=String)
+    return NOT_PARTICIPATED_USERS.bindparams(giveaway_id=giveaway_id).columns(tg_id=String)
+
+
+def trigger_audience(trigger_id: int, trigger_params: dict | None) -> AudienceQuery:
+    '''Запрос аудитории триггера по текущим данным'''
+    check_trigger_params(trigger_id, trigger_params)
+    params = trigger_params or {}
+    try:
+        if trigger_id == EVERYDAY_REWARD_TRIGGER:
+            return everyday_reward_audience()
+        if trigger_id == USER_INACTIVITY_TRIGGER:
+            return inactive_audience(inactive_days=int(params['inactive_days']))
+        if trigger_id == UNCOMPLETE_TASK_TRIGGER:
+            return uncomplete_task_audience(task_id=int(params['task_id']))
+        if trigger_id == FIRST_PREDICT_TRIGGER:
+            return first_event_audience(
+                event_type=str(params['event_type']),
+                hours=int(params.get('hours') or 24)
+            )
+        if trigger_id == GIVEAWAY_ENDING_SOON_TRIGGER:
+            return giveaway_ending_soon_audience(hours=int(params['hours']))
+        if trigger_id == NOT_PARTICIPATION_TRIGGER:
+            giveaway_id = params.get('giveaway_id')
+            return not_participated_audience(giveaway_id=int(giveaway_id) if giveaway_id is not None else None)
+    except (KeyError, TypeError, ValueError):
+        raise CampaignTriggerParamsError(message=f'Bad trigger_params for trigger (id={trigger_id}): {trigger_params}')
+    raise CampaignTriggerParamsError(message=f'Trigger (id={trigger_id}) is not found')
+
+
+class AudienceSnapshot(NamedTuple):
+    tg_ids: list[str]
+    created_at: datetime
+
+
+class AudienceSnapshotInfo(NamedTuple):
+    '''Снимок без tg_ids - для предпросмотра, который считает размер в БД'''
+    key: str
+    size: int
+    created_at: datetime
+
+
+def audience_key(trigger_id: int, trigger_params: dict | None, day: date) -> str:
+    '''Аудитории зависят от текущего дня, поэтому снимок прошлого дня не переиспользуется'''
+    params = json.dumps(trigger_params or {}, sort_keys=True, separators=(',', ':'))
+    return f'{day.isoformat()}:{trigger_id}:{params}'
+
+
+def combine_audiences(type: Literal['one_time', 'trigger'], audiences: Iterable[Iterable[Hashable]]) -> set:
+    '''Триггерная кампания - объединение аудиторий триггеров, разовая - пересечение'''
+    audiences = iter(audiences)
+    result = set(next(audiences, ()))
+    for audience in audiences:
+        if type == 'trigger':
+            result.update(audience)
+        elif type == 'one_time':
+            result.intersection_update(audience)
+    return result
+
+
+def not_suppressed(tg_id_column):
+    '''То же условие, что NOT_SUPPRESSED, для запросов на SQLAlchemy'''
+    return ~exists().where(
+        CampaignSuppression.tg_id == tg_id_column,
+        CampaignSuppression.revalidate_at > func.timezone('UTC', func.current_timestamp())
+    )
+
+
+def campaigns_filters(
+    campaign_id: int | None,
+    is_active: bool | None,
+    start_date: datetime | None,
+    end_date: datetime | None,
+    name: str | None
+) -> dict:
+    return {
+        'campaign_id': campaign_id,
+        'is_active': is_active,
+        'start_date': naive(start_date) if start_date is not None else None,
+        'end_date': naive(end_date) if end_date is not None else None,
+        'name': f"%{name}%" if name is not None else None,
+    }
 
 
 class CampaignsDBInterface(BaseInterface):
@@ -17,6 +575,8 @@ class CampaignsDBInterface(BaseInterface):
         session_: AsyncSession = None
     ):
         super().__init__(db_url=db_url, session_ = session_)
+        # Снимки, которые сейчас считаются: параллельные запросы одной аудитории ждут один расчет
+        self._audience_tasks: dict[str, asyncio.Task] = {}
     
     
     async def delete(self, campaign_id: int):
@@ -32,6 +592,11 @@ class CampaignsDBInterface(BaseInterface):
     async def update(self, campaign_id: int, **new_data):
         try:
             triggers = new_data.pop("triggers", None)
+            for trigger_data in triggers or []:
+                check_trigger_params(trigger_data['id'], trigger_data.get('trigger_params'))
+            if 'photo' in new_data:
+                # Загруженное в Telegram фото больше не соответствует кампании
+                new_data['photo_file_id'] = None
             await self.update_rows(
                 Campaign,
                 filter_by={'id': campaign_id},
@@ -61,6 +626,8 @@ class CampaignsDBInterface(BaseInterface):
             
     
     async def add(self, campaign_data: dict):
+        for trigger_data in campaign_data["triggers"]:
+            check_trigger_params(trigger_data['id'], trigger_data.get('trigger_params'))
         async with self.async_ses() as session:
             try:
                 campaign = Campaign(
@@ -108,43 +675,25 @@ class CampaignsDBInterface(BaseInterface):
         name: str | None = None,
     ) -> int:
         async with self.async_ses() as session:
-            params = {}
-            filters = []
-
-            if campaign_id is not None:
-                filters.append('c.id = :campaign_id')
-                params['campaign_id'] = campaign_id
-            if is_active is not None:
-                filters.append('c.is_active = :is_active')
-                params['is_active'] = is_active
-            if start_date is not None:
-                filters.append('c.shedulet_at >= :start_date')
-                params['start_date'] = start_date
-            if end_date is not None:
-                filters.append('c.shedulet_at <= :end_date')
-                params['end_date'] = end_date
-            if name is not None:
-                filters.append('c.name ILIKE :name')
-                params['name'] = f"%{name}%"
-
-            filters_str = ""
-            if filters:
-                filters_str = "WHERE " + " AND ".join(filters)
-
             result = await session.execute(
-                text(
-                    f'''
-                    SELECT COUNT(DISTINCT c.id) as total
-                    FROM campaigns c
-                    {filters_str}
-                    '''
-                ),
-                params=params
+                CAMPAIGNS_COUNT,
+                params=campaigns_filters(campaign_id, is_active, start_date, end_date, name)
             )
-
             return result.scalar_one()
     
     
+    async def set_photo_file_id(self, campaign_id: int, photo: str, photo_file_id: str) -> bool:
+        '''Сохраняет file_id, только если фото кампании не поменялось с начала рассылки'''
+        async with self.async_ses() as session:
+            result = await session.execute(
+                update(Campaign)
+                .where(Campaign.id == campaign_id, Campaign.photo == photo)
+                .values(photo_file_id=photo_file_id)
+            )
+            await session.commit()
+        return bool(result.rowcount)
+    
+    
     async def get_triggers(self):
         return await self.get_rows(
             CampaignTrigger
@@ -164,161 +713,328 @@ class CampaignsDBInterface(BaseInterface):
         name: str | None = None
     ):
         async with self.async_ses() as session:
-            params={
-                "offset": (page-1)*per_page,
-                "limit": per_page
-            }
-
-            match order_by:
-                case 'id':
-                    order_by = 'c.id'
-                case _:
-                    order_by = 'c.id'
-            filters = []
-            if campaign_id is not None:
-                filters.append('c.id=:campaign_id')
-                params['campaign_id'] = campaign_id
-            if is_active is not None:
-                filters.append(f'c.is_active=:is_active')
-                params['is_active'] = is_active
-            if start_date is not None:
-                filters.append('c.shedulet_at>=:start_date')
-                params['start_date'] = start_date
-            if end_date is not None:
-                filters.append(f'c.shedulet_at<=:end_date')
-                params['end_date'] = end_date
-            if name is not None:
-                filters.append(f"c.name ILIKE :name")
-                params['name'] = f"%{name}%"
-                
-            filters_str = ""
-            if filters:
-                filters_str = "WHERE " + " AND ".join(filters)
-                
-            logger.debug(filters_str)
-            logger.debug(params)
-            query = f'''
-            SELECT 
-                c.*,
-                COALESCE(
-                    json_agg(
-                        json_build_object(
-                            'id', t.id,
-                            'name', t.name,
-                            'cron_expression', t.cron_expression,
-                            'trigger_params', ctl.trigger_params
-                        )
-                    ) FILTER (
-                        WHERE t.id IS NOT NULL 
-                        OR t.name IS NOT NULL 
-                        OR t.cron_expression IS NOT NULL 
-                        OR ctl.trigger_params IS NOT NULL
-                    ),
-                    '[]'::json
-                ) AS triggers
-            FROM campaigns c
-            LEFT JOIN campaigns_triggers_link ctl ON ctl.campaign_id = c.id
-            LEFT JOIN campaigns_triggers t ON ctl.trigger_id = t.id 
-            {filters_str}
-            GROUP BY c.id, c.name
-            order by {order_by} {'desc' if order_direction == 'desc' else ''}
-            offset :offset
-            limit :limit
-            '''
-            logger.debug(query)
             result = await session.execute(
-                text(query),
-                params=params
+                CAMPAIGNS_PAGES[order_direction == 'desc'],
+                params={
+                    **campaigns_filters(campaign_id, is_active, start_date, end_date, name),
+                    "offset": (page-1)*per_page,
+                    "limit": per_page
+                }
             )
             
         return result.mappings().all()
         
     
-    async def get_evryday_reward_users_pool(self) -> list[str]:
+    async def _fetch_audience(self, query: AudienceQuery) -> list[str]:
+        async with self.async_ses() as session:
+            result = await session.scalars(query)
+        return result.all()
+    
+    
+    async def get_evryday_reward_users_pool(self, now: datetime | None = None) -> list[str]:
+        return await self._fetch_audience(everyday_reward_audience(now))
+    
+    
+    async def get_users_inactive(self, inactive_days: int, now: datetime | None = None) -> list[str]:
+        '''Пользователи, у которых сегодня исполнилось inactive_days дней без активности (users_last_seen)'''
+        return await self._fetch_audience(inactive_audience(inactive_days, now))
+    
+    
+    async def get_uncomplete_task_users_pool(self, task_id: int) -> list[str]:
+        return await self._fetch_audience(uncomplete_task_audience(task_id))
+    
+    
+    async def get_first_event_users_pool(
+        self,
+        event_type: str,
+        hours: int = 24,
+        now: datetime | None = None
+    ) -> list[str]:
+        '''Пользователи, у которых первое событие event_type было за последние hours часов'''
+        return await self._fetch_audience(first_event_audience(event_type, hours, now))
+    
+    
+    async def get_giveaway_ending_soon_users_pool(self, hours: int, now: datetime | None = None) -> list[str]:
+        return await self._fetch_audience(giveaway_ending_soon_audience(hours, now))
+    
+    
+    async def get_not_participated_users_pool(self, giveaway_id: int | None = None) -> list[str]:
+        return await self._fetch_audience(not_participated_audience(giveaway_id))
+    
+    
+    async def resolve_audience(self, trigger_id: int, trigger_params: dict | None) -> list[str]:
+        '''Аудитория триггера, посчитанная по текущим данным'''
+        return await self._fetch_audience(trigger_audience(trigger_id, trigger_params))
+    
+    
+    async def get_audience_snapshot(self, trigger_id: int, trigger_params: dict | None) -> AudienceSnapshot | None:
+        '''Последний сохраненный снимок за сегодня, независимо от возраста'''
+        return await self._get_audience_snapshot(audience_key(trigger_id, trigger_params, date.today()))
+    
+    
+    async def _get_audience_snapshot(self, key: str) -> AudienceSnapshot | None:
+        async with self.async_ses() as session:
+            result = await session.execute(
+                select(CampaignAudienceSnapshot.tg_ids, CampaignAudienceSnapshot.created_at)
+                .where(CampaignAudienceSnapshot.key == key)
+            )
+            row = result.one_or_none()
+        return AudienceSnapshot(tg_ids=row.tg_ids, created_at=row.created_at) if row is not None else None
+    
+    
+    async def get_audience_snapshot_info(self, trigger_id: int, trigger_params: dict | None) -> AudienceSnapshotInfo | None:
+        '''Как get_audience_snapshot, но без чтения массива tg_ids'''
+        key = audience_key(trigger_id, trigger_params, date.today())
+        async with self.async_ses() as session:
+            return await self._get_audience_snapshot_info(session, key)
+    
+    
+    @staticmethod
+    async def _get_audience_snapshot_info(session: AsyncSession, key: str) -> AudienceSnapshotInfo | None:
+        result = await session.execute(
+            select(CampaignAudienceSnapshot.size, CampaignAudienceSnapshot.created_at)
+            .where(CampaignAudienceSnapshot.key == key)
+        )
+        row = result.one_or_none()
+        return AudienceSnapshotInfo(key=key, size=row.size, created_at=row.created_at) if row is not None else None
+    
+    
+    async def get_audience_info(
+        self,
+        trigger_id: int,
+        trigger_params: dict | None,
+        max_age: int = CAMPAIGN_AUDIENCE_SNAPSHOT_TTL
+    ) -> AudienceSnapshotInfo:
+        '''Как get_audience: свежий снимок или пересчет, но возвращается только размер'''
+        info = await self.get_audience_snapshot_info(trigger_id, trigger_params)
+        if info is not None and info.created_at >= datetime.now() - timedelta(seconds=max_age):
+            return info
+        return await self.refresh_audience(trigger_id, trigger_params, max_age)
+    
+    
+    async def get_audience_sample(self, key: str, sample_size: int) -> list[str]:
+        async with self.async_ses() as session:
+            result = await session.scalars(AUDIENCE_SAMPLE, params={'key': key, 'sample_size': sample_size})
+            return result.one_or_none() or []
+    
+    
+    async def get_combined_audience(
+        self,
+        type: Literal['one_time', 'trigger'],
+        keys: list[str],
+        sample_size: int
+    ) -> tuple[int, list[str]]:
+        '''Размер и пример аудитории кампании из нескольких снимков'''
+        keys = list(dict.fromkeys(keys))
+        params = {'keys': keys, 'sample_size': sample_size}
+        if type == 'one_time':
+            params['keys_count'] = len(keys)
+        async with self.async_ses() as session:
+            result = await session.execute(COMBINED_AUDIENCES[type], params=params)
+            row = result.one()
+        return row.total, list(row.sample)
+    
+    
+    async def get_audience(
+        self,
+        trigger_id: int,
+        trigger_params: dict | None,
+        max_age: int = CAMPAIGN_AUDIENCE_SNAPSHOT_TTL
+    ) -> AudienceSnapshot:
+        '''Снимок аудитории не старше max_age секунд, при его отсутствии аудитория пересчитывается'''
+        snapshot = await self.get_audience_snapshot(trigger_id, trigger_params)
+        if snapshot is not None and snapshot.created_at >= datetime.now() - timedelta(seconds=max_age):
+            return snapshot
+        info = await self.refresh_audience(trigger_id, trigger_params, max_age)
+        # Снимок собран в БД, tg_ids читаются один раз - для отправки
+        return await self._get_audience_snapshot(info.key)
+    
+    
+    async def refresh_audience(
+        self,
+        trigger_id: int,
+        trigger_params: dict | None,
+        max_age: int = CAMPAIGN_AUDIENCE_SNAPSHOT_TTL
+    ) -> AudienceSnapshotInfo:
+        key = audience_key(trigger_id, trigger_params, date.today())
+        task = self._audience_tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(self._save_audience(key, trigger_id, trigger_params, max_age))
+            self._audience_tasks[key] = task
+            task.add_done_callback(lambda task: self._audience_tasks.pop(key, None))
+        # Отмена ожидающего (таймаут предпросмотра) не прерывает расчет, снимок все равно сохранится
+        return await asyncio.shield(task)
+    
+    
+    async def _save_audience(
+        self,
+        key: str,
+        trigger_id: int,
+        trigger_params: dict | None,
+        max_age: int
+    ) -> AudienceSnapshotInfo:
+        '''
+        Снимок собирается в БД (INSERT ... SELECT array_agg): tg_id аудитории не проходят через процесс.
+        Расчеты одного снимка в разных процессах сериализуются блокировкой по ключу:
+        дождавшийся блокировки берет снимок, собранный другим процессом, если тот достаточно свежий
+        '''
+        audience = trigger_audience(trigger_id, trigger_params).subquery('audience')
+        async with self.async_ses() as session:
+            await session.execute(AUDIENCE_SNAPSHOT_LOCK, params={'lock_class': AUDIENCE_SNAPSHOT_LOCK_CLASS, 'key': key})
+            info = await self._get_audience_snapshot_info(session, key)
+            if info is not None and info.created_at >= datetime.now() - timedelta(seconds=max_age):
+                await session.commit()
+                return info
+
+            created_at = datetime.now()
+            insert = pg_insert(CampaignAudienceSnapshot).from_select(
+                ['key', 'trigger_id', 'tg_ids', 'size', 'created_at'],
+                select(
+                    literal(key),
+                    literal(trigger_id),
+                    func.coalesce(func.array_agg(audience.c.tg_id), literal_column("'{}'")),
+                    func.count(),
+                    literal(created_at),
+                ).select_from(audience)
+            )
+            result = await session.execute(
+                insert.on_conflict_do_update(
+                    index_elements=[CampaignAudienceSnapshot.key],
+                    set_={
+                        'tg_ids': insert.excluded.tg_ids,
+                        'size': insert.excluded.size,
+                        'created_at': insert.excluded.created_at,
+                    }
+                ).returning(CampaignAudienceSnapshot.size)
+            )
+            size = result.scalar_one()
+            await session.commit()
+        return AudienceSnapshotInfo(key=key, size=size, created_at=created_at)
+    
+    
+    async def prune_audience_snapshots(self) -> int:
+        '''Снимки прошлых дней не используются'''
+        async with self.async_ses() as session:
+            result = await session.execute(
+                sqlalchemy.delete(CampaignAudienceSnapshot)
+                .where(CampaignAudienceSnapshot.created_at < datetime.combine(date.today(), time.min))
+            )
+            await session.commit()
+        return result.rowcount
+    
+    
+    async def suppress_recipients(self, reasons: dict[str, str]):
+        '''
+        Исключает получателей из аудиторий кампаний до перепроверки.
+        
+        :param reasons: tg_id -> описание ошибки Telegram
+        '''
+        if not reasons:
+            return
+        async with self.async_ses() as session:
+            await session.execute(
+                SUPPRESS_RECIPIENTS,
+                params={
+                    'tg_ids': list(reasons),
+                    'reasons': list(reasons.values()),
+                    'days': SUPPRESSION_REVALIDATE_DAYS,
+                    'max_days': SUPPRESSION_REVALIDATE_MAX_DAYS,
+                }
+            )
+            await session.commit()
+    
+    
+    async def unsuppress_recipients(self, tg_ids: list[str]):
+        if not tg_ids:
+            return
+        async with self.async_ses() as session:
+            await session.execute(UNSUPPRESS_RECIPIENTS, params={'tg_ids': tg_ids})
+            await session.commit()
+    
+    
+    async def exclude_delivered(self, campaign_id: int, tg_ids: list[str], window: timedelta) -> list[str]:
+        '''tg_ids без получателей, которым кампания уже доставлена за последние window'''
+        if not tg_ids:
+            return tg_ids
         async with self.async_ses() as session:
             result = await session.scalars(
-                text(
-                    '''
-                    select
-                        distinct on (u.id) 
-                        u.tg_id
-                    from 
-                        users_balances_history as ubh
-                    join users u on
-                        u.id != ubh.user_id
-                    where 
-                        ubh.created_at::date = :today
-                        and 
-                        ubh.reason like('%Everyday reward%')
-                        and 
-                        u.tg_id is not null
-                    '''
-                ),
-                params={'today': datetime.today().date()}
+                EXCLUDE_DELIVERED,
+                params={'campaign_id': campaign_id, 'tg_ids': tg_ids, 'window_seconds': window.total_seconds()}
             )
         return result.all()
     
     
-    async def get_users_inactive(self, inactive_days: int):        
-        date_limit = datetime.now().date() - timedelta(days=inactive_days)
+    async def record_deliveries(self, campaign_id: int, tg_ids: list[str], window: timedelta):
+        '''
+        Отмечает доставку кампании получателям.
+        
+        :param window: самое длинное окно триггеров кампании, после него запись удаляется
+        '''
+        if not tg_ids:
+            return
         async with self.async_ses() as session:
-            result = await session.execute(
-                text(
-                    '''
-                    SELECT
-                    u.tg_id
-                    FROM users u
-                    JOIN users_statistic us ON us.user_id = u.id
-                    WHERE 
-                        u.tg_id IS NOT NULL
-                        AND
-                        DATE(us.created_at) = (
-                            SELECT MAX(DATE(created_at))
-                            FROM users_statistic us2
-                            WHERE DATE(us2.created_at) < :date_limit
-                        );
-                    '''
-                ),
-                params={'date_limit': date_limit}
+            await session.execute(
+                RECORD_DELIVERIES,
+                params={'campaign_id': campaign_id, 'tg_ids': tg_ids, 'window_seconds': window.total_seconds()}
             )
-        return result.mappings().all()
+            await session.commit()
     
     
-    async def get_users_inactive(self, task_id: int):        
+    async def prune_deliveries(self) -> int:
+        '''Удаляет записи журнала доставок, вышедшие из окон триггеров'''
+        async with self.async_ses() as session:
+            result = await session.execute(PRUNE_DELIVERIES)
+            await session.commit()
+        return result.rowcount
+    
+    
+    async def reserve_deliveries(self, tg_ids: list[str], day: date) -> list[str]:
+        '''
+        Получатели, которым можно отправить сообщение с учетом CAMPAIGN_FREQUENCY_CAP.
+        Для них отправка сразу учитывается в счетчике за day, неудачные возвращаются через release_deliveries
+        '''
+        if CAMPAIGN_FREQUENCY_CAP <= 0 or not tg_ids:
+            return tg_ids
+        async with self.async_ses() as session:
+            await session.execute(FREQUENCY_CAP_LOCK, params={'key': FREQUENCY_CAP_LOCK_KEY})
+            result = await session.scalars(
+                RESERVE_DELIVERIES,
+                params={
+                    'tg_ids': tg_ids,
+                    'day': day,
+                    'window_days': CAMPAIGN_FREQUENCY_WINDOW_DAYS,
+                    'cap': CAMPAIGN_FREQUENCY_CAP,
+                }
+            )
+            allowed = result.all()
+            await session.commit()
+        return allowed
+    
+    
+    async def release_deliveries(self, tg_ids: list[str], day: date):
+        if CAMPAIGN_FREQUENCY_CAP <= 0 or not tg_ids:
+            return
+        async with self.async_ses() as session:
+            await session.execute(RELEASE_DELIVERIES, params={'tg_ids': tg_ids, 'day': day})
+            await session.commit()
+    
+    
+    async def prune_delivery_counters(self) -> int:
+        '''Удаляет счетчики, вышедшие из окна частотного лимита'''
         async with self.async_ses() as session:
             result = await session.execute(
-                text(
-                    '''
-                    WITH users_completed_tasks AS (
-                        SELECT
-                            utc.task_template_id,
-                            utc.user_id, 
-                            COUNT(*) AS user_completed
-                        FROM user_tasks_complete utc 
-                        JOIN tasks_templates tt ON tt.id = utc.task_template_id
-                        GROUP BY utc.task_template_id, utc.user_id
-                    ), 
-                    tasks_count AS (
-                        SELECT 
-                            uct.user_id, 
-                            uct.task_template_id, 
-                            uct.user_completed, 
-                            tt.complete_count
-                        FROM users_completed_tasks uct
-                        JOIN tasks_templates tt ON tt.id = uct.task_template_id
-                    )
-                    SELECT u.tg_id
-                    FROM tasks_count tc
-                    join users u on u.id = tc.user_id
-                    WHERE task_template_id = :task_template_id
-                    AND tc.user_completed < tc.complete_count
-                    and u.tg_id is not null
-                    ;
-                    '''
-                ),
-                params={'task_id': task_id}
+                PRUNE_DELIVERY_COUNTERS,
+                params={'day': date.today(), 'window_days': CAMPAIGN_FREQUENCY_WINDOW_DAYS}
             )
-        return result.mappings().all()
+            await session.commit()
+        return result.rowcount
+    
+    
+    async def revalidate_suppressions(self) -> int:
+        async with self.async_ses() as session:
+            result = await session.execute(REVALIDATE_SUPPRESSIONS, params={'event_type': BOT_STARTED_EVENT})
+            await session.commit()
+        return result.rowcount
     
     
     
\ No newline at end of file
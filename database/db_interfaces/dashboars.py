@@ -1,90 +1,47 @@
 from dataclasses import field, dataclass
-from datetime import date, datetime
+from datetime import date, datetime, time, timedelta
 from typing import Literal, TypedDict
 from xmlrpc.client import DateTime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.functions import user
+from database import task_stats
 from database.db_interface import BaseInterface
 from sqlalchemy import and_, exists, func, select, text
-from database.models import BalanceReasons, TaskTemplate, User, UserBalanceHistory, UserTaskComplete, UsersStatistic
+from database.models import BalanceReasons, TaskTemplate, User, UserBalanceHistory, UsersStatistic
+from database.statements import statements
 from loguru import logger
 
 
-class DailyStats(TypedDict):
-    users:          dict = {}
-    registrations:  dict = {}
-    tasks:          dict = {}
-    tickets:        dict = {}
-
-
-@dataclass
-class GeneralStats:
-    period:         DailyStats
-    prev_period:    DailyStats
-
-
-class DashboardsDBInterface(BaseInterface):
-    def __init__(self, session_):
-        super().__init__(session_ = session_)
-    
-    
-    async def get_giveaways_graph(
-        self,
-        start: datetime | None,
-        end: datetime
-    ):
-        async with self.async_ses() as session:
-            query = f'''
-            with giveaways_participants_subq as (
-            SELECT 
-                distinct(g.id) as giveaway_id,
-                gp.user_id,
-                gp.created_at
-            from giveaways g
-            join giveaways_participant gp on gp.giveaway_id = g.id
-            where gp.created_at <= :end {'and :start <= gp.created_at' if start else ''}
-            )
-            select g.id, g.name, coalesce(count(gps.giveaway_id), 0) as participants_count
-            from giveaways g 
-            left join giveaways_participants_subq gps on g.id = gps.giveaway_id
-            group by gps.giveaway_id, g.id, g.name
-            order by g.id
-            '''
-            params = {'end': end}
-            if start:
-                params['start'] = start
-            result = await session.execute(text(query), params=params)
-            return result.mappings().all()
-    
-    
-    async def get_users_graph(
-        self,
-        start: datetime,
-        end: datetime,
-        preset: Literal['ALL', 'NEW', 'REPEATED']
-    ):
-        match preset:
-            case 'ALL':
-                query_type = 'all_users'
-            case 'NEW':
-                query_type = 'new_users'
-            case 'REPEATED':
-                query_type = 'repeated_users'
-                
-        async with self.async_ses() as session:
-            query = f'''
+# Серия дней периода, общая часть графиков
+DATES_CTE = '''
             WITH dates AS (
                 SELECT generate_series(
-                    DATE '{start}',
-                    DATE '{end}',
+                    CAST(:start_day AS date),
+                    CAST(:end_day AS date),
                     INTERVAL '1 day'
                 )::DATE AS day
-            ),
+            )'''
+
+GIVEAWAYS_GRAPH = statements.register(
+    'dashboards.giveaways_graph',
+    '''
+            select g.id, g.name, coalesce(sum(c.participants_count), 0) as participants_count
+            from giveaways g
+            left join giveaways_participants_counters c
+                on c.giveaway_id = g.id
+                and c.day <= :end
+                and :start <= c.day
+            group by g.id, g.name
+            order by g.id
+    '''
+)
+
+USERS_GRAPH_TEMPLATE = DATES_CTE + ''',
             new_user_ids_subq AS (
                 SELECT us.user_id, DATE(us.created_at) AS day
                 FROM users_statistic us 
                 WHERE type = 'RUN_APP'
-                AND us.created_at BETWEEN '{start}' AND '{end}'
+                AND us.created_at >= :start AND us.created_at < :end
                 GROUP BY us.user_id, day
             ),
             repeated_users_subq AS (
@@ -96,7 +53,7 @@ class DashboardsDBInterface(BaseInterface):
                     FROM users_statistic us
                     WHERE us.user_id = tui.user_id
                     AND us.type = 'RUN_APP'
-                    AND DATE(us.created_at) < ds.day
+                    AND us.created_at < ds.day
                 )
             ),
             repeated_users as (
@@ -126,29 +83,31 @@ class DashboardsDBInterface(BaseInterface):
                 ORDER BY ds.day
             )
             select * from {query_type}
-            '''
-            result = await session.execute(text(query))
-        return result.mappings().all()            
-    
-    
-    async def get_wheel_spins_graph(self, start: datetime, end: datetime):
-        async with self.async_ses() as session:
-            query = f'''
-            WITH dates AS (
-                SELECT generate_series(
-                    DATE '{start}',
-                    DATE '{end}',
-                    INTERVAL '1 day'
-                )::DATE AS day
-            ),
+'''
+# Пресет выбирает итоговый CTE, на каждый - свой запрос с постоянным текстом
+USERS_GRAPHS = {
+    preset: statements.register(
+        f'dashboards.users_graph.{preset.lower()}',
+        USERS_GRAPH_TEMPLATE.format(query_type=query_type)
+    )
+    for preset, query_type in (
+        ('ALL', 'all_users'),
+        ('NEW', 'new_users'),
+        ('REPEATED', 'repeated_users'),
+    )
+}
+
+WHEEL_SPINS_GRAPH = statements.register(
+    'dashboards.wheel_spins_graph',
+    DATES_CTE + ''',
             wheel_spins AS (
                 SELECT
                     DATE(created_at) AS day,
                     ubh.id wheel_spin_id
                 FROM users_balances_history ubh
-                WHERE ubh.reason in ('{BalanceReasons.wheel_spin.value}', '{BalanceReasons.wheel_spin_free.value}')
-                AND created_at >= '{start}'
-                AND created_at <= '{end}'
+                WHERE ubh.reason = ANY(CAST(:reasons AS varchar[]))
+                AND created_at >= :start
+                AND created_at < :end
             )
             SELECT
                 d.day,
@@ -156,35 +115,22 @@ class DashboardsDBInterface(BaseInterface):
             FROM dates d
             LEFT JOIN wheel_spins ws ON ws.day = d.day
             GROUP BY d.day
-            ORDER BY d.day;
-            '''     
-            
-            result = await session.execute(text(query))
-        return result.mappings().all()
-    
-    
-    async def get_referals_graph(
-        self,
-        start: datetime,
-        end: datetime
-    ):
-        async with self.async_ses() as session:
-            query = f'''
-            WITH dates AS (
-                SELECT generate_series(
-                    DATE '{start}',
-                    DATE '{end}',
-                    INTERVAL '1 day'
-                )::DATE AS day
-            ),
+            ORDER BY d.day
+    '''
+)
+WHEEL_SPIN_REASONS = [BalanceReasons.wheel_spin.value, BalanceReasons.wheel_spin_free.value]
+
+REFERALS_GRAPH = statements.register(
+    'dashboards.referals_graph',
+    DATES_CTE + ''',
             referals_data AS (
                 SELECT
                     DATE(created_at) AS day,
                     u.referrer_id 
                 FROM users u
                 WHERE u.referrer_id is not null
-                AND created_at >= '{start}'
-                AND created_at <= '{end}'
+                AND created_at >= :start
+                AND created_at < :end
             )
             SELECT
                 d.day,
@@ -192,9 +138,107 @@ class DashboardsDBInterface(BaseInterface):
             FROM dates d
             LEFT JOIN referals_data r ON r.day = d.day
             GROUP BY d.day
-            ORDER BY d.day;
-            '''
-            result = await session.execute(text(query))
+            ORDER BY d.day
+    '''
+)
+
+TICKETS_GRAPH = statements.register(
+    'dashboards.tickets_graph',
+    DATES_CTE + ''',
+            balance_data AS (
+                SELECT
+                    DATE(created_at) AS day,
+                    SUM(amount) AS total
+                FROM users_balances_history
+                WHERE type = :type
+                AND created_at >= :start
+                AND created_at < :end
+                GROUP BY day
+            )
+            SELECT
+                d.day,
+                COALESCE(SUM(b.total), 0) AS total
+            FROM dates d
+            LEFT JOIN balance_data b ON d.day = b.day
+            GROUP BY d.day
+            ORDER BY d.day
+    '''
+)
+
+
+def period_params(start: datetime, end: datetime) -> dict:
+    '''
+    Параметры графика по дням. Выборка - полуинтервал [начало первого дня, начало дня после последнего):
+    условие по created_at без функций над колонкой, индекс читает только страницы периода.
+    '''
+    start_day, end_day = start.date(), end.date()
+    return {
+        'start': datetime.combine(start_day, time.min),
+        'end': datetime.combine(end_day + timedelta(days=1), time.min),
+        'start_day': start_day,
+        'end_day': end_day,
+    }
+
+
+class DailyStats(TypedDict):
+    users:          dict = {}
+    registrations:  dict = {}
+    tasks:          dict = {}
+    tickets:        dict = {}
+
+
+@dataclass
+class GeneralStats:
+    period:         DailyStats
+    prev_period:    DailyStats
+
+
+class DashboardsDBInterface(BaseInterface):
+    def __init__(self, session_):
+        super().__init__(session_ = session_)
+    
+    
+    async def get_giveaways_graph(
+        self,
+        start: datetime | None,
+        end: datetime
+    ):
+        async with self.async_ses() as session:
+            # Счетчики дневные, поэтому границы периода округляются до дней
+            result = await session.execute(
+                GIVEAWAYS_GRAPH,
+                params={'start': start.date() if start else date.min, 'end': end.date()}
+            )
+            return result.mappings().all()
+    
+    
+    async def get_users_graph(
+        self,
+        start: datetime,
+        end: datetime,
+        preset: Literal['ALL', 'NEW', 'REPEATED']
+    ):
+        async with self.async_ses() as session:
+            result = await session.execute(USERS_GRAPHS[preset], params=period_params(start, end))
+        return result.mappings().all()            
+    
+    
+    async def get_wheel_spins_graph(self, start: datetime, end: datetime):
+        async with self.async_ses() as session:
+            result = await session.execute(
+                WHEEL_SPINS_GRAPH,
+                params={**period_params(start, end), 'reasons': WHEEL_SPIN_REASONS}
+            )
+        return result.mappings().all()
+    
+    
+    async def get_referals_graph(
+        self,
+        start: datetime,
+        end: datetime
+    ):
+        async with self.async_ses() as session:
+            result = await session.execute(REFERALS_GRAPH, params=period_params(start, end))
         return result.mappings().all()
     
     
@@ -205,36 +249,9 @@ class DashboardsDBInterface(BaseInterface):
         preset: Literal['IN', 'OUT']
     ):
         async with self.async_ses() as session:
-            query = f'''
-                WITH dates AS (
-                    SELECT generate_series(
-                        DATE '{start}',
-                        DATE '{end}',
-                        INTERVAL '1 day'
-                    )::DATE AS day
-                ),
-                balance_data AS (
-                    SELECT
-                        DATE(created_at) AS day,
-                        type,
-                        SUM(amount) AS total
-                    FROM users_balances_history
-                    WHERE type = '{preset}'
-                    AND created_at >= '{start}'
-                    AND created_at <= '{end}'
-                    GROUP BY day, type
-                )
-                SELECT
-                    d.day,
-                    COALESCE(SUM(CASE WHEN b.type = '{preset}' THEN b.total END), 0) AS total
-                FROM dates d
-                LEFT JOIN balance_data b ON d.day = b.day
-                GROUP BY d.day
-                ORDER BY d.day;
-            '''
-            
             result = await session.execute(
-                text(query)
+                TICKETS_GRAPH,
+                params={**period_params(start, end), 'type': preset}
             )
             
         return result.mappings().all()
@@ -242,66 +259,16 @@ class DashboardsDBInterface(BaseInterface):
     
     async def get_graph_tasks(self, start: datetime | None, end: datetime):
         async with self.async_ses() as session:
-            query = f'''
-                with users_completed_tasks AS (
-                SELECT
-                    utc.task_template_id,
-                    utc.user_id, 
-                    COUNT(utc.user_id) AS user_completed
-                FROM user_tasks_complete utc 
-                JOIN tasks_templates tt ON tt.id = utc.task_template_id
-                where utc.created_at <= :end {"and utc.created_at >= :start" if start is not None else ''} 
-                GROUP BY utc.task_template_id, utc.user_id
-            ), tasks_count AS (
-                SELECT uct.user_id, uct.task_template_id, uct.user_completed, tt.complete_count
-                FROM users_completed_tasks uct
-                JOIN tasks_templates tt ON tt.id = uct.task_template_id
-            ),
-            fully_completed_tasks as (
-                select 
-                    uct.task_template_id,
-                    count(uct.task_template_id) as fully_completed_tasks
-                from 
-                    tasks_count uct
-                where 
-                    uct.user_completed>=uct.complete_count 
-                group by 
-                    uct.task_template_id 
-            ),
-            started_tasks as (
-                select 
-                    uct.task_template_id,
-                    count(uct.task_template_id) as started_tasks
-                from 
-                    tasks_count uct
-                where 
-                    uct.user_completed<uct.complete_count 
-                group by 
-                    uct.task_template_id 
-            ),
-            tasks as (
-                select 
-                    uct.task_template_id,
-                    count(uct.task_template_id) as started_tasks
-                from 
-                    tasks_count uct
-                group by 
-                    uct.task_template_id 
+            stats = task_stats.tasks_stats(start, end)
+            result = await session.execute(
+                select(
+                    TaskTemplate.id,
+                    TaskTemplate.title,
+                    func.coalesce(stats.c.completed, 0).label('completed'),
+                    func.coalesce(stats.c.started, 0).label('started')
+                )
+                .outerjoin(stats, stats.c.task_template_id == TaskTemplate.id)
             )
-            select
-            tt.id,
-            tt.title,
-            coalesce(fct.fully_completed_tasks, 0) as completed,
-            coalesce(sct.started_tasks, 0) as started
-            from tasks_templates tt
-            left join fully_completed_tasks fct on fct.task_template_id = tt.id 
-            left join started_tasks sct on sct.task_template_id = tt.id;
-            '''
-            
-            params = {'end': end}
-            if start is not None:
-                params['start'] = start 
-            result = await session.execute(text(query), params=params)
         return result.mappings().all()
             
     
@@ -388,55 +355,7 @@ class DashboardsDBInterface(BaseInterface):
 
 
         ############ Задачи
-
-        users_completed_tasks = (
-            select(
-                UserTaskComplete.task_template_id,
-                UserTaskComplete.user_id,
-                func.count(UserTaskComplete.user_id).label("user_completed")
-            )
-            .join(TaskTemplate, TaskTemplate.id == UserTaskComplete.task_template_id)
-            .where(UserTaskComplete.created_at.between(start_date, end_date))
-            .group_by(UserTaskComplete.task_template_id, UserTaskComplete.user_id)
-        ).subquery("users_completed_tasks")
-
-        tasks_count = (
-            select(
-                users_completed_tasks.c.task_template_id,
-                users_completed_tasks.c.user_id,
-                users_completed_tasks.c.user_completed,
-                TaskTemplate.complete_count
-            )
-            .join(TaskTemplate, TaskTemplate.id == users_completed_tasks.c.task_template_id)
-        ).subquery("tasks_count")
-
-        fully_completed_tasks = (
-            select(
-                tasks_count.c.task_template_id,
-                func.count(tasks_count.c.task_template_id).label("fully_completed_tasks")
-            )
-            .where(tasks_count.c.user_completed >= tasks_count.c.complete_count)
-            .group_by(tasks_count.c.task_template_id)
-        ).subquery("fully_completed_tasks")
-
-        started_tasks = (
-            select(
-                tasks_count.c.task_template_id,
-                func.count(tasks_count.c.task_template_id).label("started_tasks")
-            )
-            .where(tasks_count.c.user_completed < tasks_count.c.complete_count)
-            .group_by(tasks_count.c.task_template_id)
-        ).subquery("started_tasks")
-
-        task_stats_stmt = (
-            select(
-                func.sum(func.coalesce(fully_completed_tasks.c.fully_completed_tasks, 0)).label("tasks_completed"),
-                func.sum(func.coalesce(started_tasks.c.started_tasks, 0)).label("tasks_started")
-            )
-            .select_from(TaskTemplate)
-            .outerjoin(fully_completed_tasks, fully_completed_tasks.c.task_template_id == TaskTemplate.id)
-            .outerjoin(started_tasks, started_tasks.c.task_template_id == TaskTemplate.id)
-        ).subquery("task_stats")
+        task_stats_stmt = task_stats.tasks_totals(start_date, end_date).subquery("task_stats")
 
         ########## Финальный выбор
         period = await session.execute(
@@ -4,6 +4,9 @@ from database.exceptions import DocsNotFound
 from database.models import DocAndRule
 from sqlalchemy import select, text, update
 
+from database import ordering
+from database.invalidation import DOCS_TOPIC
+
 
 class DocsSwapDict(TypedDict):
     doc_id:             int
@@ -38,6 +41,7 @@ class DocsDBInterface(BaseInterface):
             
             docs[0].position, docs[1].position = docs[1].position, docs[0].position 
             
+            await self.publish_invalidation(DOCS_TOPIC, session=session)
             await session.commit()
             await session.refresh(docs[0])        
             await session.refresh(docs[1])
@@ -46,16 +50,55 @@ class DocsDBInterface(BaseInterface):
         
     async def delete(self, doc_id: int):
         await self.delete_rows(DocAndRule, id=doc_id)
+        await self.publish_invalidation(DOCS_TOPIC, doc_id)
         
     
     async def update(self, doc_id: int, doc_data: dict):
-        return await self.update_rows(DocAndRule, filter_by={'id': doc_id}, **doc_data)    
+        async with self.async_ses() as session:
+            await self.publish_invalidation(DOCS_TOPIC, doc_id, session=session)
+            return await self.update_rows(DocAndRule, filter_by={'id': doc_id}, session=session, **doc_data)    
         
         
     async def get_count(self):
         return await self.get_rows_count(DocAndRule)
     
     
+    async def move(self, doc_id: int, after_id: int | None) -> DocAndRule:
+        '''Ставит doc_id сразу после after_id, None - в начало'''
+        async with self.async_ses() as session:
+            item = await session.get(DocAndRule, doc_id)
+            if item is None:
+                raise DocsNotFound(message=DocsNotFound.message.format(doc_id=doc_id))
+            if after_id == doc_id:
+                return item
+            
+            if await ordering.move(session, DocAndRule, doc_id, after_id) is None:
+                raise DocsNotFound(message=DocsNotFound.message.format(doc_id=after_id))
+            await self.publish_invalidation(DOCS_TOPIC, doc_id, session=session)
+            await session.commit()
+            await session.refresh(item)
+            return item
+    
+    
+    async def reorder(self, doc_ids: list[int]) -> list[DocAndRule]:
+        '''Расставляет doc_ids в переданном порядке на занимаемые ими позиции одним UPDATE'''
+        async with self.async_ses() as session:
+            updated = await ordering.reorder(session, DocAndRule, doc_ids)
+            if updated != len(doc_ids):
+                existing = set(await session.scalars(select(DocAndRule.id).where(DocAndRule.id.in_(doc_ids))))
+                missing = next(doc_id for doc_id in doc_ids if doc_id not in existing)
+                raise DocsNotFound(message=DocsNotFound.message.format(doc_id=missing))
+            await self.publish_invalidation(DOCS_TOPIC, session=session)
+            await session.commit()
+            return (
+                await session.scalars(
+                    select(DocAndRule)
+                    .where(DocAndRule.id.in_(doc_ids))
+                    .order_by(DocAndRule.position, DocAndRule.id)
+                )
+            ).all()
+    
+    
     async def get_all(
         self,
         page: int,
@@ -71,12 +114,12 @@ class DocsDBInterface(BaseInterface):
         
     async def add(self, doc_data: dict) -> DocAndRule:
         async with self.async_ses() as session:
-            await session.execute(
-                text('UPDATE docs_and_rules SET position = position + 1')
-            )
-            doc = DocAndRule(**doc_data) 
+            # Новый документ встает первым, остальные позиции не сдвигаются
+            doc = DocAndRule(**doc_data, position=ordering.top_position(DocAndRule))
             session.add(doc)
+            await self.publish_invalidation(DOCS_TOPIC, session=session)
             await session.commit()
+            await session.refresh(doc)
             return doc
         
     
@@ -4,6 +4,9 @@ from database.exceptions import FAQNotFound
 from database.models import FAQ
 from sqlalchemy import select, text, update
 
+from database import ordering
+from database.invalidation import FAQ_TOPIC
+
 
 class FAQSwapDict(TypedDict):
     faq_id:             int
@@ -34,6 +37,7 @@ class FAQDBInterface(BaseInterface):
             
             faqs[0].position, faqs[1].position = faqs[1].position, faqs[0].position 
             
+            await self.publish_invalidation(FAQ_TOPIC, session=session)
             await session.commit()
             await session.refresh(faqs[0])        
             await session.refresh(faqs[1])
@@ -42,16 +46,55 @@ class FAQDBInterface(BaseInterface):
         
     async def delete(self, faq_id: int):
         await self.delete_rows(FAQ, id=faq_id)
+        await self.publish_invalidation(FAQ_TOPIC, faq_id)
         
     
     async def update(self, faq_id: int, faq_data: dict):
-        return await self.update_rows(FAQ, filter_by={'id': faq_id}, **faq_data)    
+        async with self.async_ses() as session:
+            await self.publish_invalidation(FAQ_TOPIC, faq_id, session=session)
+            return await self.update_rows(FAQ, filter_by={'id': faq_id}, session=session, **faq_data)    
         
         
     async def get_count(self):
         return await self.get_rows_count(FAQ)
     
     
+    async def move(self, faq_id: int, after_id: int | None) -> FAQ:
+        '''Ставит faq_id сразу после after_id, None - в начало'''
+        async with self.async_ses() as session:
+            item = await session.get(FAQ, faq_id)
+            if item is None:
+                raise FAQNotFound(message=FAQNotFound.message.format(faq_id=faq_id))
+            if after_id == faq_id:
+                return item
+            
+            if await ordering.move(session, FAQ, faq_id, after_id) is None:
+                raise FAQNotFound(message=FAQNotFound.message.format(faq_id=after_id))
+            await self.publish_invalidation(FAQ_TOPIC, faq_id, session=session)
+            await session.commit()
+            await session.refresh(item)
+            return item
+    
+    
+    async def reorder(self, faq_ids: list[int]) -> list[FAQ]:
+        '''Расставляет faq_ids в переданном порядке на занимаемые ими позиции одним UPDATE'''
+        async with self.async_ses() as session:
+            updated = await ordering.reorder(session, FAQ, faq_ids)
+            if updated != len(faq_ids):
+                existing = set(await session.scalars(select(FAQ.id).where(FAQ.id.in_(faq_ids))))
+                missing = next(faq_id for faq_id in faq_ids if faq_id not in existing)
+                raise FAQNotFound(message=FAQNotFound.message.format(faq_id=missing))
+            await self.publish_invalidation(FAQ_TOPIC, session=session)
+            await session.commit()
+            return (
+                await session.scalars(
+                    select(FAQ)
+                    .where(FAQ.id.in_(faq_ids))
+                    .order_by(FAQ.position, FAQ.id)
+                )
+            ).all()
+    
+    
     async def get_all(
         self,
         page: int,
@@ -67,13 +110,13 @@ class FAQDBInterface(BaseInterface):
         
     async def add(self, faq_data: dict) -> FAQ:
         async with self.async_ses() as session:
-            await session.execute(
-                text('UPDATE faq SET position = position + 1')
-            )
-            session.add(
-                FAQ(**faq_data)
-            )
+            # Новый вопрос встает первым, остальные позиции не сдвигаются
+            faq = FAQ(**faq_data, position=ordering.top_position(FAQ))
+            session.add(faq)
+            await self.publish_invalidation(FAQ_TOPIC, session=session)
             await session.commit()
+            await session.refresh(faq)
+            return faq
 
     
     async def swap_faqs(
@@ -4,9 +4,10 @@ from typing import TypedDict
 from loguru import logger
 from sqlalchemy.testing.suite import DateTest
 from database.db_interface import BaseInterface
-from database.exceptions import FAQNotFound
+from database.exceptions import FAQNotFound, GiveawayNotFound
 from database.models import FAQ, Giveaway, GiveawayEnded, GiveawayParticipant, GiveawayPrize
-from sqlalchemy import and_, select, text, update
+from database.statements import naive, statements
+from sqlalchemy import and_, delete, insert, select, text, update
 
 
 class GiveawaysDBInterface(BaseInterface):
@@ -21,16 +22,47 @@ class GiveawaysDBInterface(BaseInterface):
         )
     
     
-    async def add_prizes(self, giveaway_id: int, prizes_data: list[dict]):
-        return await self.add_rows(
-            models=[
-                GiveawayPrize(
-                    giveaway_id=giveaway_id,
-                    **prize_data
+    async def delete_prizes(self, giveaway_id: int, prize_ids: list[int]):
+        async with self.async_ses() as session:
+            await session.execute(
+                delete(GiveawayPrize)
+                .where(
+                    GiveawayPrize.giveaway_id == giveaway_id,
+                    GiveawayPrize.id.in_(prize_ids)
                 )
-                for prize_data in prizes_data
-            ]
-        )
+            )
+            await session.commit()
+    
+    
+    async def add_prizes(self, giveaway_id: int, prizes_data: list[dict]) -> list[GiveawayPrize]:
+        '''Добавляет призы одним INSERT ... RETURNING, порядок совпадает с prizes_data'''
+        if not prizes_data:
+            return []
+        async with self.async_ses() as session:
+            result = await session.scalars(
+                insert(GiveawayPrize)
+                .returning(GiveawayPrize, sort_by_parameter_order=True),
+                [
+                    {'giveaway_id': giveaway_id, **prize_data}
+                    for prize_data in prizes_data
+                ]
+            )
+            prizes = result.all()
+            await session.commit()
+            return prizes
+    
+    
+    async def update_prizes(self, giveaway_id: int, prizes_data: list[dict]):
+        '''Массовое обновление призов по id, в каждом словаре должен быть id'''
+        if not prizes_data:
+            return
+        async with self.async_ses() as session:
+            await session.execute(
+                update(GiveawayPrize)
+                .where(GiveawayPrize.giveaway_id == giveaway_id),
+                prizes_data
+            )
+            await session.commit()
     
     
     async def add_winner(
@@ -62,51 +94,20 @@ class GiveawaysDBInterface(BaseInterface):
         
     ):
         async with self.async_ses() as session:
-            search_query = ''
-            search_query += ":vk_id = u.vk_id " if vk_id else ''
-            search_query += f"{'or' if vk_id   is not None else ''}{' :user_id = gp.user_id '}" if user_id else ''
-            search_query += f"{'or' if user_id or vk_id is not None else ''}{' :tg_id = u.tg_id '}" if tg_id else ''
-            search_query += f"{'or' if  user_id or vk_id or tg_id is not None else ''}{' :email = u.email '}" if email else ''
-            
-            query = f'''
-                select distinct on (gp.user_id)
-                    gp.user_id as id,
-                    u.email,
-                    u.phone,
-                    u.tg_id,
-                    u.vk_id,
-                    ge.prize_id,
-                    gpz.name as prize_name
-                from giveaways_participant gp 
-                left join users u on u.id = gp.user_id
-                left join giveaways_ended ge on ge.giveaway_id = gp.giveaway_id and ge.winner_id = gp.user_id
-                left join giveaways_prizes gpz on gpz.id = ge.prize_id
-                where gp.giveaway_id = :giveaway_id 
-                    {"and :start_date <= gp.created_at" if start_date else ''} {"and gp.created_at <= :end_date" if end_date else ''}
-                    {f'and ({search_query})' if any({user_id, vk_id, tg_id, email}) else ''}
-                offset :offset
-                limit :limit
-            '''
-            
-            logger.debug(query)
-            params = {
-                'giveaway_id': giveaway_id,
-                'offset': (page-1)*per_page,
-                'limit': per_page
-            }
-            if vk_id:
-                params['vk_id'] = vk_id
-            if tg_id:
-                params['tg_id'] = tg_id
-            if user_id:
-                params['user_id'] = user_id
-            if email:
-                params['email'] = email
-            if end_date:
-                params['end_date'] = end_date
-            if start_date:
-                params['start_date'] = start_date
-            result = await session.execute(text(query), params=params)
+            result = await session.execute(
+                PARTICIPANTS,
+                params={
+                    'giveaway_id': giveaway_id,
+                    'start_date': naive(start_date) if start_date else None,
+                    'end_date': naive(end_date) if end_date else None,
+                    'vk_id': vk_id or None,
+                    'tg_id': tg_id or None,
+                    'user_id': user_id or None,
+                    'email': email or None,
+                    'offset': (page-1)*per_page,
+                    'limit': per_page
+                }
+            )
         return result.mappings().all()
     
     
@@ -116,62 +117,7 @@ class GiveawaysDBInterface(BaseInterface):
     
     async def get_history_count(self):
         async with self.async_ses() as session:
-            query = '''
-                with giveaways_participants_count as (
-                    select giveaway_id, count(*) as participants_count
-                    from giveaways_participant
-                    group by giveaway_id
-                ),
-                previous_end_date as (
-                    select
-                        ge1.giveaway_id,
-                        ge1.end_date as start_end_date,
-                        (
-                            select max(ge2.end_date)
-                            from giveaways_ended ge2
-                            where ge2.giveaway_id = ge1.giveaway_id
-                            and ge2.end_date < ge1.end_date
-                        ) as previous_end_date
-                    from giveaways_ended ge1
-                )
-                select count(*) from (select
-                    coalesce(
-                        case
-                            when g.start_date > ge.end_date then
-                                (
-                                    select max(ge2.end_date)
-                                    from giveaways_ended ge2
-                                    where ge2.giveaway_id = g.id
-                                    and ge2.end_date < ge.end_date
-                                )
-                            else g.start_date
-                        end,
-                        null
-                    ) as start_date,
-                    ge.end_date,
-                    g.id as number,
-                    coalesce(participants.participants_count, 0) as participants_count,
-                    g.price,
-                    (coalesce(participants.participants_count, 0) * g.price) as spent_tickets,
-                    json_agg(
-                        json_build_object(
-                            'id', ge.winner_id,
-                            'email', u.email,
-                            'tg_id', u.tg_id,
-                            'phone', u.phone,
-                            'prize_id', ge.giveaway_id,
-                            'prize_name', gp.name
-                        )
-                    ) FILTER (WHERE ge.winner_id IS NOT NULL) as winners
-                from giveaways g
-                left join giveaways_participants_count participants on participants.giveaway_id = g.id
-                left join giveaways_ended ge on g.id = ge.giveaway_id
-                left join users u on ge.winner_id = u.id
-                left join giveaways_prizes gp on gp.id = ge.prize_id
-                group by g.start_date, g.id, ge.end_date, participants.participants_count, g.price
-                ) as subq
-            '''
-            return await session.scalar(text(query))
+            return await session.scalar(HISTORY_COUNT)
             
     
     async def get_participants_count(
@@ -203,71 +149,9 @@ class GiveawaysDBInterface(BaseInterface):
         order_by: str | None,
         order_direction: str | None 
     ):
-        order_by = "order by ge.end_date" if order_by else ''
-        if order_direction:
-            order_by = f"{order_by} {order_direction if order_direction == 'desc' else ''}"
         async with self.async_ses() as session:
             result = await session.execute(
-                text(f'''
-                with giveaways_participants_count as (
-                    select giveaway_id, count(*) as participants_count
-                    from giveaways_participant
-                    group by giveaway_id
-                ),
-                previous_end_date as (
-                    select
-                        ge1.giveaway_id,
-                        ge1.end_date as start_end_date,
-                        (
-                            select max(ge2.end_date)
-                            from giveaways_ended ge2
-                            where ge2.giveaway_id = ge1.giveaway_id
-                            and ge2.end_date < ge1.end_date
-                        ) as previous_end_date
-                    from giveaways_ended ge1
-                )
-                select
-                    g.id,
-                    coalesce(
-                        case
-                            when g.start_date > ge.end_date then
-                                (
-                                    select max(ge2.end_date)
-                                    from giveaways_ended ge2
-                                    where ge2.giveaway_id = g.id
-                                    and ge2.end_date < ge.end_date
-                                )
-                            else g.start_date
-                        end,
-                        null
-                    ) as start_date,
-                    ge.end_date,
-                    g.id as number,
-                    coalesce(participants.participants_count, 0) as participants_count,
-                    g.price,
-                    (coalesce(participants.participants_count, 0) * g.price) as spent_tickets,
-                    json_agg(
-                        json_build_object(
-                            'id', ge.winner_id,
-                            'email', u.email,
-                            'tg_id', u.tg_id,
-                            'vk_id', u.vk_id,
-                            'phone', u.phone,
-                            'prize_id', ge.giveaway_id,
-                            'prize_name', gp.name
-                        )
-                    ) FILTER (WHERE ge.winner_id IS NOT NULL) as winners
-                from giveaways g
-                left join giveaways_participants_count participants on participants.giveaway_id = g.id
-                left join giveaways_ended ge on g.id = ge.giveaway_id
-                left join users u on ge.winner_id = u.id
-                left join giveaways_prizes gp on gp.id = ge.prize_id
-                group by g.start_date, g.id, ge.end_date, participants.participants_count, g.price
-                {order_by}
-                offset :offset
-                limit :limit
-                '''
-                ),
+                HISTORY[(order_by, order_direction == 'desc')],
                 {
                     'offset': (page - 1) * per_page,
                     'limit': per_page
@@ -299,6 +183,73 @@ class GiveawaysDBInterface(BaseInterface):
         )
     
 
+    @staticmethod
+    def _build_giveaways_query(
+        where: str = '',
+        order_by: str = '',
+        with_prizes: bool = False,
+        paginate: bool = True
+    ) -> str:
+        '''
+        Запрос карточек конкурсов. Агрегаты считаются через LATERAL для каждой строки giveaways,
+        поэтому фильтр по g.id (и LIMIT) ограничивает и их: одна карточка читает
+        только счетчики, завершения и призы своего конкурса.
+        '''
+        prizes_column = ",\n                COALESCE(pz.prizes, '[]'::json) AS prizes" if with_prizes else ''
+        prizes_join = '''
+            LEFT JOIN LATERAL (
+                SELECT json_agg(
+                    json_build_object('id', p.id, 'name', p.name, 'position', p.position, 'photo', p.photo)
+                    ORDER BY p.position
+                ) AS prizes
+                FROM giveaways_prizes p
+                WHERE p.giveaway_id = g.id
+            ) pz ON true''' if with_prizes else ''
+
+        return f'''
+            SELECT
+                g.id,
+                g.start_date,
+                g.id AS number,
+                g.period_days,
+                g.name,
+                g.price,
+                g.active,
+                lw.winner_id,
+                COALESCE(participants.participants_count, 0) AS participants_count,
+                (COALESCE(participants.participants_count, 0) * g.price) AS spent_tickets,
+                g.photo{prizes_column}
+            FROM giveaways g
+            LEFT JOIN LATERAL (
+                SELECT SUM(c.new_users_count) AS participants_count
+                FROM giveaways_participants_counters c
+                WHERE c.giveaway_id = g.id
+            ) participants ON true
+            LEFT JOIN LATERAL (
+                SELECT ge.winner_id
+                FROM giveaways_ended ge
+                WHERE ge.giveaway_id = g.id
+                ORDER BY ge.end_date DESC
+                LIMIT 1
+            ) lw ON true{prizes_join}
+            {f'WHERE {where}' if where else ''}
+            {f'ORDER BY {order_by}' if order_by else ''}
+            {'LIMIT :limit OFFSET :offset' if paginate else ''}
+        '''
+
+
+    async def get_one(self, giveaway_id: int) -> dict:
+        '''Карточка конкурса вместе с призами за один запрос'''
+        async with self.async_ses() as session:
+            result = await session.execute(GIVEAWAY_CARD, {'giveaway_id': giveaway_id})
+            row = result.mappings().first()
+            if row is None:
+                raise GiveawayNotFound(
+                    message=GiveawayNotFound.message.format(giveaway_id=giveaway_id)
+                )
+            return dict(row)
+
+
     async def get_all(
         self,
         page: int = 1,
@@ -307,91 +258,18 @@ class GiveawaysDBInterface(BaseInterface):
         order_by: str | None = None,
         order_direction: str | None = None
     ):
-        async with self.async_ses() as session:
-            # Формируем базовый запрос
-            query = '''
-                    WITH giveaways_participants_count AS (
-                        SELECT 
-                            gp.giveaway_id,
-                            COUNT(DISTINCT(gp.user_id)) AS participants_count
-                        FROM giveaways_participant gp
-                        GROUP BY gp.giveaway_id
-                    ),
-                    last_winners AS (
-                        SELECT DISTINCT ON (ge.giveaway_id)
-                            ge.giveaway_id,
-                            ge.winner_id
-                        FROM giveaways_ended ge
-                        ORDER BY ge.giveaway_id, ge.end_date DESC
-                    )
-                    SELECT 
-                        g.id, 
-                        g.start_date,
-                        g.id AS number,
-                        g.period_days,
-                        g.name,
-                        g.price,
-                        g.active,
-                        lw.winner_id,
-                        COALESCE(participants.participants_count, 0) AS participants_count,
-                        (COALESCE(participants.participants_count, 0) * g.price) AS spent_tickets,
-                        g.photo
-                    FROM giveaways g
-                    LEFT JOIN giveaways_participants_count participants ON participants.giveaway_id = g.id
-                    LEFT JOIN last_winners lw ON lw.giveaway_id = g.id
-                    '''
-
-            # Добавляем условие по giveaway_id, если он указан
-            if giveaway_id is not None:
-                query += " WHERE g.id = :giveaway_id"
-            
-            if order_by == 'id':
-                order_by = 'g.id'
-            elif order_by == 'start_date':
-                order_by = 'g.start_date'
-            elif order_by == 'active':
-                order_by = 'g.active'
-            logger.debug(order_by)
-            if order_by:
-                query += f'ORDER BY {order_by} {order_direction if order_direction == 'desc' else ''}'
-            query += f'''
-                LIMIT :limit
-                OFFSET :offset
-            '''
-
-            # Параметры запроса
-            params = {
-                "limit": per_page,
-                "offset": (page - 1) * per_page,
-            }
-
-            # Если giveaway_id указан, добавляем его в параметры
-            if giveaway_id is not None:
-                params["giveaway_id"] = giveaway_id
-
-            # Выполняем запрос
-            result = await session.execute(text(query), params)
+        # Если giveaway_id указан, возвращаем только один элемент + призы
+        if giveaway_id:
+            return await self.get_one(giveaway_id)
 
-            # Если giveaway_id указан, возвращаем только один элемент + призы
-            if giveaway_id:
-                result = dict(result.mappings().first())  
-                # Запрашиваем призы для конкретного конкурса
-                result["prizes"] = [dict(row) for row in (await session.execute(
-                    text(
-                        '''
-                        SELECT id, name, position, photo FROM giveaways_prizes g
-                        WHERE g.giveaway_id = :giveaway_id
-                        ORDER BY g.position
-                        '''
-                    ),
-                    {
-                        "giveaway_id": giveaway_id
-                    }
-                )
-                ).mappings().all()]
-                return result
-            
-            # Если giveaway_id не указан, возвращаем все конкурсы
+        async with self.async_ses() as session:
+            result = await session.execute(
+                GIVEAWAYS_PAGES[(order_by, order_direction == 'desc')],
+                {
+                    "limit": per_page,
+                    "offset": (page - 1) * per_page,
+                }
+            )
             return [dict(row) for row in result.mappings().all()]
         
         
@@ -403,6 +281,127 @@ class GiveawaysDBInterface(BaseInterface):
             limit=per_page,
             order_by='position'
         )
-        
-        
-    
+
+
+PARTICIPANTS = statements.register(
+    'giveaways.participants',
+    '''
+                select distinct on (gp.user_id)
+                    gp.user_id as id,
+                    u.email,
+                    u.phone,
+                    u.tg_id,
+                    u.vk_id,
+                    ge.prize_id,
+                    gpz.name as prize_name
+                from giveaways_participant gp 
+                left join users u on u.id = gp.user_id
+                left join giveaways_ended ge on ge.giveaway_id = gp.giveaway_id and ge.winner_id = gp.user_id
+                left join giveaways_prizes gpz on gpz.id = ge.prize_id
+                where gp.giveaway_id = :giveaway_id 
+                    and (CAST(:start_date AS timestamp) is null or :start_date <= gp.created_at)
+                    and (CAST(:end_date AS timestamp) is null or gp.created_at <= :end_date)
+                    and (
+                        (
+                            CAST(:vk_id AS varchar) is null and CAST(:tg_id AS varchar) is null
+                            and CAST(:user_id AS integer) is null and CAST(:email AS varchar) is null
+                        )
+                        or :vk_id = u.vk_id
+                        or :user_id = gp.user_id
+                        or :tg_id = u.tg_id
+                        or :email = u.email
+                    )
+                offset :offset
+                limit :limit
+    '''
+)
+
+# Одна запись истории = конкурс + дата завершения (или конкурс без завершений)
+HISTORY_COUNT = statements.register(
+    'giveaways.history_count',
+    '''
+                select count(*) from (
+                    select distinct g.id, ge.end_date
+                    from giveaways g
+                    left join giveaways_ended ge on g.id = ge.giveaway_id
+                ) as subq
+    '''
+)
+
+HISTORY_TEMPLATE = '''
+                with giveaways_participants_count as (
+                    select giveaway_id, sum(participants_count) as participants_count
+                    from giveaways_participants_counters
+                    group by giveaway_id
+                )
+                select
+                    g.id,
+                    coalesce(
+                        case
+                            when g.start_date > ge.end_date then
+                                (
+                                    select max(ge2.end_date)
+                                    from giveaways_ended ge2
+                                    where ge2.giveaway_id = g.id
+                                    and ge2.end_date < ge.end_date
+                                )
+                            else g.start_date
+                        end,
+                        null
+                    ) as start_date,
+                    ge.end_date,
+                    g.id as number,
+                    coalesce(participants.participants_count, 0) as participants_count,
+                    g.price,
+                    (coalesce(participants.participants_count, 0) * g.price) as spent_tickets,
+                    json_agg(
+                        json_build_object(
+                            'id', ge.winner_id,
+                            'email', u.email,
+                            'tg_id', u.tg_id,
+                            'vk_id', u.vk_id,
+                            'phone', u.phone,
+                            'prize_id', ge.giveaway_id,
+                            'prize_name', gp.name
+                        )
+                    ) FILTER (WHERE ge.winner_id IS NOT NULL) as winners
+                from giveaways g
+                left join giveaways_participants_count participants on participants.giveaway_id = g.id
+                left join giveaways_ended ge on g.id = ge.giveaway_id
+                left join users u on ge.winner_id = u.id
+                left join giveaways_prizes gp on gp.id = ge.prize_id
+                group by g.start_date, g.id, ge.end_date, participants.participants_count, g.price
+                {order_by}
+                offset :offset
+                limit :limit
+'''
+# (order_by, desc) -> запрос
+HISTORY = {
+    (None, False): statements.register('giveaways.history', HISTORY_TEMPLATE.format(order_by='')),
+    ('end_date', False): statements.register(
+        'giveaways.history.end_date',
+        HISTORY_TEMPLATE.format(order_by='order by ge.end_date')
+    ),
+    ('end_date', True): statements.register(
+        'giveaways.history.end_date_desc',
+        HISTORY_TEMPLATE.format(order_by='order by ge.end_date desc')
+    ),
+}
+HISTORY[(None, True)] = HISTORY[(None, False)]
+
+GIVEAWAY_CARD = statements.register(
+    'giveaways.card',
+    GiveawaysDBInterface._build_giveaways_query(where='g.id = :giveaway_id', with_prizes=True, paginate=False)
+)
+GIVEAWAYS_PAGES = {
+    (order_by, desc_): statements.register(
+        f'giveaways.list.{order_by}{"_desc" if desc_ else ""}',
+        GiveawaysDBInterface._build_giveaways_query(order_by=f'g.{order_by}{" desc" if desc_ else ""}')
+    )
+    for order_by in ('id', 'start_date', 'active')
+    for desc_ in (False, True)
+}
+GIVEAWAYS_PAGES[(None, False)] = GIVEAWAYS_PAGES[(None, True)] = statements.register(
+    'giveaways.list',
+    GiveawaysDBInterface._build_giveaways_query()
+)
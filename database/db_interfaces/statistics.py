@@ -5,7 +5,8 @@ from datetime import timedelta
 
 from sqlalchemy.orm import aliased
 from sqlalchemy.sql.functions import coalesce
-from database.models import FAQ, Giveaway, GiveawayEnded, GiveawayParticipant, TaskTemplate, User, UserBalanceHistory, UserSubscription, UserTaskComplete, UserTaskParticipant, UsersStatistic, datetime
+from database import task_stats
+from database.models import FAQ, Giveaway, GiveawayEnded, GiveawayParticipant, TaskTemplate, User, UserBalanceHistory, UserSubscription, UserTaskParticipant, UserTaskProgress, UsersStatistic, datetime
 from sqlalchemy import Date, and_, asc, cast, desc, distinct, func, select, text
 from database.db_interface import BaseInterface
 from loguru import logger
@@ -68,16 +69,20 @@ class StatisticsDBInterface(BaseInterface):
             user_filters = []
             balance_filters = []
             giveaways_filters = []
+            # Строки по дням берутся из регистраций в периоде, остальные таблицы достаточно читать за этот же период
+            statistic_filters = []
             logger.debug('Мы тут')
             if datetime_start:
                 user_filters.append(User.created_at >= datetime_start)
                 balance_filters.append(UserBalanceHistory.created_at >= datetime_start)
                 giveaways_filters.append(GiveawayParticipant.created_at >= datetime_start)
+                statistic_filters.append(UsersStatistic.created_at >= datetime_start)
             logger.debug('2')
             if datetime_end:
                 user_filters.append(User.created_at < datetime_end)
                 balance_filters.append(UserBalanceHistory.created_at < datetime_end)
                 giveaways_filters.append(GiveawayParticipant.created_at <= datetime_end)
+                statistic_filters.append(UsersStatistic.created_at < datetime_end)
             if giveaway_id is not None:
                 giveaways_filters.append(GiveawayParticipant.giveaway_id==giveaway_id)
             logger.debug('3')
@@ -152,59 +157,22 @@ class StatisticsDBInterface(BaseInterface):
                     func.count(UsersStatistic.id).filter(UsersStatistic.type == 'RUN_APP').label('users_runs'),
                     func.count(UsersStatistic.id).filter(UsersStatistic.type == 'START_BOT').label('users_starts')
                 )
+                .where(*statistic_filters)
                 .group_by(cast(UsersStatistic.created_at, Date))
             ).subquery('us')
             
-            task_filters = []
-            if task_id:
-                task_filters.append(
-                    UserTaskComplete.task_template_id == task_id
-                )
             # Статистика по задачам (по дням)
-            user_tasks_cte = (
-                select(
-                    UserTaskComplete.task_template_id,
-                    UserTaskComplete.user_id,
-                    cast(UserTaskComplete.created_at, Date).label("date"),
-                    func.count(UserTaskComplete.id).label("user_completed")
-                )
-                .where(*task_filters)
-                .group_by(UserTaskComplete.task_template_id, UserTaskComplete.user_id, cast(UserTaskComplete.created_at, Date))
-            ).cte("user_tasks_cte")
-
-            tasks_count_cte = (
-                select(
-                    user_tasks_cte.c.user_id,
-                    user_tasks_cte.c.task_template_id,
-                    user_tasks_cte.c.date,
-                    user_tasks_cte.c.user_completed,
-                    TaskTemplate.complete_count
-                )
-                .select_from(user_tasks_cte)
-                .join(TaskTemplate, TaskTemplate.id == user_tasks_cte.c.task_template_id)
-            ).cte("tasks_count_cte")
-
-            fully_completed_tasks = (
-                select(
-                    tasks_count_cte.c.date,
-                    func.count().label("tasks_completed")
-                )
-                .where(tasks_count_cte.c.user_completed >= tasks_count_cte.c.complete_count)
-                .group_by(tasks_count_cte.c.date)
-            ).cte("fully_completed_tasks")
-
-            started_tasks = (
-                select(
-                    tasks_count_cte.c.date,
-                    func.count().label("tasks_started_partial")
-                )
-                .where(tasks_count_cte.c.user_completed < tasks_count_cte.c.complete_count)
-                .group_by(tasks_count_cte.c.date)
-            ).cte("started_tasks")
+            tasks_by_day = task_stats.tasks_stats_by_day(datetime_start, datetime_end, task_id)
 
-            # opened = назначено, но не начато (нет записей в user_tasks_complete)
+            # opened = назначено, но не начато (нет выполнений)
             utp = aliased(UserTaskParticipant)
-            utc = aliased(UserTaskComplete)
+            opened_filters = [UserTaskProgress.user_id.is_(None)]
+            if datetime_start:
+                opened_filters.append(utp.created_at >= datetime_start)
+            if datetime_end:
+                opened_filters.append(utp.created_at < datetime_end)
+            if task_id:
+                opened_filters.append(utp.task_template_id == task_id)
 
             opened_tasks = (
                 select(
@@ -213,24 +181,24 @@ class StatisticsDBInterface(BaseInterface):
                 )
                 .select_from(utp)
                 .outerjoin(
-                    utc,
+                    UserTaskProgress,
                     and_(
-                        utp.task_template_id == utc.task_template_id,
-                        utp.user_id == utc.user_id
+                        utp.task_template_id == UserTaskProgress.task_template_id,
+                        utp.user_id == UserTaskProgress.user_id
                     )
                 )
-                .where(utc.task_template_id.is_(None))
+                .where(*opened_filters)
                 .group_by(cast(utp.created_at, Date))
             ).cte("opened_tasks")
 
             tasks_stmt = (
                 select(
-                    coalesce(fully_completed_tasks.c.date, started_tasks.c.date, opened_tasks.c.date).label("date"),
-                    coalesce(fully_completed_tasks.c.tasks_completed, 0).label("tasks_completed"),
-                    (coalesce(started_tasks.c.tasks_started_partial, 0) + coalesce(opened_tasks.c.tasks_opened, 0)).label("tasks_started")
+                    coalesce(tasks_by_day.c.date, opened_tasks.c.date).label("date"),
+                    coalesce(tasks_by_day.c.tasks_completed, 0).label("tasks_completed"),
+                    (coalesce(tasks_by_day.c.tasks_started, 0) + coalesce(opened_tasks.c.tasks_opened, 0)).label("tasks_started")
                 )
-                .outerjoin(started_tasks, fully_completed_tasks.c.date == started_tasks.c.date)
-                .outerjoin(opened_tasks, fully_completed_tasks.c.date == opened_tasks.c.date)
+                .select_from(tasks_by_day)
+                .outerjoin(opened_tasks, tasks_by_day.c.date == opened_tasks.c.date, full=True)
             ).subquery("tasks_stmt")
 
             # Prepare subquery for giveaway participants in the specified time range
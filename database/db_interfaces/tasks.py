@@ -1,7 +1,9 @@
+from typing import AsyncIterator
+from database import task_stats
 from database.db_interface import BaseInterface
-from sqlalchemy import text
+from sqlalchemy import RowMapping, Select, func, insert, select
 
-from database.models import Giveaway, TaskTemplate
+from database.models import Giveaway, TaskTemplate, User, UserTaskProgress
 
 
 class TasksDBInterface(BaseInterface):
@@ -36,6 +38,30 @@ class TasksDBInterface(BaseInterface):
         )
     
     
+    async def add_many(self, tasks_data: list[dict], batch_size: int = 1000) -> list[int]:
+        '''
+        Массовое добавление шаблонов: многострочный INSERT ... VALUES ... RETURNING id
+        (по batch_size строк, чтобы не упереться в лимит параметров asyncpg) в одной транзакции.
+        '''
+        if not tasks_data:
+            return []
+        ids = []
+        async with self.async_ses() as session:
+            for offset in range(0, len(tasks_data), batch_size):
+                result = await session.execute(
+                    insert(TaskTemplate)
+                    .values(tasks_data[offset:offset+batch_size])
+                    .returning(TaskTemplate.id)
+                )
+                ids.extend(result.scalars().all())
+            await session.commit()
+        return ids
+    
+    
+    async def get_templates(self) -> list[TaskTemplate]:
+        return await self.get_rows(TaskTemplate)
+    
+    
     async def get_all(
         self,
         page: int,
@@ -46,92 +72,47 @@ class TasksDBInterface(BaseInterface):
         name: str | None = None
     ):
         async with self.async_ses() as session:
-            query = '''
-            with users_completed_tasks AS (
-                    SELECT
-                        utc.task_template_id,
-                        utc.user_id, 
-                        COUNT(utc.user_id) AS user_completed
-                    FROM user_tasks_complete utc 
-                    JOIN tasks_templates tt ON tt.id = utc.task_template_id
-                    GROUP BY utc.task_template_id, utc.user_id
-                ), tasks_count AS (
-                    SELECT uct.user_id, uct.task_template_id, uct.user_completed, tt.complete_count
-                    FROM users_completed_tasks uct
-                    JOIN tasks_templates tt ON tt.id = uct.task_template_id
-                ),
-                fully_completed_tasks as (
-                    select 
-                        uct.task_template_id,
-                        count(uct.task_template_id) as fully_completed_tasks
-                    from 
-                        tasks_count uct
-                    where 
-                        uct.user_completed=uct.complete_count 
-                    group by 
-                        uct.task_template_id 
-                ),
-                started_tasks as (
-                    select 
-                        uct.task_template_id,
-                        count(uct.task_template_id) as started_tasks
-                    from 
-                        tasks_count uct
-                    where 
-                        uct.user_completed<>uct.complete_count 
-                    group by 
-                        uct.task_template_id 
+            stats = task_stats.tasks_stats()
+            query = (
+                select(
+                    TaskTemplate.id,
+                    TaskTemplate.created_at,
+                    TaskTemplate.title,
+                    TaskTemplate.big_descr.label('description'),
+                    TaskTemplate.tickets.label('reward'),
+                    TaskTemplate.active.label('is_active'),
+                    TaskTemplate.gift_giveaway_id.label('giveaway_id'),
+                    TaskTemplate.postback_url,
+                    TaskTemplate.redirect_url,
+                    TaskTemplate.timer_value.label('timer'),
+                    func.coalesce(stats.c.completed, 0).label('completed'),
+                    func.coalesce(stats.c.started, 0).label('started'),
+                    TaskTemplate.check_type,
+                    TaskTemplate.photo
                 )
-                select
-                    tt.id,
-                    tt.created_at,
-                    tt.title,
-                    tt.big_descr as description,
-                    tt.tickets as reward,
-                    tt.active as is_active,
-                    tt.gift_giveaway_id as giveaway_id,
-                    tt.postback_url as postback_url,
-                    tt.redirect_url,
-                    tt.timer_value as timer,
-                    coalesce(fct.fully_completed_tasks, 0) as completed,
-                    coalesce(sct.started_tasks, 0) as started,
-                    tt.check_type,
-                    tt.photo
-                from 
-                    tasks_templates tt
-                left join 
-                    fully_completed_tasks fct 
-                    on 
-                    fct.task_template_id = tt.id 
-                left join 
-                    started_tasks sct 
-                    on 
-                    sct.task_template_id = tt.id
-            '''
+                .outerjoin(stats, stats.c.task_template_id == TaskTemplate.id)
+            )
             
-            params = {'offset': (page-1)*per_page, 'limit': per_page}
             if task_id:
-                query += f' WHERE tt.id = :task_id'
-                params['task_id'] = task_id
+                query = query.where(TaskTemplate.id == task_id)
             elif name:
-                query += f' WHERE tt.title ILIKE :name_pattern'
-                params['name_pattern'] = f"%{name}%"
+                query = query.where(TaskTemplate.title.ilike(f"%{name}%"))
             
             match order_by:
                 case 'task_id':
-                    order_by='tt.id'
+                    order_by_column = TaskTemplate.id
                 case 'status':
-                    order_by='tt.active'
+                    order_by_column = TaskTemplate.active
                 case _:
-                    order_by='tt.id'
-            query += f'    order by {order_by} {'desc' if order_direction == 'desc' else ''}'
-            query += '''
-                offset :offset
-                limit :limit
-            '''
+                    order_by_column = TaskTemplate.id
+            query = (
+                query
+                .order_by(order_by_column.desc() if order_direction == 'desc' else order_by_column.asc())
+                .offset((page-1)*per_page)
+                .limit(per_page)
+            )
             
-            print(query)
-            result = await session.execute(text(query), params)
+            result = await session.execute(query)
             return result.mappings().all()
         
         
@@ -141,37 +122,51 @@ class TasksDBInterface(BaseInterface):
         )
         
     
-    async def get_participants(self, task_id: int):
-        async with self.async_ses() as session:
-            query = '''
-            with task_participants as (
-                select
-                    utc.task_template_id as task_id,
-                    utc.user_id,
-                    count(utc.user_id) completed_tasks
-                from 
-                    user_tasks_complete utc
-                left join users u on u.id = utc.user_id
-                where utc.task_template_id = :task_id
-                group by user_id, utc.task_template_id
+    def _participants_query(self, task_id: int) -> Select:
+        participants = task_stats.task_participants(task_id).subquery('task_participants')
+        return (
+            select(
+                participants,
+                User.email,
+                User.phone,
+                User.username.label('tg_username'),
+                User.tg_id
             )
-            select 
-                tp.*,
-                u.email,
-                u.phone,
-                u.username as tg_username,
-                u.tg_id,
-                (
-                case
-                    when tp.completed_tasks = tt.complete_count then true
-                    else false
-                end
-                ) as completed
-            from task_participants tp
-            join users u on u.id = tp.user_id
-            join tasks_templates tt on tt.id = tp.task_id
-            '''
-            result = await session.execute(
-                text(query), params={'task_id': task_id}
+            .join(User, User.id == participants.c.user_id)
+            .order_by(participants.c.user_id)
+        )
+    
+    
+    async def get_participants(
+        self,
+        task_id: int,
+        after_user_id: int | None = None,
+        limit: int | None = None
+    ):
+        '''Страница участников по ключу: пользователи с user_id > after_user_id'''
+        query = self._participants_query(task_id)
+        if after_user_id is not None:
+            query = query.where(query.selected_columns.user_id > after_user_id)
+        if limit:
+            query = query.limit(limit)
+        async with self.async_ses() as session:
+            result = await session.execute(query)
+            return result.mappings().all()
+    
+    
+    async def get_participants_count(self, task_id: int) -> int:
+        return await self.get_rows_count(
+            UserTaskProgress,
+            task_template_id=task_id
+        )
+    
+    
+    async def stream_participants(self, task_id: int, batch_size: int = 1000) -> AsyncIterator[RowMapping]:
+        '''Участники через серверный курсор, в памяти держится не больше batch_size строк'''
+        async with self.async_ses() as session:
+            result = await session.stream(
+                self._participants_query(task_id)
+                .execution_options(yield_per=batch_size)
             )
-            return result.mappings().all()
\ No newline at end of file
+            async for row in result.mappings():
+                yield row
@@ -1,14 +1,15 @@
 import asyncio
 from datetime import datetime
 import hashlib
-from typing import Literal, TypedDict
+from typing import AsyncIterable, Literal, TypedDict
 from sqlalchemy import and_, case, desc, distinct, exists, func, or_, select, text, update
 from sqlalchemy.orm import aliased
 from database.db_interface import BaseInterface
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
-from database.models import GiveawayParticipant, TaskTemplate, User, UserBalanceHistory, UserSubscription, UserTaskComplete
+from database import task_stats
+from database.models import GiveawayParticipant, User, UserBalanceHistory, UserSubscription
 
 
 class UserData(TypedDict):
@@ -27,6 +28,28 @@ class UserData(TypedDict):
     completed_tasks:    int | None = None 
     deleted:            bool
 
+class UsersImportCounts(TypedDict):
+    total:      int
+    inserted:   int
+    updated:    int
+    conflicted: int
+
+
+# Колонки записей для import_users, row_num - номер строки в исходном файле
+USERS_IMPORT_COLUMNS = (
+    'row_num',
+    'gs_id',
+    'tg_id',
+    'vk_id',
+    'username',
+    'first_name',
+    'last_name',
+    'email',
+    'phone',
+    'created_at',
+)
+
+
 class UsersDBInterface(BaseInterface):
     def __init__(self, session_):
         super().__init__(session_ = session_)
@@ -274,43 +297,8 @@ class UsersDBInterface(BaseInterface):
                 .alias("referals_count_subquery")
             )
 
-            # Подсчёт фактических выполнений задач пользователем
-            user_task_completions_subq = (
-                select(
-                    UserTaskComplete.task_template_id,
-                    UserTaskComplete.user_id,
-                    func.count(UserTaskComplete.user_id).label('user_completed_count')
-                )
-                .join(TaskTemplate, TaskTemplate.id == UserTaskComplete.task_template_id)
-                .group_by(UserTaskComplete.task_template_id, UserTaskComplete.user_id)
-            )
-            
-            # if task_id
-            
-            # Дополняем данными о требуемых выполнениях
-            user_task_completion_with_requirements_subq = (
-                select(
-                    user_task_completions_subq.c.user_id,
-                    user_task_completions_subq.c.task_template_id,
-                    user_task_completions_subq.c.user_completed_count,
-                    TaskTemplate.complete_count
-                )
-                .join(TaskTemplate, TaskTemplate.id == user_task_completions_subq.c.task_template_id)
-                .subquery()
-            )
-
-            # Считаем, сколько тасок реально закрыто полностью у каждого пользователя
-            fully_completed_tasks_by_user_subq = (
-                select(
-                    user_task_completion_with_requirements_subq.c.user_id.label('user_id'),
-                    func.count(user_task_completion_with_requirements_subq.c.user_id).label('completed_tasks')
-                )
-                .where(
-                    user_task_completion_with_requirements_subq.c.user_completed_count == user_task_completion_with_requirements_subq.c.complete_count
-                )
-                .group_by(user_task_completion_with_requirements_subq.c.user_id)
-                .subquery()
-            )
+            # Кол-во полностью выполненных задач
+            fully_completed_tasks_by_user_subq = task_stats.users_completed_tasks()
 
             query = (
                 select(
@@ -468,4 +456,157 @@ class UsersDBInterface(BaseInterface):
                 )
                 for row in rows
             ]
-            
\ No newline at end of file
+            
+    
+    
+    async def import_users(self, records: AsyncIterable[tuple]) -> UsersImportCounts:
+        '''
+        Импорт/слияние пользователей GameSport одним транзакционным проходом:
+            1. записи грузятся COPY во временную таблицу;
+            2. каждая строка сопоставляется с users по gs_id, tg_id, vk_id (хеш-джойны по всей таблице);
+            3. найденные пользователи обновляются одним UPDATE, новые добавляются одним
+               INSERT ... ON CONFLICT DO NOTHING.
+        Конфликтом считается строка, ключи которой повторяются в файле, указывают на разных пользователей
+        или расходятся с уже заполненными ключами пользователя. Такие строки не применяются.
+        Идентификаторы у существующих пользователей только дозаполняются, профиль - перезаписывается.
+        :param records: кортежи в порядке USERS_IMPORT_COLUMNS
+        '''
+        async with self.async_ses() as session:
+            await session.execute(text("""
+                CREATE TEMP TABLE users_import_stage (
+                    row_num     bigint PRIMARY KEY,
+                    gs_id       integer,
+                    tg_id       varchar(255),
+                    vk_id       varchar(255),
+                    username    varchar(255),
+                    first_name  varchar(255),
+                    last_name   varchar(255),
+                    email       varchar,
+                    phone       varchar,
+                    created_at  timestamp
+                ) ON COMMIT DROP
+            """))
+            connection = await session.connection()
+            raw_connection = (await connection.get_raw_connection()).driver_connection
+            await raw_connection.copy_records_to_table(
+                'users_import_stage',
+                records=records,
+                columns=USERS_IMPORT_COLUMNS
+            )
+            await session.execute(text("ANALYZE users_import_stage"))
+            
+            await session.execute(text("""
+                CREATE TEMP TABLE users_import_plan ON COMMIT DROP AS
+                WITH duplicated AS (
+                    SELECT row_num FROM (
+                        SELECT row_num, count(*) OVER (PARTITION BY gs_id) AS n
+                        FROM users_import_stage WHERE gs_id IS NOT NULL
+                    ) d WHERE n > 1
+                    UNION
+                    SELECT row_num FROM (
+                        SELECT row_num, count(*) OVER (PARTITION BY tg_id) AS n
+                        FROM users_import_stage WHERE tg_id IS NOT NULL
+                    ) d WHERE n > 1
+                    UNION
+                    SELECT row_num FROM (
+                        SELECT row_num, count(*) OVER (PARTITION BY vk_id) AS n
+                        FROM users_import_stage WHERE vk_id IS NOT NULL
+                    ) d WHERE n > 1
+                ),
+                matches AS (
+                    SELECT s.row_num, u.id AS user_id
+                    FROM users_import_stage s JOIN users u ON u.gs_id = s.gs_id
+                    UNION
+                    SELECT s.row_num, u.id
+                    FROM users_import_stage s JOIN users u ON u.tg_id = s.tg_id
+                    UNION
+                    SELECT s.row_num, u.id
+                    FROM users_import_stage s JOIN users u ON u.vk_id = s.vk_id
+                ),
+                matched AS (
+                    SELECT row_num, min(user_id) AS user_id, count(*) AS n
+                    FROM matches
+                    GROUP BY row_num
+                )
+                SELECT
+                    s.row_num,
+                    m.user_id,
+                    CASE
+                        WHEN d.row_num IS NOT NULL OR m.n > 1 THEN 'conflict'
+                        WHEN m.user_id IS NULL THEN 'insert'
+                        ELSE 'update'
+                    END AS action
+                FROM users_import_stage s
+                LEFT JOIN matched m ON m.row_num = s.row_num
+                LEFT JOIN duplicated d ON d.row_num = s.row_num
+            """))
+            # Ключи строки расходятся с уже заполненными ключами пользователя
+            await session.execute(text("""
+                UPDATE users_import_plan p
+                SET action = 'conflict'
+                FROM users_import_stage s, users u
+                WHERE p.action = 'update'
+                    AND s.row_num = p.row_num
+                    AND u.id = p.user_id
+                    AND (
+                        s.gs_id <> u.gs_id
+                        OR s.tg_id <> u.tg_id
+                        OR s.vk_id <> u.vk_id
+                    )
+            """))
+            # Несколько строк файла попали в одного пользователя через разные ключи
+            await session.execute(text("""
+                UPDATE users_import_plan
+                SET action = 'conflict'
+                WHERE action = 'update' AND user_id IN (
+                    SELECT user_id FROM users_import_plan
+                    WHERE action = 'update'
+                    GROUP BY user_id
+                    HAVING count(*) > 1
+                )
+            """))
+            
+            updated = await session.execute(text("""
+                UPDATE users u
+                SET
+                    gs_id = COALESCE(u.gs_id, s.gs_id),
+                    tg_id = COALESCE(u.tg_id, s.tg_id),
+                    vk_id = COALESCE(u.vk_id, s.vk_id),
+                    username = COALESCE(s.username, u.username),
+                    first_name = COALESCE(s.first_name, u.first_name),
+                    last_name = COALESCE(s.last_name, u.last_name),
+                    email = COALESCE(s.email, u.email),
+                    phone = COALESCE(s.phone, u.phone),
+                    from_gs = true,
+                    updated_at = LOCALTIMESTAMP
+                FROM users_import_plan p
+                JOIN users_import_stage s ON s.row_num = p.row_num
+                WHERE p.action = 'update' AND u.id = p.user_id
+            """))
+            # Значения по умолчанию моделей User задаются на стороне python, поэтому перечислены явно.
+            # ON CONFLICT без цели ловит tg_id, vk_id и gs_id, занятые параллельными записями
+            inserted = await session.execute(text("""
+                INSERT INTO users (
+                    gs_id, tg_id, vk_id, username, first_name, last_name, email, phone,
+                    from_gs, created_at, updated_at,
+                    is_admin, deleted, confirmed, complete_education, streak, streamname, free_wheels
+                )
+                SELECT
+                    s.gs_id, s.tg_id, s.vk_id, s.username, s.first_name, s.last_name, s.email, s.phone,
+                    true, COALESCE(s.created_at, LOCALTIMESTAMP), LOCALTIMESTAMP,
+                    false, false, false, false, 1, 'default', 0
+                FROM users_import_plan p
+                JOIN users_import_stage s ON s.row_num = p.row_num
+                WHERE p.action = 'insert'
+                ORDER BY s.row_num
+                ON CONFLICT DO NOTHING
+            """))
+            total = await session.scalar(text("SELECT count(*) FROM users_import_stage"))
+            await session.commit()
+        
+        return UsersImportCounts(
+            total=total,
+            inserted=inserted.rowcount,
+            updated=updated.rowcount,
+            conflicted=total - inserted.rowcount - updated.rowcount
+        )
@@ -0,0 +1,380 @@
+'''
+DDL, который не описывается моделями: функции, триггеры и первичное заполнение производных таблиц.
+
+Таблицы giveaways_participant, user_tasks_complete и т.д. заполняет основное приложение,
+поэтому производные данные поддерживаются триггерами на стороне Postgres.
+Все выражения идемпотентны и выполняются в BaseInterface.initial() после create_all,
+в одной транзакции с заполнением - вставки, пришедшие во время заполнения, ждут коммита.
+Производная таблица заполняется по исходной, только если она пуста: дальше ее ведут триггеры.
+Чтобы пересобрать таблицу заново, достаточно очистить ее (TRUNCATE) и перезапустить приложение.
+'''
+from database.ordering import rebalance_sql
+
+
+GIVEAWAYS_PARTICIPANTS_COUNTERS: list[str] = [
+    '''
+    CREATE OR REPLACE FUNCTION giveaways_participants_counters_fn() RETURNS trigger AS $$
+    DECLARE
+        is_new_user         boolean;
+        left_participations integer;
+        user_first_day      date;
+    BEGIN
+        -- UPDATE участия = удаление старой строки + вставка новой
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            UPDATE giveaways_participants_counters
+                SET participants_count = participants_count - 1
+                WHERE giveaway_id = OLD.giveaway_id
+                AND day = COALESCE(OLD.created_at::date, CURRENT_DATE);
+
+            UPDATE giveaways_participants_users
+                SET participations = participations - 1
+                WHERE giveaway_id = OLD.giveaway_id AND user_id = OLD.user_id
+                RETURNING participations, first_day INTO left_participations, user_first_day;
+
+            IF left_participations = 0 THEN
+                DELETE FROM giveaways_participants_users
+                    WHERE giveaway_id = OLD.giveaway_id AND user_id = OLD.user_id;
+                UPDATE giveaways_participants_counters
+                    SET new_users_count = new_users_count - 1
+                    WHERE giveaway_id = OLD.giveaway_id AND day = user_first_day;
+            END IF;
+        END IF;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO giveaways_participants_users AS gpu (giveaway_id, user_id, first_day, participations)
+            VALUES (NEW.giveaway_id, NEW.user_id, COALESCE(NEW.created_at::date, CURRENT_DATE), 1)
+            ON CONFLICT (giveaway_id, user_id) DO UPDATE
+                SET participations = gpu.participations + 1
+            RETURNING (xmax = 0) INTO is_new_user;
+
+            INSERT INTO giveaways_participants_counters AS c (giveaway_id, day, participants_count, new_users_count)
+            VALUES (
+                NEW.giveaway_id,
+                COALESCE(NEW.created_at::date, CURRENT_DATE),
+                1,
+                CASE WHEN is_new_user THEN 1 ELSE 0 END
+            )
+            ON CONFLICT (giveaway_id, day) DO UPDATE
+                SET participants_count = c.participants_count + 1,
+                    new_users_count = c.new_users_count + EXCLUDED.new_users_count;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    'DROP TRIGGER IF EXISTS giveaways_participants_counters_trg ON giveaways_participant',
+    '''
+    CREATE TRIGGER giveaways_participants_counters_trg
+    AFTER INSERT OR DELETE ON giveaways_participant
+    FOR EACH ROW EXECUTE FUNCTION giveaways_participants_counters_fn()
+    ''',
+    'DROP TRIGGER IF EXISTS giveaways_participants_counters_update_trg ON giveaways_participant',
+    # WHEN нельзя указать в общем триггере: у INSERT нет OLD, у DELETE - NEW
+    '''
+    CREATE TRIGGER giveaways_participants_counters_update_trg
+    AFTER UPDATE OF giveaway_id, user_id, created_at ON giveaways_participant
+    FOR EACH ROW
+    WHEN (
+        OLD.giveaway_id IS DISTINCT FROM NEW.giveaway_id
+        OR OLD.user_id IS DISTINCT FROM NEW.user_id
+        OR OLD.created_at::date IS DISTINCT FROM NEW.created_at::date
+    )
+    EXECUTE FUNCTION giveaways_participants_counters_fn()
+    ''',
+    # Первичное заполнение счётчиков по текущим данным, пересобираются обе таблицы вместе:
+    # TRUNCATE giveaways_participants_counters, giveaways_participants_users
+    '''
+    INSERT INTO giveaways_participants_users (giveaway_id, user_id, first_day, participations)
+    SELECT
+        gp.giveaway_id,
+        gp.user_id,
+        MIN(COALESCE(gp.created_at::date, CURRENT_DATE)),
+        COUNT(*)
+    FROM giveaways_participant gp
+    WHERE NOT EXISTS (SELECT 1 FROM giveaways_participants_users)
+    GROUP BY gp.giveaway_id, gp.user_id
+    ''',
+    '''
+    INSERT INTO giveaways_participants_counters (giveaway_id, day, participants_count, new_users_count)
+    SELECT
+        p.giveaway_id,
+        p.day,
+        p.participants_count,
+        COALESCE(n.new_users_count, 0)
+    FROM (
+        SELECT giveaway_id, COALESCE(created_at::date, CURRENT_DATE) AS day, COUNT(*) AS participants_count
+        FROM giveaways_participant
+        GROUP BY 1, 2
+    ) p
+    LEFT JOIN (
+        SELECT giveaway_id, first_day AS day, COUNT(*) AS new_users_count
+        FROM giveaways_participants_users
+        GROUP BY 1, 2
+    ) n USING (giveaway_id, day)
+    WHERE NOT EXISTS (SELECT 1 FROM giveaways_participants_counters)
+    ''',
+]
+
+
+USER_TASKS_PROGRESS_COLUMNS = '''
+    user_id, task_template_id, completed_count, first_completed_at, last_completed_at, completed_at, fully_completed
+'''
+
+
+# Прогресс пользователей по задачам (user_tasks_progress), общий источник для database/task_stats.py
+USER_TASKS_PROGRESS: list[str] = [
+    # Эталонный расчет прогресса по сырым выполнениям, используется при пересчете и первичном заполнении
+    '''
+    CREATE OR REPLACE VIEW user_tasks_progress_source AS
+    SELECT
+        utc.user_id,
+        utc.task_template_id,
+        COUNT(*)::integer AS completed_count,
+        MIN(utc.created_at) AS first_completed_at,
+        MAX(utc.created_at) AS last_completed_at,
+        (array_agg(utc.created_at ORDER BY utc.created_at, utc.id))[GREATEST(COALESCE(tt.complete_count, 1), 1)] AS completed_at,
+        COUNT(*) >= GREATEST(COALESCE(tt.complete_count, 1), 1) AS fully_completed
+    FROM user_tasks_complete utc
+    LEFT JOIN tasks_templates tt ON tt.id = utc.task_template_id
+    WHERE utc.user_id IS NOT NULL AND utc.task_template_id IS NOT NULL
+    GROUP BY utc.user_id, utc.task_template_id, tt.complete_count
+    ''',
+    f'''
+    CREATE OR REPLACE FUNCTION user_tasks_progress_refresh(p_user_id integer, p_task_template_id integer) RETURNS void AS $$
+        DELETE FROM user_tasks_progress
+            WHERE user_id = p_user_id AND task_template_id = p_task_template_id;
+        INSERT INTO user_tasks_progress ({USER_TASKS_PROGRESS_COLUMNS})
+        SELECT {USER_TASKS_PROGRESS_COLUMNS}
+        FROM user_tasks_progress_source
+        WHERE user_id = p_user_id AND task_template_id = p_task_template_id;
+    $$ LANGUAGE sql
+    ''',
+    # Вставка - инкрементально за O(1), удаление и изменение - пересчет одной пары (user_id, task_template_id)
+    '''
+    CREATE OR REPLACE FUNCTION user_tasks_progress_fn() RETURNS trigger AS $$
+    DECLARE
+        required_count integer;
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM user_tasks_progress_refresh(OLD.user_id, OLD.task_template_id);
+        END IF;
+
+        IF TG_OP = 'UPDATE' THEN
+            PERFORM user_tasks_progress_refresh(NEW.user_id, NEW.task_template_id);
+        END IF;
+
+        IF TG_OP <> 'INSERT' OR NEW.user_id IS NULL OR NEW.task_template_id IS NULL THEN
+            RETURN NULL;
+        END IF;
+
+        SELECT GREATEST(COALESCE(complete_count, 1), 1) INTO required_count
+            FROM tasks_templates WHERE id = NEW.task_template_id;
+        required_count := COALESCE(required_count, 1);
+
+        INSERT INTO user_tasks_progress AS p (
+            user_id, task_template_id, completed_count,
+            first_completed_at, last_completed_at, completed_at, fully_completed
+        )
+        VALUES (
+            NEW.user_id, NEW.task_template_id, 1,
+            NEW.created_at, NEW.created_at,
+            CASE WHEN required_count <= 1 THEN NEW.created_at END,
+            required_count <= 1
+        )
+        ON CONFLICT (user_id, task_template_id) DO UPDATE
+            SET completed_count = p.completed_count + 1,
+                first_completed_at = LEAST(p.first_completed_at, EXCLUDED.first_completed_at),
+                last_completed_at = GREATEST(p.last_completed_at, EXCLUDED.last_completed_at),
+                completed_at = CASE
+                    WHEN p.fully_completed THEN p.completed_at
+                    WHEN p.completed_count + 1 >= required_count THEN NEW.created_at
+                END,
+                fully_completed = p.completed_count + 1 >= required_count;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    'DROP TRIGGER IF EXISTS user_tasks_progress_trg ON user_tasks_complete',
+    '''
+    CREATE TRIGGER user_tasks_progress_trg
+    AFTER INSERT OR UPDATE OR DELETE ON user_tasks_complete
+    FOR EACH ROW EXECUTE FUNCTION user_tasks_progress_fn()
+    ''',
+    # Изменение complete_count меняет статус всех пользователей задачи
+    f'''
+    CREATE OR REPLACE FUNCTION user_tasks_progress_template_fn() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM user_tasks_progress WHERE task_template_id = OLD.id;
+        IF TG_OP = 'UPDATE' THEN
+            INSERT INTO user_tasks_progress ({USER_TASKS_PROGRESS_COLUMNS})
+            SELECT {USER_TASKS_PROGRESS_COLUMNS}
+            FROM user_tasks_progress_source
+            WHERE task_template_id = NEW.id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    'DROP TRIGGER IF EXISTS user_tasks_progress_template_trg ON tasks_templates',
+    '''
+    CREATE TRIGGER user_tasks_progress_template_trg
+    AFTER UPDATE OF complete_count ON tasks_templates
+    FOR EACH ROW
+    WHEN (OLD.complete_count IS DISTINCT FROM NEW.complete_count)
+    EXECUTE FUNCTION user_tasks_progress_template_fn()
+    ''',
+    'DROP TRIGGER IF EXISTS user_tasks_progress_template_delete_trg ON tasks_templates',
+    '''
+    CREATE TRIGGER user_tasks_progress_template_delete_trg
+    AFTER DELETE ON tasks_templates
+    FOR EACH ROW EXECUTE FUNCTION user_tasks_progress_template_fn()
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS user_tasks_complete_user_id_task_template_id_idx
+    ON user_tasks_complete (user_id, task_template_id)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS user_tasks_progress_task_template_id_idx
+    ON user_tasks_progress (task_template_id, fully_completed)
+    ''',
+    # Участники задачи страницами по ключу: WHERE task_template_id = ? AND user_id > ? ORDER BY user_id LIMIT n
+    '''
+    CREATE INDEX IF NOT EXISTS user_tasks_progress_task_template_id_user_id_idx
+    ON user_tasks_progress (task_template_id, user_id)
+    ''',
+    'CREATE INDEX IF NOT EXISTS user_tasks_progress_completed_at_idx ON user_tasks_progress (completed_at)',
+    'CREATE INDEX IF NOT EXISTS user_tasks_progress_first_completed_at_idx ON user_tasks_progress (first_completed_at)',
+    # Первичное заполнение по текущим данным
+    f'''
+    INSERT INTO user_tasks_progress ({USER_TASKS_PROGRESS_COLUMNS})
+    SELECT {USER_TASKS_PROGRESS_COLUMNS} FROM user_tasks_progress_source
+    WHERE NOT EXISTS (SELECT 1 FROM user_tasks_progress)
+    ''',
+]
+
+
+# Последняя активность пользователей (users_last_seen) для аудиторий "не заходил N дней"
+USERS_LAST_SEEN: list[str] = [
+    '''
+    CREATE OR REPLACE FUNCTION users_last_seen_fn() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO users_last_seen AS s (user_id, last_seen_at)
+        VALUES (NEW.user_id, NEW.created_at)
+        ON CONFLICT (user_id) DO UPDATE
+            SET last_seen_at = EXCLUDED.last_seen_at
+            WHERE s.last_seen_at < EXCLUDED.last_seen_at;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    # События не удаляются и не меняются, поэтому достаточно вставки
+    'DROP TRIGGER IF EXISTS users_last_seen_trg ON users_statistic',
+    '''
+    CREATE TRIGGER users_last_seen_trg
+    AFTER INSERT ON users_statistic
+    FOR EACH ROW EXECUTE FUNCTION users_last_seen_fn()
+    ''',
+    # Первичное заполнение по текущим данным
+    '''
+    INSERT INTO users_last_seen (user_id, last_seen_at)
+    SELECT user_id, MAX(created_at)
+    FROM users_statistic
+    WHERE NOT EXISTS (SELECT 1 FROM users_last_seen)
+    GROUP BY user_id
+    ''',
+]
+
+
+# Индексы под LATERAL-подзапросы карточек конкурсов (GiveawaysDBInterface._build_giveaways_query)
+GIVEAWAYS_INDEXES: list[str] = [
+    '''
+    CREATE INDEX IF NOT EXISTS giveaways_ended_giveaway_id_end_date_idx
+    ON giveaways_ended (giveaway_id, end_date DESC)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS giveaways_prizes_giveaway_id_position_idx
+    ON giveaways_prizes (giveaway_id, position)
+    ''',
+]
+
+
+# Ключ gs_id для импорта пользователей из GameSport (UsersDBInterface.import_users).
+# Уникальный индекс создается, только если в таблице нет дублей gs_id, иначе - обычный,
+# чтобы старт приложения не падал на существующих данных.
+USERS_IMPORT_INDEXES: list[str] = [
+    '''
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM users WHERE gs_id IS NOT NULL GROUP BY gs_id HAVING count(*) > 1
+        ) THEN
+            CREATE UNIQUE INDEX IF NOT EXISTS users_gs_id_key ON users (gs_id) WHERE gs_id IS NOT NULL;
+        ELSE
+            RAISE WARNING 'users.gs_id has duplicates, unique index users_gs_id_key is not created';
+            CREATE INDEX IF NOT EXISTS users_gs_id_idx ON users (gs_id);
+        END IF;
+    END
+    $$
+    ''',
+]
+
+
+# Графики и статистика по дням фильтруют created_at полуинтервалом [начало, конец) без функций над колонкой.
+# Журналы событий пишутся только в конец, created_at растет вместе с физическим порядком строк,
+# поэтому BRIN (десятки килобайт на миллионы строк) сводит выборку периода к страницам этого периода.
+# users может загружаться импортом с прошлыми датами - для нее обычный btree.
+DAY_RANGE_INDEXES: list[str] = [
+    'CREATE INDEX IF NOT EXISTS users_statistic_created_at_brin ON users_statistic USING brin (created_at)',
+    'CREATE INDEX IF NOT EXISTS users_balances_history_created_at_brin ON users_balances_history USING brin (created_at)',
+    'CREATE INDEX IF NOT EXISTS giveaways_participant_created_at_brin ON giveaways_participant USING brin (created_at)',
+    'CREATE INDEX IF NOT EXISTS user_tasks_participants_created_at_brin ON user_tasks_participants USING brin (created_at)',
+    'CREATE INDEX IF NOT EXISTS users_created_at_idx ON users (created_at)',
+    # "Был ли запуск раньше" для повторных пользователей - проба по одному пользователю
+    '''
+    CREATE INDEX IF NOT EXISTS users_statistic_user_id_type_created_at_idx
+    ON users_statistic (user_id, type, created_at)
+    ''',
+]
+
+
+# Аудитория "не забрал ежедневную награду" (CampaignsDBInterface.get_evryday_reward_users_pool):
+# начисления за день по причине читаются только из индекса
+CAMPAIGNS_AUDIENCE_INDEXES: list[str] = [
+    'CREATE INDEX IF NOT EXISTS campaigns_deliveries_expires_at_idx ON campaigns_deliveries (expires_at)',
+    '''
+    CREATE INDEX IF NOT EXISTS users_balances_history_reason_created_at_user_id_idx
+    ON users_balances_history (reason, created_at, user_id)
+    ''',
+    # "Ни разу не участвовал в конкурсах" - ключ (giveaway_id, user_id) по user_id не ищет
+    '''
+    CREATE INDEX IF NOT EXISTS giveaways_participants_users_user_id_idx
+    ON giveaways_participants_users (user_id)
+    ''',
+]
+
+
+# Колонки, добавленные в существующие таблицы: create_all их не создает
+ADDED_COLUMNS: list[str] = [
+    'ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS photo_file_id varchar',
+]
+
+
+# FAQ и документы упорядочены с промежутками (database/ordering.py):
+# старые позиции 1..n раскладываются один раз, дальше - только если кончилось место
+POSITIONS_REBALANCE: list[str] = [
+    rebalance_sql('faq'),
+    rebalance_sql('docs_and_rules'),
+]
+
+
+DDL_STATEMENTS: list[str] = [
+    *ADDED_COLUMNS,
+    *GIVEAWAYS_PARTICIPANTS_COUNTERS,
+    *GIVEAWAYS_INDEXES,
+    *USER_TASKS_PROGRESS,
+    *USERS_LAST_SEEN,
+    *USERS_IMPORT_INDEXES,
+    *DAY_RANGE_INDEXES,
+    *CAMPAIGNS_AUDIENCE_INDEXES,
+    *POSITIONS_REBALANCE,
+]
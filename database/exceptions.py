@@ -28,9 +28,14 @@ class FAQNotFound(CustomDBExceptions):
     
 @dataclass
 class DocsNotFound(CustomDBExceptions):
-    message: str = 'Docs (id={faq_id}) not found'
+    message: str = 'Docs (id={doc_id}) not found'
     
 
+@dataclass
+class GiveawayNotFound(CustomDBExceptions):
+    message: str = 'Giveaway (id={giveaway_id}) not found'
+
+
 @dataclass
 class UserNotFound(CustomDBExceptions):
     message: str = "User not found"   
@@ -43,4 +48,9 @@ class ForeignKeyError(CustomDBExceptions):
 
 @dataclass
 class CampaignNotFoundException(CustomDBExceptions):
-    message: str
\ No newline at end of file
+    message: str
+    
+    
+@dataclass
+class CampaignTriggerParamsError(CustomDBExceptions):
+    message: str
@@ -0,0 +1,117 @@
+'''
+Шина инвалидации кешей между воркерами через Postgres LISTEN/NOTIFY.
+
+Запись в DB-интерфейсе публикует (topic, key) через pg_notify в своей транзакции, поэтому
+уведомление уходит только после commit. Каждый воркер держит отдельное asyncpg соединение
+с LISTEN и вызывает обработчики, подписанные на topic (например, сброс content_cache).
+Свои уведомления воркер пропускает - локальный кеш сбрасывается сразу после записи.
+После переподключения вызываются обработчики всех топиков: уведомления за время обрыва потеряны.
+'''
+import asyncio
+from collections import defaultdict
+import json
+from typing import Callable
+from uuid import uuid4
+
+import asyncpg
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import DB_URL
+
+
+CHANNEL = 'cache_invalidation'
+RECONNECT_DELAY = 5
+
+FAQ_TOPIC = 'faq'
+DOCS_TOPIC = 'docs'
+
+
+def to_asyncpg_dsn(db_url: str) -> str:
+    '''postgresql+asyncpg://... -> postgresql://...'''
+    return db_url.replace('+asyncpg', '', 1)
+
+
+class InvalidationBus:
+    def __init__(self, db_url: str, channel: str = CHANNEL):
+        self.dsn = to_asyncpg_dsn(db_url) if db_url else None
+        self.channel = channel
+        self.origin = uuid4().hex
+        self._handlers: defaultdict[str, list[Callable[[str | None], None]]] = defaultdict(list)
+        self._connection: asyncpg.Connection | None = None
+        self._task: asyncio.Task | None = None
+
+
+    def subscribe(self, topic: str, handler: Callable[[str | None], None]):
+        self._handlers[topic].append(handler)
+
+
+    def dispatch(self, topic: str, key: str | None = None):
+        for handler in self._handlers.get(topic, ()):
+            try:
+                handler(key)
+            except Exception as ex:
+                logger.exception(f'Invalidation handler for {topic} failed: {ex}')
+
+
+    async def publish(self, session: AsyncSession, topic: str, key: str | int | None = None):
+        '''Уведомление уйдет другим воркерам после commit сессии'''
+        await session.execute(
+            text('SELECT pg_notify(:channel, :payload)'),
+            {
+                'channel': self.channel,
+                'payload': json.dumps({'origin': self.origin, 'topic': topic, 'key': key}),
+            }
+        )
+
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning(f'Bad invalidation payload: {payload!r}')
+            return
+        if message.get('origin') == self.origin:
+            return
+        self.dispatch(message.get('topic'), message.get('key'))
+
+
+    async def _listen(self):
+        while True:
+            try:
+                closed = asyncio.Event()
+                self._connection = await asyncpg.connect(self.dsn)
+                self._connection.add_termination_listener(lambda connection: closed.set())
+                await self._connection.add_listener(self.channel, self._on_notification)
+                logger.info(f'Listening for cache invalidation on {self.channel}')
+                for topic in list(self._handlers):
+                    self.dispatch(topic)
+                await closed.wait()
+                logger.warning('Cache invalidation connection closed, reconnecting')
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                logger.warning(f'Cache invalidation listener failed: {ex}, retry in {RECONNECT_DELAY}s')
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+    async def start(self):
+        if self._task is None and self.dsn:
+            self._task = asyncio.create_task(self._listen())
+
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.close()
+        self._connection = None
+
+
+invalidation_bus = InvalidationBus(DB_URL)
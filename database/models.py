@@ -1,10 +1,10 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from enum import Enum
 import os
 from typing import Any, Literal
 
-from sqlalchemy import CheckConstraint, ForeignKey, Interval, String, DateTime, Boolean, Integer, Float, True_, text as text_
-from sqlalchemy.dialects.postgresql import BYTEA, JSONB
+from sqlalchemy import CheckConstraint, Date, ForeignKey, Interval, String, DateTime, Boolean, Integer, Float, True_, text as text_
+from sqlalchemy.dialects.postgresql import ARRAY, BYTEA, JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 from config import DATE_FORMAT
@@ -54,6 +54,7 @@ class TaskTemplate(Base):
     postback_url: Mapped[str|None] = mapped_column(String, nullable=True)
     timer_value: Mapped[timedelta] = mapped_column(Interval, nullable=True)
     gift_giveaway_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
 
     def get_data(self, complete_count=None):
         data = {
@@ -342,6 +343,30 @@ class GiveawayParticipant(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime)
 
 
+class GiveawayParticipantsCounter(Base):
+    '''
+    Счётчики участий в конкурсе по дням. Поддерживаются триггером на giveaways_participant (см. database/ddl.py)
+    '''
+    __tablename__ = 'giveaways_participants_counters'
+
+    giveaway_id:        Mapped[int] = mapped_column(Integer, primary_key=True)
+    day:                Mapped[date] = mapped_column(Date, primary_key=True)
+    participants_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    new_users_count:    Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class GiveawayParticipantUser(Base):
+    '''
+    Уникальные участники конкурса. По first_day считается new_users_count в giveaways_participants_counters
+    '''
+    __tablename__ = 'giveaways_participants_users'
+
+    giveaway_id:        Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id:            Mapped[int] = mapped_column(Integer, primary_key=True)
+    first_day:          Mapped[date] = mapped_column(Date, nullable=False)
+    participations:     Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
 class GiveawayEnded(Base):
     __tablename__ = 'giveaways_ended'
 
@@ -473,6 +498,16 @@ class UsersStatistic(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
 
 
+class UserLastSeen(Base):
+    '''
+    Последняя активность пользователя. Поддерживается триггером на users_statistic (см. database/ddl.py)
+    '''
+    __tablename__ = 'users_last_seen'
+
+    user_id:        Mapped[int] = mapped_column(Integer, primary_key=True)
+    last_seen_at:   Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+
 class UserTaskComplete(Base):
     __tablename__ = 'user_tasks_complete'
 
@@ -480,6 +515,23 @@ class UserTaskComplete(Base):
     user_id: Mapped[int] = mapped_column(Integer)
     task_template_id: Mapped[int] = mapped_column(Integer)
     created_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class UserTaskProgress(Base):
+    '''
+    Прогресс пользователя по задаче. Поддерживается триггерами на user_tasks_complete и tasks_templates (см. database/ddl.py).
+    Задача выполнена полностью, когда completed_count >= tasks_templates.complete_count (NULL считается как 1),
+    completed_at - время выполнения, которое довело счетчик до complete_count
+    '''
+    __tablename__ = 'user_tasks_progress'
+
+    user_id:            Mapped[int] = mapped_column(Integer, primary_key=True)
+    task_template_id:   Mapped[int] = mapped_column(Integer, primary_key=True)
+    completed_count:    Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    first_completed_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    last_completed_at:  Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    completed_at:       Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    fully_completed:    Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     
     
 class BalanceReasons(str, Enum):
@@ -516,6 +568,8 @@ class Campaign(Base):
     created_at:         Mapped[datetime] = mapped_column(DateTime, nullable=True, server_default=text_("TIMEZONE('UTC', CURRENT_TIMESTAMP)"))
     is_active:          Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
     photo:              Mapped[str] = mapped_column(String, nullable=True)
+    # file_id фото в Telegram после первой отправки, сбрасывается при смене photo
+    photo_file_id:      Mapped[str] = mapped_column(String, nullable=True)
     
     # Связь с рассылками через промежуточную таблицу campaigns_triggers_link
     triggers: Mapped[list["CampaignTrigger"]] = relationship(
@@ -549,6 +603,52 @@ class CampaignTriggerLink(Base):
     trigger_params: Mapped[dict] = mapped_column(JSONB, nullable=True)
     
 
+class CampaignSuppression(Base):
+    '''Получатели, которым рассылка не доставляется: бот заблокирован, чат не найден'''
+    __tablename__ = 'campaigns_suppressions'
+    
+    tg_id:          Mapped[str] = mapped_column(String, primary_key=True)
+    reason:         Mapped[str] = mapped_column(String, nullable=False)
+    # Сколько раз подряд доставка не удалась, от него растет интервал перепроверки
+    attempts:       Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    # Время подавления и перепроверки - UTC, как created_at событий
+    suppressed_at:  Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # До этого момента получатель исключен из аудиторий, после - одна попытка отправки
+    revalidate_at:  Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    
+
+class CampaignDeliveryCounter(Base):
+    '''Сообщения кампаний, отправленные получателю за день. По ним проверяется частотный лимит'''
+    __tablename__ = 'campaigns_delivery_counters'
+    
+    tg_id:  Mapped[str] = mapped_column(String, primary_key=True)
+    day:    Mapped[date] = mapped_column(Date, primary_key=True)
+    sent:   Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    
+
+class CampaignDelivery(Base):
+    '''Последняя доставка триггерной кампании получателю, по ней повторные запуски не шлют сообщение снова'''
+    __tablename__ = 'campaigns_deliveries'
+    
+    campaign_id:    Mapped[int] = mapped_column(Integer, ForeignKey("campaigns.id", ondelete='CASCADE'), primary_key=True)
+    tg_id:          Mapped[str] = mapped_column(String, primary_key=True)
+    sent_at:        Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # После этого момента запись не нужна ни одному окну триггеров кампании
+    expires_at:     Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    
+
+class CampaignAudienceSnapshot(Base):
+    '''Аудитория триггера кампании на момент created_at (см. CampaignsDBInterface.get_audience)'''
+    __tablename__ = 'campaigns_audience_snapshots'
+    
+    # День, id триггера и его параметры
+    key:            Mapped[str] = mapped_column(String, primary_key=True)
+    trigger_id:     Mapped[int] = mapped_column(Integer, nullable=False)
+    tg_ids:         Mapped[list[str]] = mapped_column(ARRAY(String), nullable=False)
+    size:           Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at:     Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    
+
 class DocAndRule(Base):
     __tablename__ = 'docs_and_rules'
     
@@ -0,0 +1,119 @@
+'''
+Порядок FAQ и документов по position с промежутками.
+
+Позиции идут с шагом POSITION_GAP, поэтому:
+    добавление в начало - одна строка с позицией min(position) - POSITION_GAP;
+    перемещение - одна строка с позицией посередине между соседями;
+    переупорядочивание по списку id - один UPDATE по этим строкам.
+Когда между соседями не остается места, позиции таблицы раскладываются заново (rebalance_sql),
+это случается только после многих перемещений в одно и то же место.
+'''
+from sqlalchemy import ScalarSelect, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import FAQ, DocAndRule
+
+
+POSITION_GAP = 1024
+
+
+def rebalance_sql(table: str, force: bool = False) -> str:
+    '''
+    Раскладывает позиции таблицы с шагом POSITION_GAP, сохраняя порядок.
+    Без force - только если где-то между соседями не осталось места.
+    '''
+    condition = '' if force else f'''
+        AND EXISTS (
+            SELECT 1 FROM (
+                SELECT position - lag(position) OVER (ORDER BY position, id) AS gap FROM {table}
+            ) gaps
+            WHERE gaps.gap < 2
+        )'''
+    return f'''
+        UPDATE {table} t
+        SET position = ordered.rn * {POSITION_GAP}
+        FROM (
+            SELECT id, row_number() OVER (ORDER BY position, id) AS rn FROM {table}
+        ) ordered
+        WHERE t.id = ordered.id{condition}
+    '''
+
+
+def top_position(model: type[FAQ] | type[DocAndRule]) -> ScalarSelect:
+    '''Позиция перед первым элементом'''
+    return (
+        select(func.coalesce(func.min(model.position), POSITION_GAP) - POSITION_GAP)
+        .scalar_subquery()
+    )
+
+
+async def move(
+    session: AsyncSession,
+    model: type[FAQ] | type[DocAndRule],
+    item_id: int,
+    after_id: int | None
+) -> int | None:
+    '''
+    Ставит item_id сразу после after_id (None - в начало), меняется одна строка.
+    :return: новая позиция или None, если item_id или after_id не найден
+    '''
+    for _ in range(2):
+        others = model.id != item_id
+        if after_id is None:
+            prev_position = None
+        else:
+            prev_position = await session.scalar(select(model.position).where(model.id == after_id))
+            if prev_position is None:
+                return None
+        next_query = select(func.min(model.position)).where(others)
+        if prev_position is not None:
+            next_query = next_query.where(model.position > prev_position)
+        next_position = await session.scalar(next_query)
+
+        if prev_position is None:
+            new_position = (next_position if next_position is not None else POSITION_GAP) - POSITION_GAP
+        elif next_position is None:
+            new_position = prev_position + POSITION_GAP
+        elif next_position - prev_position >= 2:
+            new_position = (prev_position + next_position) // 2
+        else:
+            await session.execute(text(rebalance_sql(model.__tablename__, force=True)))
+            continue
+
+        result = await session.execute(
+            update(model)
+            .where(model.id == item_id)
+            .values(position=new_position)
+        )
+        return new_position if result.rowcount else None
+
+
+async def reorder(
+    session: AsyncSession,
+    model: type[FAQ] | type[DocAndRule],
+    ids: list[int]
+) -> int:
+    '''
+    Одним UPDATE расставляет ids в переданном порядке на позиции, которые они занимают сейчас.
+    Подходит и для всего списка, и для одной страницы: остальные элементы не трогаются.
+    :return: кол-во обновленных строк, меньше len(ids) - часть id не найдена
+    '''
+    result = await session.execute(
+        text(f'''
+            WITH new_order AS (
+                SELECT id, ord FROM unnest(CAST(:ids AS integer[])) WITH ORDINALITY AS o(id, ord)
+            ),
+            slots AS (
+                SELECT position, row_number() OVER (ORDER BY position, id) AS ord
+                FROM {model.__tablename__}
+                WHERE id = ANY(CAST(:ids AS integer[]))
+            )
+            UPDATE {model.__tablename__} t
+            SET position = slots.position
+            FROM new_order
+            JOIN slots ON slots.ord = new_order.ord
+            WHERE t.id = new_order.id
+        '''),
+        {'ids': ids}
+    )
+    return result.rowcount
@@ -0,0 +1,82 @@
+'''
+Реестр именованных SQL-запросов, написанных вручную (графики дашборда, конкурсы, кампании).
+
+Каждый запрос регистрируется один раз при импорте модуля интерфейса: текст постоянный,
+все значения - bind-параметры. Поэтому на соединении asyncpg запрос подготавливается один раз
+(кеш prepared statements диалекта), а Postgres может переиспользовать план.
+Варианты запроса (сортировка, набор колонок) - отдельные имена, собранные из констант,
+а не склейка строк по входным данным.
+
+statements.stats() - по каждому имени число выполнений и попаданий в кеш prepared statements
+соединения, на котором запрос выполнялся.
+'''
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+from sqlalchemy import TextClause, event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+@dataclass
+class StatementStats:
+    executions: int = 0
+    prepared_hits: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.prepared_hits / self.executions if self.executions else 0.0
+
+
+class StatementRegistry:
+    def __init__(self):
+        self._statements: dict[str, TextClause] = {}
+        self._stats: dict[str, StatementStats] = {}
+
+
+    def register(self, name: str, sql: str) -> TextClause:
+        if name in self._statements:
+            raise ValueError(f'Statement {name!r} is already registered')
+        statement = text(sql).execution_options(statement_name=name)
+        self._statements[name] = statement
+        self._stats[name] = StatementStats()
+        return statement
+
+
+    def __getitem__(self, name: str) -> TextClause:
+        return self._statements[name]
+
+
+    def instrument(self, engine: AsyncEngine):
+        '''Считает попадания в кеш prepared statements для запросов из реестра'''
+        if not event.contains(engine.sync_engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(engine.sync_engine, 'before_cursor_execute', self._before_cursor_execute)
+
+
+    def _before_cursor_execute(self, connection, cursor, statement, parameters, context, executemany):
+        name = context.execution_options.get('statement_name') if context is not None else None
+        stats = self._stats.get(name)
+        if stats is None:
+            return
+        stats.executions += 1
+        # Кеш адаптера asyncpg в SQLAlchemy, ключ - текст запроса
+        cache = getattr(connection.connection.dbapi_connection, '_prepared_statement_cache', None)
+        if cache is not None and statement in cache:
+            stats.prepared_hits += 1
+
+
+    def stats(self) -> dict[str, dict]:
+        return {
+            name: {**asdict(stats), 'hit_rate': round(stats.hit_rate, 4)}
+            for name, stats in self._stats.items()
+        }
+
+
+def naive(value: datetime) -> datetime:
+    '''
+    Колонки timestamp без зоны. Раньше значения подставлялись строкой и Postgres отбрасывал зону,
+    asyncpg такое значение не примет - зона отбрасывается здесь же.
+    '''
+    return value.replace(tzinfo=None)
+
+
+statements = StatementRegistry()
@@ -0,0 +1,165 @@
+'''
+Общие запросы статистики задач поверх user_tasks_progress.
+
+Задача считается выполненной, когда пользователь набрал complete_count выполнений (>=),
+начатой - когда выполнения есть, но задача не доведена до конца.
+Для периода [start, end]:
+    completed - задача доведена до конца внутри периода (completed_at);
+    started   - первое выполнение внутри периода, а к концу периода задача не выполнена.
+Используется в задачах, дашбордах, статистике, пользователях и рассылках.
+'''
+from datetime import datetime
+
+from sqlalchemy import ColumnElement, Date, Select, Subquery, and_, cast, func, literal_column, not_, or_, select, union_all
+
+from database.models import UserTaskProgress
+
+
+def _in_period(column, start: datetime | None, end: datetime | None) -> list[ColumnElement]:
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column <= end)
+    return conditions
+
+
+def completed_condition(start: datetime | None = None, end: datetime | None = None) -> ColumnElement[bool]:
+    return and_(
+        UserTaskProgress.fully_completed.is_(True),
+        *_in_period(UserTaskProgress.completed_at, start, end)
+    )
+
+
+def started_condition(start: datetime | None = None, end: datetime | None = None) -> ColumnElement[bool]:
+    if start is None and end is None:
+        return UserTaskProgress.fully_completed.is_(False)
+    return and_(
+        *_in_period(UserTaskProgress.first_completed_at, start, end),
+        not_(
+            and_(
+                UserTaskProgress.fully_completed.is_(True),
+                *_in_period(UserTaskProgress.completed_at, None, end)
+            )
+        )
+    )
+
+
+def tasks_stats(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    task_id: int | None = None
+) -> Subquery:
+    '''Колонки: task_template_id, completed, started'''
+    completed = completed_condition(start, end)
+    started = started_condition(start, end)
+    query = (
+        select(
+            UserTaskProgress.task_template_id,
+            func.count().filter(completed).label('completed'),
+            func.count().filter(started).label('started'),
+        )
+        .group_by(UserTaskProgress.task_template_id)
+    )
+    if start is not None or end is not None:
+        query = query.where(or_(completed, started))
+    if task_id is not None:
+        query = query.where(UserTaskProgress.task_template_id == task_id)
+    return query.subquery('tasks_stats')
+
+
+def tasks_totals(start: datetime | None = None, end: datetime | None = None) -> Select:
+    '''Сумма по всем задачам. Колонки: tasks_completed, tasks_started'''
+    stats = tasks_stats(start, end)
+    return select(
+        func.coalesce(func.sum(stats.c.completed), 0).label('tasks_completed'),
+        func.coalesce(func.sum(stats.c.started), 0).label('tasks_started'),
+    )
+
+
+def tasks_stats_by_day(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    task_id: int | None = None
+) -> Subquery:
+    '''
+    Колонки: date, tasks_completed, tasks_started.
+    Выполнение относится ко дню completed_at, начало - ко дню первого выполнения,
+    если в тот же день задача не была доведена до конца.
+    '''
+    task_filter = [UserTaskProgress.task_template_id == task_id] if task_id is not None else []
+    completed_day = cast(UserTaskProgress.completed_at, Date)
+    started_day = cast(UserTaskProgress.first_completed_at, Date)
+
+    completed = (
+        select(
+            completed_day.label('date'),
+            func.count().label('tasks_completed'),
+            literal_column('0').label('tasks_started'),
+        )
+        .where(completed_condition(start, end), *task_filter)
+        .group_by(completed_day)
+    )
+    started = (
+        select(
+            started_day.label('date'),
+            literal_column('0').label('tasks_completed'),
+            func.count().label('tasks_started'),
+        )
+        .where(
+            *_in_period(UserTaskProgress.first_completed_at, start, end),
+            not_(
+                and_(
+                    UserTaskProgress.fully_completed.is_(True),
+                    completed_day == started_day
+                )
+            ),
+            *task_filter
+        )
+        .group_by(started_day)
+    )
+    by_day = union_all(completed, started).subquery('tasks_by_day')
+    return (
+        select(
+            by_day.c.date,
+            func.sum(by_day.c.tasks_completed).label('tasks_completed'),
+            func.sum(by_day.c.tasks_started).label('tasks_started'),
+        )
+        .group_by(by_day.c.date)
+    ).subquery('tasks_stats_by_day')
+
+
+def users_completed_tasks() -> Subquery:
+    '''Колонки: user_id, completed_tasks - кол-во полностью выполненных задач'''
+    return (
+        select(
+            UserTaskProgress.user_id,
+            func.count().label('completed_tasks'),
+        )
+        .where(UserTaskProgress.fully_completed.is_(True))
+        .group_by(UserTaskProgress.user_id)
+    ).subquery('users_completed_tasks')
+
+
+def task_participants(task_id: int) -> Select:
+    '''Колонки: task_id, user_id, completed_tasks, completed'''
+    return (
+        select(
+            UserTaskProgress.task_template_id.label('task_id'),
+            UserTaskProgress.user_id,
+            UserTaskProgress.completed_count.label('completed_tasks'),
+            UserTaskProgress.fully_completed.label('completed'),
+        )
+        .where(UserTaskProgress.task_template_id == task_id)
+    )
+
+
+def uncompleted_task_users(task_id: int) -> Select:
+    '''Пользователи, которые начали задачу, но не выполнили. Колонки: user_id'''
+    return (
+        select(UserTaskProgress.user_id)
+        .where(
+            UserTaskProgress.task_template_id == task_id,
+            started_condition()
+        )
+    )
@@ -0,0 +1,368 @@
+'''
+Хранилище статики (фото заданий, розыгрышей, рассылок).
+
+Ключ файла - путь относительно static/, поэтому в БД по-прежнему лежат пути вида
+static/tasks/1/general.<hash>.webp, а раздаются они по тому же URL /static/...
+Бэкенд выбирается через ASSETS_BACKEND:
+    local - локальная директория static (по умолчанию);
+    s3    - S3-совместимое хранилище (MinIO, Ceph, Yandex Object Storage ...),
+            общее для всех контейнеров админки.
+'''
+from abc import ABC, abstractmethod
+import asyncio
+from datetime import datetime, timezone
+import hashlib
+import hmac
+import mimetypes
+import os
+import shutil
+from typing import AsyncIterator
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit
+from xml.etree import ElementTree
+
+import aiofiles
+from aiofiles.os import listdir, remove, stat
+import aiohttp
+from loguru import logger
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import (
+    ASSETS_BACKEND,
+    ASSETS_S3_ACCESS_KEY,
+    ASSETS_S3_BUCKET,
+    ASSETS_S3_ENDPOINT_URL,
+    ASSETS_S3_REGION,
+    ASSETS_S3_SECRET_KEY,
+)
+from tools.static import CachedStaticFiles, get_cache_headers, get_content_etag
+
+
+STATIC_ROOT = 'static'
+# Размер чанка при загрузке файла в S3 и проксировании из него
+STREAM_CHUNK_SIZE = 64 * 1024
+# Заголовки ответа S3, которые отдаем клиенту
+PROXY_RESPONSE_HEADERS = (
+    'content-type',
+    'content-length',
+    'content-range',
+    'accept-ranges',
+    'etag',
+    'last-modified',
+)
+
+
+def to_key(path: str) -> str:
+    '''static/tasks/1/general.webp -> tasks/1/general.webp'''
+    return os.path.relpath(path, STATIC_ROOT).replace(os.sep, '/')
+
+
+class AssetBackend(ABC):
+    @abstractmethod
+    async def publish(self, file_path: str):
+        '''Делает локально записанный файл доступным всем инстансам'''
+
+    @abstractmethod
+    async def list(self, dir_path: str) -> list[str]:
+        '''Имена файлов, лежащих непосредственно в dir_path'''
+
+    @abstractmethod
+    async def delete(self, file_path: str):
+        ...
+
+    @abstractmethod
+    async def delete_dir(self, dir_path: str):
+        ...
+
+    @abstractmethod
+    def static_app(self) -> ASGIApp:
+        '''ASGI-приложение, которое монтируется на /static'''
+
+
+class LocalAssetBackend(AssetBackend):
+    def __init__(self, root: str = STATIC_ROOT):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+
+    async def publish(self, file_path: str):
+        # Файл уже лежит в раздаваемой директории
+        return
+
+
+    async def list(self, dir_path: str) -> list[str]:
+        try:
+            return await listdir(dir_path)
+        except FileNotFoundError:
+            return []
+
+
+    async def delete(self, file_path: str):
+        try:
+            await remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+    async def delete_dir(self, dir_path: str):
+        try:
+            await asyncio.to_thread(shutil.rmtree, dir_path)
+        except FileNotFoundError:
+            logger.warning(f"Папка не найдена: {dir_path}")
+
+
+    def static_app(self) -> ASGIApp:
+        return CachedStaticFiles(directory=self.root)
+
+
+class S3AssetBackend(AssetBackend):
+    '''
+    S3-совместимое хранилище, запросы подписываются AWS Signature V4, адресация path-style:
+    {endpoint}/{bucket}/{key}. Файлы отдаются через /static этого же приложения
+    (с пробросом Range/If-None-Match), либо напрямую с CDN перед бакетом.
+    '''
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = 'us-east-1'
+    ):
+        if not endpoint_url or not bucket:
+            raise ValueError('ASSETS_S3_ENDPOINT_URL and ASSETS_S3_BUCKET are required for s3 assets backend')
+        self.endpoint_url = endpoint_url.rstrip('/')
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self._session: aiohttp.ClientSession | None = None
+
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Сессия создается внутри event loop при первом запросе
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+
+    def _url(self, key: str = '', query: dict | None = None) -> str:
+        url = f'{self.endpoint_url}/{self.bucket}'
+        if key:
+            url += '/' + quote(key, safe='/-_.~')
+        if query:
+            url += '?' + urlencode(sorted(query.items()), quote_via=quote, safe='-_.~')
+        return url
+
+
+    def _sign(self, method: str, url: str, payload_hash: str = 'UNSIGNED-PAYLOAD') -> dict[str, str]:
+        '''Заголовки с подписью AWS Signature V4'''
+        parsed = urlsplit(url)
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        datestamp = now.strftime('%Y%m%d')
+
+        headers = {
+            'host': parsed.netloc,
+            'x-amz-content-sha256': payload_hash,
+            'x-amz-date': amz_date,
+        }
+        signed_headers = ';'.join(headers)
+        canonical_headers = ''.join(f'{name}:{value}\n' for name, value in headers.items())
+        canonical_query = '&'.join(
+            f'{quote(name, safe="-_.~")}={quote(value, safe="-_.~")}'
+            for name, value in sorted(parse_qsl(parsed.query, keep_blank_values=True))
+        )
+        canonical_request = '\n'.join([
+            method,
+            parsed.path or '/',
+            canonical_query,
+            canonical_headers,
+            signed_headers,
+            payload_hash,
+        ])
+
+        scope = f'{datestamp}/{self.region}/s3/aws4_request'
+        string_to_sign = '\n'.join([
+            'AWS4-HMAC-SHA256',
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ])
+        signing_key = f'AWS4{self.secret_key}'.encode()
+        for part in (datestamp, self.region, 's3', 'aws4_request'):
+            signing_key = hmac.new(signing_key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+        headers['authorization'] = (
+            f'AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, '
+            f'SignedHeaders={signed_headers}, Signature={signature}'
+        )
+        return headers
+
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        data: bytes | AsyncIterator[bytes] | None = None,
+        **headers
+    ) -> tuple[int, bytes]:
+        if data is None or isinstance(data, bytes):
+            payload_hash = hashlib.sha256(data or b'').hexdigest()
+        else:
+            # Поток не хешируется заранее: тело подписывается как UNSIGNED-PAYLOAD
+            payload_hash = 'UNSIGNED-PAYLOAD'
+        async with self._get_session().request(
+            method,
+            url,
+            data=data,
+            headers={**self._sign(method, url, payload_hash), **headers}
+        ) as response:
+            return response.status, await response.read()
+
+
+    @staticmethod
+    async def _read_chunks(file_path: str) -> AsyncIterator[bytes]:
+        async with aiofiles.open(file_path, 'rb') as f:
+            while chunk := await f.read(STREAM_CHUNK_SIZE):
+                yield chunk
+
+
+    async def publish(self, file_path: str):
+        '''Загружает файл в бакет потоком и удаляет локальную копию'''
+        key = to_key(file_path)
+        status, body = await self._request(
+            'PUT',
+            self._url(key),
+            data=self._read_chunks(file_path),
+            **{
+                # S3 не принимает PUT с chunked-телом, длина передается явно
+                'Content-Length': str((await stat(file_path)).st_size),
+                'Cache-Control': get_cache_headers(key)['Cache-Control'],
+                'Content-Type': mimetypes.guess_type(key)[0] or 'application/octet-stream',
+            }
+        )
+        if status != 200:
+            raise RuntimeError(f'Failed to upload asset {key}: {status} {body[:200]!r}')
+        await remove(file_path)
+
+
+    async def _list_keys(self, prefix: str, delimiter: str | None = None) -> list[str]:
+        keys = []
+        continuation_token = None
+        while True:
+            query = {'list-type': '2', 'prefix': prefix}
+            if delimiter:
+                query['delimiter'] = delimiter
+            if continuation_token:
+                query['continuation-token'] = continuation_token
+
+            status, body = await self._request('GET', self._url(query=query))
+            if status != 200:
+                raise RuntimeError(f'Failed to list assets {prefix}: {status} {body[:200]!r}')
+
+            root = ElementTree.fromstring(body)
+            namespace = root.tag[:root.tag.index('}') + 1] if root.tag.startswith('{') else ''
+            keys.extend(element.text for element in root.iter(f'{namespace}Key'))
+            if root.findtext(f'{namespace}IsTruncated') != 'true':
+                return keys
+            continuation_token = root.findtext(f'{namespace}NextContinuationToken')
+
+
+    async def list(self, dir_path: str) -> list[str]:
+        prefix = to_key(dir_path) + '/'
+        keys = await self._list_keys(prefix, delimiter='/')
+        return [key[len(prefix):] for key in keys]
+
+
+    async def delete(self, file_path: str):
+        status, body = await self._request('DELETE', self._url(to_key(file_path)))
+        # 204 - удален, 404 - уже нет
+        if status not in (200, 204, 404):
+            raise RuntimeError(f'Failed to delete asset {file_path}: {status} {body[:200]!r}')
+
+
+    async def delete_dir(self, dir_path: str):
+        keys = await self._list_keys(to_key(dir_path) + '/')
+        await asyncio.gather(*[
+            self.delete(os.path.join(STATIC_ROOT, key))
+            for key in keys
+        ])
+
+
+    async def response(self, key: str, request_headers, method: str = 'GET') -> Response:
+        '''Проксирует GET/HEAD объекта из бакета, сохраняя Range и условные запросы'''
+        cache_headers = get_cache_headers(key)
+        content_etag = get_content_etag(key)
+        # Содержимое файла с хешем в имени не меняется - 304 отдаем без похода в хранилище
+        if content_etag and content_etag in request_headers.get('if-none-match', ''):
+            return Response(status_code=304, headers=cache_headers)
+
+        forward_headers = {'range': request_headers['range']} if 'range' in request_headers else {}
+        if not content_etag and 'if-none-match' in request_headers:
+            forward_headers['if-none-match'] = request_headers['if-none-match']
+
+        url = self._url(key)
+        response = await self._get_session().request(
+            method,
+            url,
+            headers={**self._sign(method, url), **forward_headers}
+        )
+        headers = {
+            name: response.headers[name]
+            for name in PROXY_RESPONSE_HEADERS
+            if name in response.headers
+        }
+        headers.update(cache_headers)
+
+        if response.status in (200, 206) and method == 'HEAD':
+            response.release()
+            return Response(status_code=response.status, headers=headers)
+        if response.status in (200, 206):
+            return StreamingResponse(
+                response.content.iter_chunked(STREAM_CHUNK_SIZE),
+                status_code=response.status,
+                headers=headers,
+                background=BackgroundTask(response.release)
+            )
+
+        response.release()
+        if response.status in (304, 416):
+            return Response(status_code=response.status, headers=headers)
+        if response.status in (403, 404):
+            return PlainTextResponse('Not Found', status_code=404)
+        logger.warning(f'Asset storage responded {response.status} for {key}')
+        return PlainTextResponse('Bad Gateway', status_code=502)
+
+
+    def static_app(self) -> ASGIApp:
+        async def app(scope: Scope, receive: Receive, send: Send):
+            request = Request(scope)
+            # Mount оставляет полный путь в scope['path'], префикс /static лежит в root_path
+            key = scope['path'].removeprefix(scope.get('root_path', '')).lstrip('/')
+            if request.method not in ('GET', 'HEAD'):
+                response = PlainTextResponse('Method Not Allowed', status_code=405)
+            elif not key or '..' in key.split('/'):
+                response = PlainTextResponse('Not Found', status_code=404)
+            else:
+                response = await self.response(key, request.headers, request.method)
+            await response(scope, receive, send)
+        return app
+
+
+def get_asset_backend() -> AssetBackend:
+    if ASSETS_BACKEND == 's3':
+        return S3AssetBackend(
+            endpoint_url=ASSETS_S3_ENDPOINT_URL,
+            bucket=ASSETS_S3_BUCKET,
+            access_key=ASSETS_S3_ACCESS_KEY,
+            secret_key=ASSETS_S3_SECRET_KEY,
+            region=ASSETS_S3_REGION,
+        )
+    return LocalAssetBackend()
+
+
+assets = get_asset_backend()
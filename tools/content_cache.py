@@ -0,0 +1,110 @@
+'''
+Кеш публичного контента (FAQ, документы) в памяти воркера.
+
+Каждая коллекция имеет версию, запись в коллекцию (add/update/delete/swap/...) увеличивает версию
+и сбрасывает закешированные страницы. Страница хранится уже сериализованной, ETag - хеш ее содержимого,
+поэтому повторный запрос с If-None-Match получает 304 без обращения к БД и без сериализации.
+Записи, сделанные в других воркерах, приходят через invalidation_bus (database/invalidation.py).
+'''
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+import hashlib
+from typing import Awaitable, Callable, Hashable
+
+from pydantic import BaseModel
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from database.invalidation import DOCS_TOPIC, FAQ_TOPIC, invalidation_bus
+
+
+FAQ_CACHE = FAQ_TOPIC
+DOCS_CACHE = DOCS_TOPIC
+# Сколько страниц одной коллекции держим (разные page/per_page)
+MAX_ENTRIES = 256
+CACHE_CONTROL = 'no-cache'
+
+
+@dataclass(frozen=True)
+class CachedContent:
+    body: bytes
+    etag: str
+
+
+def make_etag(body: bytes) -> str:
+    # Слабый ETag: тело может отдаваться и в gzip, и без сжатия
+    return f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def is_not_modified(request_headers: Headers, etag: str) -> bool:
+    if_none_match = request_headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return etag.removeprefix('W/') in tags
+
+
+class ContentCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._versions: defaultdict[str, int] = defaultdict(int)
+        self._entries: defaultdict[str, OrderedDict[Hashable, CachedContent]] = defaultdict(OrderedDict)
+
+
+    def version(self, collection: str) -> int:
+        return self._versions[collection]
+
+
+    def get(self, collection: str, key: Hashable) -> CachedContent | None:
+        entries = self._entries[collection]
+        entry = entries.get(key)
+        if entry is not None:
+            entries.move_to_end(key)
+        return entry
+
+
+    def set(self, collection: str, key: Hashable, version: int, content: BaseModel) -> CachedContent:
+        '''Сохраняет страницу, если с начала ее загрузки коллекция не менялась'''
+        body = content.__pydantic_serializer__.to_json(content)
+        entry = CachedContent(body=body, etag=make_etag(body))
+        if version == self._versions[collection]:
+            entries = self._entries[collection]
+            entries[key] = entry
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        return entry
+
+
+    def invalidate(self, collection: str):
+        self._versions[collection] += 1
+        self._entries[collection].clear()
+
+
+    async def get_or_load(
+        self,
+        collection: str,
+        key: Hashable,
+        loader: Callable[[], Awaitable[BaseModel]]
+    ) -> CachedContent:
+        entry = self.get(collection, key)
+        if entry is None:
+            version = self.version(collection)
+            entry = self.set(collection, key, version, await loader())
+        return entry
+
+
+    @staticmethod
+    def response(entry: CachedContent, request_headers: Headers) -> Response:
+        headers = {'ETag': entry.etag, 'Cache-Control': CACHE_CONTROL}
+        if is_not_modified(request_headers, entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(entry.body, media_type='application/json', headers=headers)
+
+
+content_cache = ContentCache()
+# Изменения из других воркеров
+for collection in (FAQ_CACHE, DOCS_CACHE):
+    invalidation_bus.subscribe(collection, lambda key, collection=collection: content_cache.invalidate(collection))
@@ -1,13 +1,79 @@
-from asyncio import to_thread
+from asyncio import Semaphore, gather, get_running_loop
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
 import os
-import shutil
+from uuid import uuid4
 import aiofiles
-from aiofiles.os import remove, listdir, stat
+from aiofiles.os import remove, stat
 from fastapi import UploadFile
-from filelock import AsyncFileLock
-from pathlib import Path
+from PIL import Image, ImageOps, UnidentifiedImageError
 from loguru import logger
 
+from config import PHOTO_PROCESS_WORKERS, PHOTO_UPLOAD_CONCURRENCY
+from tools.assets import assets
+
+
+# Размер чанка при чтении загрузки
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Максимальная сторона основного варианта и превью
+PHOTO_MAX_SIZE = 1600
+THUMBNAIL_SIZE = 320
+WEBP_QUALITY = 85
+# Длина хеша в имени файла: general.<hash>.webp
+HASH_LENGTH = 16
+
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    # Пул создается лениво, в каждом воркере gunicorn свой
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=PHOTO_PROCESS_WORKERS)
+    return _process_pool
+
+
+def _encode_webp(image: Image.Image, max_size: int) -> bytes:
+    variant = image.copy()
+    variant.thumbnail((max_size, max_size))
+    buffer = io.BytesIO()
+    variant.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def _process_image(src_path: str, dst_dir: str, name: str, extension: str) -> list[str]:
+    '''
+    Выполняется в пуле процессов: уменьшает картинку, перекодирует в WebP и делает превью.
+    Если файл не картинка (например svg) - сохраняет его как есть.
+    :return: пути созданных файлов, первый - основной вариант
+    '''
+    try:
+        with Image.open(src_path) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.mode else 'RGB')
+            variants = {
+                f'{name}.webp': _encode_webp(image, PHOTO_MAX_SIZE),
+                f'{name}.thumb.webp': _encode_webp(image, THUMBNAIL_SIZE),
+            }
+    except UnidentifiedImageError:
+        main_path = os.path.join(dst_dir, f'{name}.{extension}')
+        os.replace(src_path, main_path)
+        return [main_path]
+
+    paths = []
+    for filename, content in variants.items():
+        file_path = os.path.join(dst_dir, filename)
+        tmp_path = f'{file_path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, file_path)
+        paths.append(file_path)
+    os.remove(src_path)
+    return paths
+
 
 async def async_path_exists(path: str) -> bool:
     try:
@@ -19,73 +85,139 @@ async def async_path_exists(path: str) -> bool:
 
 class PhotoTools:
     @staticmethod
-    async def save_photo(path: str, photo: UploadFile, filename: str = None):
-        os.makedirs(path, exist_ok=True)
+    async def _stream_upload(photo: UploadFile, tmp_path: str) -> str:
+        '''Пишет загрузку на диск чанками и возвращает sha256 содержимого'''
+        digest = hashlib.sha256()
+        await photo.seek(0)
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            while chunk := await photo.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                await f.write(chunk)
+        return digest.hexdigest()[:HASH_LENGTH]
 
-        base_name = "general" if filename is None else filename
-        extension = photo.filename.split('.')[-1]
-        file_path = os.path.join(path, f"{base_name}.{extension}")
-        lock_path = f"{file_path}.lock"
 
-        try:
-            for existing_file in await listdir(path):
-                file_stem = Path(existing_file).stem
+    @staticmethod
+    async def _remove_old_versions(path: str, base_name: str, keep: set[str], existing_files: list[str]):
+        '''Удаляет прошлые версии файла base_name (general.png, general.<hash>.webp, general.lock ...)'''
+        for existing_file in existing_files:
+            if existing_file in keep or existing_file.startswith('.'):
+                continue
+            if existing_file.split('.', 1)[0] == base_name:
                 full_path = os.path.join(path, existing_file)
+                try:
+                    await assets.delete(full_path)
+                except Exception as e:
+                    logger.warning(f"Не удалось удалить файл: {full_path}: {e}")
 
-                # Удаляем файлы с таким же base_name
-                if file_stem == base_name:
-                    try:
-                        await remove(full_path)
-                    except Exception as e:
-                        logger.warning(f"Не удалось удалить файл: {full_path}: {e}")
-
-                # Удаляем соответствующие .lock-файлы
-                if existing_file == f"{base_name}.lock":
-                    try:
-                        await remove(full_path)
-                    except Exception as e:
-                        logger.warning(f"Не удалось удалить lock-файл: {full_path}: {e}")
 
+    @staticmethod
+    async def _list_dir(path: str) -> list[str]:
+        try:
+            return await assets.list(path)
         except Exception as e:
-            print(f"Ошибка при сканировании директории {path}: {e}")
-
-        # Сохраняем новый файл с блокировкой
-        async with AsyncFileLock(lock_path, timeout=10):
-            async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(await photo.read())
-                return file_path
-    
-    
+            logger.warning(f"Ошибка при сканировании директории {path}: {e}")
+            return []
+
+
+    @staticmethod
+    async def _store_photo(path: str, photo: UploadFile, base_name: str) -> list[str]:
+        '''Пишет загрузку и ее варианты в path и публикует их в хранилище, старые версии не трогает'''
+        extension = photo.filename.split('.')[-1].lower() if photo.filename else 'bin'
+        # uuid в имени: параллельные загрузки одного base_name не пишут в один временный файл
+        tmp_path = os.path.join(path, f".{base_name}.{uuid4().hex}.upload")
+
+        try:
+            content_hash = await PhotoTools._stream_upload(photo, tmp_path)
+            paths = await get_running_loop().run_in_executor(
+                _get_process_pool(),
+                _process_image,
+                tmp_path,
+                path,
+                f'{base_name}.{content_hash}',
+                extension
+            )
+        except Exception:
+            if await async_path_exists(tmp_path):
+                await remove(tmp_path)
+            raise
+
+        for file_path in paths:
+            await assets.publish(file_path)
+        return paths
+
+
+    @staticmethod
+    async def save_photo(
+        path: str,
+        photo: UploadFile,
+        filename: str | int = None
+    ) -> str:
+        '''
+        Сохраняет фото в path под именем <filename>.<hash>.webp (+ превью <filename>.<hash>.thumb.webp).
+        Обработка картинки выполняется в пуле процессов, чтобы не блокировать event loop.
+        Имя зависит от содержимого, поэтому такие файлы можно кешировать бессрочно.
+        :return: путь к основному варианту
+        '''
+        return (await PhotoTools.save_photos(path, [(photo, filename)]))[0]
+
+
+    @staticmethod
+    async def save_photos(
+        path: str,
+        photos: list[tuple[UploadFile, str | int | None]],
+        max_concurrency: int = PHOTO_UPLOAD_CONCURRENCY
+    ) -> list[str]:
+        '''
+        Пакетная версия save_photo: директория читается один раз, фото пишутся параллельно,
+        но не больше max_concurrency одновременно.
+        :param photos: пары (фото, имя файла без расширения)
+        :return: пути к основным вариантам в том же порядке
+        '''
+        os.makedirs(path, exist_ok=True)
+        existing_files = await PhotoTools._list_dir(path)
+        semaphore = Semaphore(max_concurrency)
+
+        async def save(photo: UploadFile, base_name: str) -> list[str]:
+            async with semaphore:
+                return await PhotoTools._store_photo(path, photo, base_name)
+
+        base_names = ["general" if filename is None else str(filename) for _, filename in photos]
+        saved_paths = await gather(
+            *[
+                save(photo, base_name)
+                for (photo, _), base_name in zip(photos, base_names)
+            ]
+        )
+
+        # Старые версии удаляем только после записи новых, чтобы файл не пропадал для читателей
+        for base_name, paths in zip(base_names, saved_paths):
+            await PhotoTools._remove_old_versions(
+                path,
+                base_name,
+                keep={os.path.basename(file_path) for file_path in paths},
+                existing_files=existing_files
+            )
+        return [paths[0] for paths in saved_paths]
+
+
+    @staticmethod
     async def delete(path: str):
         """Асинхронно удаляет папку и всё её содержимое."""
         try:
-            # shutil.rmtree не является асинхронной, оборачиваем в to_thread
-            await to_thread(shutil.rmtree, path)
+            await assets.delete_dir(path)
             logger.info(f"Папка успешно удалена: {path}")
-        except FileNotFoundError:
-            logger.warning(f"Папка не найдена: {path}")
         except Exception as e:
             logger.error(f"Ошибка при удалении папки {path}: {e}")
-        
-        
+
+
     @staticmethod
     async def delete_file(file_path: str):
-        lock_path = f"{file_path}.lock"
-
-        try:
-            async with AsyncFileLock(lock_path, timeout=10):
-                # Удаление самого файла
-                if await async_path_exists(file_path):
-                    try:
-                        await remove(file_path)
-                    except Exception as e:
-                        logger.warning(f"Не удалось удалить файл: {file_path}: {e}")
-
-                # Удаление lock-файла
-                if await async_path_exists(lock_path):
-                    try:
-                        await remove(lock_path)
-                    except Exception as e:
-                        logger.warning(f"Не удалось удалить lock-файл: {lock_path}: {e}")
-        except Exception as e:
-            logger.warning(f"Ошибка при попытке блокировки и удаления: {e}")
\ No newline at end of file
+        '''Удаляет файл и его превью'''
+        thumbnail_path = file_path.replace('.webp', '.thumb.webp') if file_path.endswith('.webp') else None
+        for path in (file_path, thumbnail_path):
+            if not path:
+                continue
+            try:
+                await assets.delete(path)
+            except Exception as e:
+                logger.warning(f"Не удалось удалить файл: {path}: {e}")
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+# Ответы меньше этого размера не сжимаются: выигрыш меньше накладных расходов gzip
+GZIP_MINIMUM_SIZE = 1024
+
+
+class PydanticResponse(Response):
+    '''
+    Ответ, который сериализует pydantic-модель сразу в JSON (model_dump_json),
+    минуя повторную валидацию по response_model и jsonable_encoder.
+    Модель в роуте указывается через response_model - для схемы OpenAPI.
+    '''
+    media_type = 'application/json'
+
+    def render(self, content: BaseModel) -> bytes:
+        return content.__pydantic_serializer__.to_json(content)
@@ -0,0 +1,43 @@
+import re
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+
+# Файлы вида <name>.<hash>.webp, имя меняется вместе с содержимым
+HASHED_FILENAME_PATTERN = re.compile(r'\.(?P<hash>[0-9a-f]{16})(?P<variant>\.thumb)?\.\w+$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+
+def get_content_etag(path: str) -> str | None:
+    '''ETag из хеша в имени файла, одинаковый на всех инстансах и бэкендах'''
+    match = HASHED_FILENAME_PATTERN.search(path)
+    if match is None:
+        return None
+    return f'"{match.group("hash")}{match.group("variant") or ""}"'
+
+
+def get_cache_headers(path: str) -> dict[str, str]:
+    etag = get_content_etag(path)
+    if etag is None:
+        return {'Cache-Control': REVALIDATE_CACHE_CONTROL}
+    return {'Cache-Control': IMMUTABLE_CACHE_CONTROL, 'ETag': etag}
+
+
+class CachedStaticFiles(StaticFiles):
+    '''
+    StaticFiles с Cache-Control: файлы с хешем в имени кешируются бессрочно,
+    остальные (старые пути, которые перезаписываются на месте) - с ревалидацией по ETag.
+    Range обрабатывает FileResponse.
+    '''
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers.update(get_cache_headers(str(full_path)))
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -1,10 +1,11 @@
+import asyncio
 from typing import Optional, NamedTuple
 import aiohttp
 import json
 
 from loguru import logger
 
-from config import TG_BOT_TOKEN
+from config import TG_API_URL, TG_BOT_TOKEN
 
 
 class TelegramButton(NamedTuple):
@@ -12,26 +13,61 @@ class TelegramButton(NamedTuple):
     url: str
 
 
+# Ответы Telegram, после которых доставка этому получателю бессмысленна
+UNREACHABLE_ERRORS: dict[int, tuple[str, ...]] = {
+    403: ('bot was blocked', 'user is deactivated'),
+    400: ('chat not found',),
+}
+# Сохраненный file_id больше не принимается - фото нужно загрузить заново
+FILE_ID_ERRORS: tuple[str, ...] = ('wrong file identifier', 'wrong remote file identifier', 'file reference expired')
+
+
+class TelegramSendResult(NamedTuple):
+    ok: bool
+    # file_id фото из ответа Telegram, по нему фото отправляется повторно без загрузки
+    photo_file_id: str | None = None
+    error_code: int | None = None
+    description: str | None = None
+    # Секунды до повторной попытки при 429
+    retry_after: int | None = None
+    
+    
+    @property
+    def recipient_unreachable(self) -> bool:
+        '''Бот заблокирован, аккаунт удален или чат не найден'''
+        description = (self.description or '').lower()
+        return any(error in description for error in UNREACHABLE_ERRORS.get(self.error_code, ()))
+    
+    
+    @property
+    def file_id_rejected(self) -> bool:
+        description = (self.description or '').lower()
+        return self.error_code == 400 and any(error in description for error in FILE_ID_ERRORS)
+
+
 class TelegramTools:
     async def send_message(
         chat_id: int,
         text: str,
-        photo_url: Optional[str] = None,
+        photo: Optional[str] = None,
         button: Optional[TelegramButton] = None
-    ) -> bool:
-        method = "sendPhoto" if photo_url else "sendMessage"
-        url = f"https://api.telegram.org/bot{TG_BOT_TOKEN}/{method}"
+    ) -> TelegramSendResult:
+        '''
+        :param photo: URL фото или file_id уже загруженного в Telegram фото
+        '''
+        method = "sendPhoto" if photo else "sendMessage"
+        url = f"{TG_API_URL}/bot{TG_BOT_TOKEN}/{method}"
 
         # Основные данные
         data = {
             "chat_id": chat_id,
             "parse_mode": "HTML",
-            "caption" if photo_url else "text": text,
+            "caption" if photo else "text": text,
         }
 
-        # Добавим URL фото, если есть
-        if photo_url:
-            data["photo"] = photo_url
+        # Добавим фото, если есть
+        if photo:
+            data["photo"] = photo
 
         # Добавим кнопку, если передана
         if button:
@@ -43,10 +79,30 @@ class TelegramTools:
             data["reply_markup"] = json.dumps(reply_markup)
 
         # Отправка запроса
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=data) as response:
-                if response.status == 200:
-                    return True
-                else:
-                    logger.debug(await response.json())
-                    return False
\ No newline at end of file
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(url, data=data) as response:
+                    if response.status == 200:
+                        return TelegramSendResult(
+                            ok=True,
+                            photo_file_id=TelegramTools._get_photo_file_id(await response.json()) if photo else None
+                        )
+                    else:
+                        error = await response.json(content_type=None)
+                        logger.debug(error)
+                        return TelegramSendResult(
+                            ok=False,
+                            error_code=error.get('error_code', response.status),
+                            description=error.get('description'),
+                            retry_after=(error.get('parameters') or {}).get('retry_after')
+                        )
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as ex:
+            # Сеть, таймаут или не-JSON ответ (например, HTML 502 от прокси) - сообщение не доставлено
+            logger.debug(f'{method} {chat_id}: {ex!r}')
+            return TelegramSendResult(ok=False, description=repr(ex))
+
+
+    def _get_photo_file_id(response: dict) -> str | None:
+        # Telegram возвращает несколько размеров фото, последний - самый большой
+        sizes = response.get('result', {}).get('photo') or []
+        return sizes[-1]['file_id'] if sizes else None
\ No newline at end of file
@@ -0,0 +1,179 @@
+'''
+Импорт/слияние пользователей из выгрузки GameSport (csv, xlsx, jsonl).
+
+Файл читается потоково, строки сразу уходят в COPY (UsersDBInterface.import_users),
+поэтому в памяти держится не больше IMPORT_BATCH_SIZE строк.
+Колонки как в USERS_IMPORT_COLUMNS: gs_id, tg_id, vk_id, username, first_name, last_name, email, phone, created_at.
+Нужен хотя бы один из ключей gs_id, tg_id, vk_id, остальные колонки необязательны.
+
+Запуск для больших выгрузок:
+    python -m tools.users_import users.csv
+'''
+import argparse
+import asyncio
+import csv
+from datetime import datetime
+import json
+import os
+from typing import AsyncIterator, Iterator
+
+from loguru import logger
+from openpyxl import load_workbook
+
+from database import db
+
+
+USERS_IMPORT_FORMATS = ('csv', 'xlsx', 'jsonl')
+# Сколько строк читается из файла за один переход в поток
+IMPORT_BATCH_SIZE = 10_000
+# Сколько ошибок разбора попадает в отчет
+MAX_REPORTED_ERRORS = 100
+
+
+def _iter_file_rows(path: str, file_format: str) -> Iterator[dict | str]:
+    match file_format:
+        case 'csv':
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                yield from csv.DictReader(f)
+        case 'jsonl':
+            with open(path, encoding='utf-8') as f:
+                # Строка разбирается в parse_row, чтобы ошибка JSON не обрывала чтение файла
+                for line in f:
+                    if line.strip():
+                        yield line
+        case 'xlsx':
+            workbook = load_workbook(path, read_only=True)
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                header = [str(column).strip() if column is not None else '' for column in next(rows, ())]
+                for values in rows:
+                    yield dict(zip(header, values))
+            finally:
+                workbook.close()
+        case _:
+            raise ValueError(f'Unsupported format: {file_format}, supported: {USERS_IMPORT_FORMATS}')
+
+
+def _to_str(value) -> str | None:
+    if value is None:
+        return None
+    # Excel хранит числовые id как float
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _to_int(value) -> int | None:
+    value = _to_str(value)
+    return int(value) if value is not None else None
+
+
+def _to_datetime(value) -> datetime | None:
+    if isinstance(value, datetime):
+        result = value
+    else:
+        value = _to_str(value)
+        if value is None:
+            return None
+        result = datetime.fromisoformat(value)
+    # users.created_at хранится без часового пояса, в локальном времени
+    if result.tzinfo is not None:
+        result = result.astimezone().replace(tzinfo=None)
+    return result
+
+
+def parse_row(row_num: int, row: dict | str) -> tuple:
+    '''Строка файла -> запись в порядке USERS_IMPORT_COLUMNS'''
+    if isinstance(row, str):
+        row = json.loads(row)
+        if not isinstance(row, dict):
+            raise ValueError('JSON line should be an object')
+    record = (
+        row_num,
+        _to_int(row.get('gs_id')),
+        _to_str(row.get('tg_id')),
+        _to_str(row.get('vk_id')),
+        _to_str(row.get('username')),
+        _to_str(row.get('first_name')),
+        _to_str(row.get('last_name')),
+        _to_str(row.get('email')),
+        _to_str(row.get('phone')),
+        _to_datetime(row.get('created_at')),
+    )
+    if record[1] is None and record[2] is None and record[3] is None:
+        raise ValueError('one of gs_id, tg_id, vk_id is required')
+    return record
+
+
+class UsersFileReader:
+    '''Асинхронный источник записей для COPY, собирает ошибки разбора'''
+    def __init__(self, path: str, file_format: str):
+        self.path = path
+        self.file_format = file_format
+        self.invalid = 0
+        self.errors: list[str] = []
+
+
+    def _read_batch(self, rows: Iterator[dict | str], start: int) -> list[tuple]:
+        batch = []
+        for row_num, row in enumerate(rows, start=start):
+            try:
+                batch.append(parse_row(row_num, row))
+            except (ValueError, TypeError, AttributeError) as ex:
+                self.invalid += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append(f'row {row_num}: {ex}')
+            if row_num - start + 1 >= IMPORT_BATCH_SIZE:
+                break
+        else:
+            # Файл закончился
+            return batch + [None]
+        return batch
+
+
+    async def __aiter__(self) -> AsyncIterator[tuple]:
+        rows = _iter_file_rows(self.path, self.file_format)
+        row_num = 1
+        while True:
+            batch = await asyncio.to_thread(self._read_batch, rows, row_num)
+            row_num += IMPORT_BATCH_SIZE
+            for record in batch:
+                if record is None:
+                    return
+                yield record
+
+
+async def import_users_file(path: str, file_format: str | None = None) -> dict:
+    '''
+    :param file_format: csv, xlsx или jsonl, по умолчанию - по расширению файла
+    :return: total, inserted, updated, conflicted, invalid, errors
+    '''
+    file_format = file_format or path.rsplit('.', 1)[-1].lower()
+    if file_format not in USERS_IMPORT_FORMATS:
+        raise ValueError(f'Unsupported format: {file_format}, supported: {USERS_IMPORT_FORMATS}')
+
+    reader = UsersFileReader(path, file_format)
+    counts = await db.users.import_users(reader)
+    return {
+        **counts,
+        'invalid': reader.invalid,
+        'errors': reader.errors,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Импорт пользователей из выгрузки GameSport')
+    parser.add_argument('path', help='csv, xlsx или jsonl файл')
+    parser.add_argument('--format', choices=USERS_IMPORT_FORMATS, default=None)
+    args = parser.parse_args()
+
+    started_at = datetime.now()
+    report = await import_users_file(os.path.abspath(args.path), args.format)
+    for error in report.pop('errors'):
+        logger.warning(error)
+    logger.info(f'Импорт завершен за {datetime.now() - started_at}: {report}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())